@@ -1,9 +1,35 @@
+import plotly.io as pio
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+import functools
+import json
 import os
+import uuid
 from datetime import datetime, timedelta
 
+from phiq.analise import (
+    AVISO_SEM_CODIGO_VENDA_RECOMPRA, AVISO_SEM_CODIGO_VENDA_TICKET, clientes_a_recomprar, construir_acumulados,
+    construir_cubo, construir_cubo_produtos, construir_primeiras_compras, construir_tabela_pedidos, indexar_gestores, prever_proximas_compras,
+)
+from phiq.consultas import (
+    MOTOR_PADRAO, MOTORES_DISPONIVEIS, buscar_clientes, faturamento_diario, fonte_duckdb, fonte_pandas, formas_pagamento,
+    indice_clientes, nao_mapeados, novos_recompra, opcoes_filtros, previsao_carteira, previsao_clientes, ranking, selecionar, vazia,
+)
+from phiq.consultas import segmentos as segmentos_selecao, totais as totais_selecao
+from phiq.cache import em_cache, estatisticas_cache, tabela_cache
+from phiq.dados import (
+    CONFIG_GESTORES, carregar_dataset, carregar_varios, ler_conversao, regra_do_gestor, relatorio_memoria, tabela_conversao,
+)
+from phiq.historico import PASTA_HISTORICO, estruturas_historico, incorporar_arquivos, ler_manifesto, pasta_dados, regras_mudaram
+from phiq.formatacao import formatar_inteiro, formatar_numero_abreviado, formatar_real
+from phiq.instrumentacao import (
+    contar_falha_cache, execucoes_cache, finalizar_medicao, iniciar_medicao, medicao_atual, medir, registrar_chamada_cache,
+    secao, tabelas_desempenho,
+)
+from phiq.graficos import (
+    BACKGROUND_DARK, CONTENT_BG_DARK, SOFT_BLUE, TEAL, TEXT_LIGHT, grafico_faturamento,
+    grafico_formas_pagamento, grafico_novos_recompra, grafico_top_clientes, grafico_top_produtos,
+)
+
 # --- Configuração da página ---
 st.set_page_config(
     page_title="Dashboard PHIQ - Análise de Vendas",
@@ -11,15 +37,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- PALETA DE CORES (TEMA ESCURO) ---
-TEAL = "#2C8B8B"        # Verde-água (Mantido como cor de destaque e da sidebar)
-SOFT_BLUE = "#3A7CA5"    # Azul suave (Mantido como cor de destaque secundária)
-BACKGROUND_DARK = "#0E1117" # Cor de fundo geral (preto azulado do Streamlit)
-CONTENT_BG_DARK = "#1E1E1E" # Cor de fundo da área de conteúdo (cinza escuro)
-TEXT_LIGHT = "#FAFAFA"      # Cor de texto clara
-GRAY_LIGHT = "#CCCCCC"  # Cinza claro
-GRAY_DARK = "#AAAAAA"   # Cinza escuro
-
 # --- Estilo CSS completo (TEMA ESCURO AJUSTADO) ---
 st.markdown(f"""
 <style>
@@ -72,188 +89,250 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # ====================
-# Funções de Formatação
+# Carga de dados (com cache do Streamlit)
 # ====================
-def formatar_real(valor):
-    try:
-        return f"R$ {valor:,.2f}".replace(",", "TEMP").replace(".", ",").replace("TEMP", ".")
-    except (ValueError, TypeError):
-        return "R$ 0,00"
-
-def formatar_numero_abreviado(valor):
-    try:
-        valor = float(valor)
-        if valor >= 1_000_000:
-            return f"R$ {valor/1_000_000:.1f} M".replace('.', ',')
-        if valor >= 1_000:
-            return f"R$ {valor/1_000:.1f} MIL".replace('.', ',')
-        return f"R$ {valor:,.2f}".replace(",", "TEMP").replace(".", ",").replace("TEMP", ".")
-    except (ValueError, TypeError):
-        return "R$ 0,00"
-
-def formatar_inteiro(valor):
+def cache_instrumentado(funcao=None, recurso=False, **opcoes_cache):
+    # st.cache_data com contagem de acertos/falhas: o corpo interno só executa quando o resultado não está em cache.
+    # recurso=True usa st.cache_resource: todas as sessões recebem o mesmo objeto, sem copiar (desserializar) a cada
+    # rerun; só para estruturas que ninguém altera depois de montadas.
+    if funcao is None:
+        return functools.partial(cache_instrumentado, recurso=recurso, **opcoes_cache)
+    nome = funcao.__name__
+
+    def corpo(*args, **kwargs):
+        contar_falha_cache(nome)
+        return funcao(*args, **kwargs)
+    cacheada = (st.cache_resource if recurso else st.cache_data)(functools.update_wrapper(corpo, funcao), **opcoes_cache)
+
+    @functools.wraps(funcao)
+    def chamada(*args, **kwargs):
+        execucoes = execucoes_cache(nome)
+        with medir(nome, tipo='cache'):
+            resultado = cacheada(*args, **kwargs)
+        registrar_chamada_cache(nome, acerto=execucoes_cache(nome) == execucoes)
+        return resultado
+    return chamada
+
+# Motor DuckDB: pasta de arquivos Parquet (ver `python -m phiq importar`) lida quando nenhum CSV é carregado.
+DATASET_PARQUET = os.environ.get("PHIQ_DATASET", "")
+
+# Cargas em memória (um DataFrame por conjunto de arquivos) mantidas pelo st.cache_data: as mais antigas saem.
+MAX_CARGAS_EM_CACHE = int(os.environ.get("PHIQ_MAX_CARGAS", "4"))
+
+# Figuras já serializadas, no cache compartilhado entre sessões (`phiq.cache`). A chave é o estado dos filtros que
+# alimenta cada gráfico; `construir` (a função que monta a figura) só é chamada quando o estado é novo.
+def figura_em_cache(estado_filtros, construir):
+    return em_cache('figura', estado_filtros, lambda: pio.to_json(construir(), validate=False))
+
+def mostrar_grafico(estado_filtros, construir):
+    figura = json.loads(figura_em_cache(estado_filtros, construir))
+    # st.plotly_chart ainda valida e serializa o dicionário, mas sem refazer agregações nem o Plotly Express.
+    with medir('st.plotly_chart', tipo='renderizacao'):
+        st.plotly_chart(figura, use_container_width=True)
+
+def fragmento(funcao):
+    # st.fragment: um widget da seção reexecuta só a seção, com os argumentos da última execução completa. Fora de
+    # uma execução completa não há medição aberta, então a reexecução do fragmento é medida (e registrada) à parte.
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        if medicao_atual() is not None:
+            return funcao(*args, **kwargs)
+        iniciar_medicao()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            finalizar_medicao(sessao=st.session_state['id_sessao'], rerun=st.session_state['reruns'], fragmento=funcao.__name__)
+    return st.fragment(medida)
+
+def conteudo_arquivos(uploaded_files):
+    return [(arquivo.name, arquivo.getvalue()) for arquivo in uploaded_files]
+
+# Vários arquivos (um por franquia, .zip e franquias.json) são lidos em paralelo; ver `carregar_varios`. Só este
+# loader recebe os arquivos (e os hasheia a cada rerun): os derivados usam a chave de conteúdo do df carregado.
+@cache_instrumentado(recurso=True, max_entries=MAX_CARGAS_EM_CACHE)
+def load_data(uploaded_files, compacto=False):
     try:
-        return f"{int(valor):,}".replace(",", ".")
-    except (ValueError, TypeError):
-        return "0"
+        return carregar_varios(conteudo_arquivos(uploaded_files), compacto=compacto)
+    except Exception as e:
+        st.error(f"Erro ao ler o CSV: {e}")
+        st.stop()
 
-# ====================
-# Função para carregar e preparar dados
-# ====================
-@st.cache_data
-def load_data(uploaded_file):
+@cache_instrumentado(max_entries=MAX_CARGAS_EM_CACHE)
+def load_dataset(uploaded_files):
     try:
-        df = pd.read_csv(uploaded_file, encoding='utf-8', on_bad_lines='skip', low_memory=False)
+        return carregar_dataset(conteudo_arquivos(uploaded_files))
     except Exception as e:
         st.error(f"Erro ao ler o CSV: {e}")
         st.stop()
 
-    df.columns = df.columns.str.strip()
-    
-    column_mapping = {
-        'Data Faturamento Pedido': 'Data Faturamento Pedido', 'Cliente': 'Cliente',
-        'Estado': 'Estado', 'UF': 'Estado', 'Vendedor': 'Vendedor',
-        'Preço Venda Total (R$)': 'Valor Total', 'Valor Total': 'Valor Total',
-        'Descrição': 'Descrição', 'Forma Pagamento': 'Forma Pagamento',
-        'SEGMENTO ': 'Segmento', 'SEGMENTO': 'Segmento', 'Franquia': 'Franquia',
-        'Data': 'Data'
-    }
-    for old, new in column_mapping.items():
-        if old in df.columns:
-            df.rename(columns={old: new}, inplace=True)
-
-    if 'Franquia' not in df.columns:
-        df['Franquia'] = 'PHIQ'
-
-    date_cols = ['Data', 'Data Faturamento Pedido']
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-    
-    numeric_cols = ['Valor Total', 'Quantidade']
-    for col in numeric_cols:
-        if col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    df.dropna(subset=['Valor Total', 'Data Faturamento Pedido', 'Quantidade'], inplace=True)
-
-    text_cols = ['Estado', 'Vendedor', 'Segmento']
-    for col in text_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip().str.upper()
-
-    if 'Segmento' in df.columns:
-        df['Segmento'] = df['Segmento'].replace(['', 'nan'], 'Não Informado')
-        df['Segmento'] = df['Segmento'].replace({
-            'CLIENTE FÁBRICA ': 'CLIENTE FÁBRICA', 'CLIENTE FÁBRICA': 'CLIENTE FÁBRICA',
-            'INSTITUCIONAL ': 'INSTITUCIONAL', 'INDUSTRIAL ': 'INDUSTRIAL'
-        })
-    return df
-
-# ====================
-# Funções de Análise
-# ====================
-def calcular_recorrencia_e_previsao(df, cliente_col='Cliente', date_col='Data Faturamento Pedido'):
-    if df.empty or len(df) < 2:
-        return pd.DataFrame()
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df = df.dropna(subset=[date_col])
-    df['Data_Sem_Hora'] = df[date_col].dt.date
-    compras_unicas = df[[cliente_col, 'Data_Sem_Hora']].drop_duplicates().sort_values([cliente_col, 'Data_Sem_Hora'])
-    contagem_compras = compras_unicas.groupby(cliente_col).size().reset_index(name='Nº de Compras')
-    clientes_recorrentes = contagem_compras[contagem_compras['Nº de Compras'] >= 2][cliente_col]
-    compras_unicas = compras_unicas[compras_unicas[cliente_col].isin(clientes_recorrentes)]
-    if compras_unicas.empty:
-        return pd.DataFrame()
-    compras_unicas['Data_Sem_Hora'] = pd.to_datetime(compras_unicas['Data_Sem_Hora'])
-    compras_unicas['Diferença Dias'] = compras_unicas.groupby(cliente_col)['Data_Sem_Hora'].diff().dt.days
-    recorrencia = compras_unicas.groupby(cliente_col).agg(
-        Ultima_Compra=('Data_Sem_Hora', 'max'),
-        Ritmo_Dias=('Diferença Dias', 'median')
-    ).reset_index()
-    recorrencia = recorrencia.dropna(subset=['Ritmo_Dias'])
-    recorrencia['Ritmo_Dias'] = recorrencia['Ritmo_Dias'].round(0).astype(int)
-    recorrencia = recorrencia.merge(contagem_compras, on=cliente_col)
-    recorrencia['Próxima Compra'] = recorrencia['Ultima_Compra'] + pd.to_timedelta(recorrencia['Ritmo_Dias'], unit='D')
-    
-    recorrencia['Ritmo (dias)'] = recorrencia['Ritmo_Dias'].astype(int)
-    recorrencia['Nº de Compras'] = recorrencia['Nº de Compras'].astype(int)
-
-    recorrencia['Última Compra'] = recorrencia['Ultima_Compra'].dt.strftime('%d/%m/%Y')
-    recorrencia['Próxima Compra'] = recorrencia['Próxima Compra'].dt.strftime('%d/%m/%Y')
-    
-    return recorrencia[[
-        cliente_col, 'Nº de Compras', 'Ritmo (dias)', 'Última Compra', 'Próxima Compra'
-    ]].rename(columns={cliente_col: 'Cliente'})
-
-def classificar_compras(df, cliente_col='Cliente', date_col='Data Faturamento Pedido', venda_col='Código Venda'):
-    if df.empty or date_col not in df.columns:
-        return pd.DataFrame()
-    if venda_col not in df.columns:
-        st.warning(f"Coluna '{venda_col}' não encontrada. A análise de 'Novos x Recompra' pode ser imprecisa.")
-        df[date_col] = pd.to_datetime(df[date_col])
-        primeira_compra = df.groupby(cliente_col)[date_col].min().reset_index()
-        primeira_compra.columns = [cliente_col, 'Primeira_Compra']
-        df_merged = df.merge(primeira_compra, on=cliente_col)
-        df_merged['Tipo Compra'] = df_merged.apply(lambda row: 'Cliente Novo' if row[date_col].date() == row['Primeira_Compra'].date() else 'Recompra', axis=1)
-        return df_merged
-
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df_sem_na = df.dropna(subset=[date_col])
-    primeira_transacao_idx = df_sem_na.loc[df_sem_na.groupby(cliente_col)[date_col].idxmin()]
-    primeira_venda_lookup = primeira_transacao_idx[[cliente_col, venda_col]].rename(columns={venda_col: 'Primeira_Venda_Codigo'})
-    df_merged = df.merge(primeira_venda_lookup, on=cliente_col, how='left')
-    df_merged['Tipo Compra'] = 'Recompra'
-    df_merged.loc[df_merged[venda_col] == df_merged['Primeira_Venda_Codigo'], 'Tipo Compra'] = 'Cliente Novo'
-    return df_merged
-
-def calcular_ticket_medio_por_pedido(df):
-    if df.empty: return 0.0
-    if 'Código Venda' in df.columns:
-        faturamento_total = df['Valor Total'].sum()
-        numero_de_pedidos = df['Código Venda'].nunique()
-        if numero_de_pedidos == 0: return 0.0
-        return faturamento_total / numero_de_pedidos
-    else:
-        st.warning("Coluna 'Código Venda' não encontrada para calcular o Ticket Médio.")
-        return 0.0
+@cache_instrumentado(max_entries=MAX_CARGAS_EM_CACHE)
+def gerar_relatorio_memoria(chave, _uploaded_files):
+    return relatorio_memoria(load_data(_uploaded_files), load_data(_uploaded_files, compacto=True))
+
+# Estruturas derivadas, indexadas pelo identificador dos dados (chave de conteúdo + esquema); os argumentos com `_`
+# ficam fora da chave e não são hasheados.
+@cache_instrumentado(recurso=True, max_entries=MAX_CARGAS_EM_CACHE)
+def load_indices_gestores(id_dados, _fonte):
+    return {nome: indexar_gestores(_fonte[nome]) if _fonte[nome] is not None else None
+            for nome in ['df', 'cubo', 'cubo_produtos', 'pedidos']}
+
+@cache_instrumentado(recurso=True, max_entries=MAX_CARGAS_EM_CACHE)
+def load_primeiras_compras(id_dados, _df):
+    return construir_primeiras_compras(_df)
+
+@cache_instrumentado(recurso=True, max_entries=MAX_CARGAS_EM_CACHE)
+def load_previsoes(id_dados, _df):
+    return prever_proximas_compras(_df)
+
+@cache_instrumentado(recurso=True, max_entries=MAX_CARGAS_EM_CACHE)
+def load_cubo(id_dados, _df):
+    cubo = construir_cubo(_df)
+    pedidos = construir_tabela_pedidos(_df)
+    return cubo, construir_cubo_produtos(_df), pedidos, construir_acumulados(cubo, pedidos)
+
+# Histórico incremental: a versão do manifesto muda a cada CSV incorporado. Só as duas últimas versões ficam em
+# cache, para não manter cópias antigas do histórico em memória. O momento da última atualização entra na chave,
+# como no identificador da fonte: a versão recomeça se a pasta for apagada, e os dois caches precisam mudar juntos.
+@cache_instrumentado(recurso=True, max_entries=2)
+def load_historico(versao, momento, compacto=False):
+    return estruturas_historico(PASTA_HISTORICO, compacto=compacto)
 
 # ====================
 # Início da Aplicação Streamlit
 # ====================
-st.sidebar.title("📁 Importar Dados")
-uploaded_file = st.sidebar.file_uploader("Carregue seu CSV (PedidosItens)", type=["csv"])
+iniciar_medicao()
+if 'id_sessao' not in st.session_state:
+    st.session_state['id_sessao'] = uuid.uuid4().hex[:12]
+    st.session_state['reruns'] = 0
+st.session_state['reruns'] += 1
 
-if not uploaded_file:
+st.sidebar.title("📁 Importar Dados")
+motor = MOTOR_PADRAO if MOTOR_PADRAO in MOTORES_DISPONIVEIS else 'pandas'
+if len(MOTORES_DISPONIVEIS) > 1:
+    motor = st.sidebar.selectbox("Motor de consultas", MOTORES_DISPONIVEIS, index=MOTORES_DISPONIVEIS.index(motor),
+                                 help="pandas mantém o histórico em memória; duckdb consulta arquivos Parquet em SQL, sem carregá-los.")
+historico_incremental = st.sidebar.checkbox("Histórico incremental", value=False,
+                                            help="Cada CSV carregado (só os pedidos novos ou alterados) é incorporado ao histórico local; linhas já existentes são substituídas.")
+uploaded_files = st.sidebar.file_uploader("Carregue seus CSVs (PedidosItens)", type=["csv", "zip", "json"], accept_multiple_files=True,
+                                          help="Um arquivo por franquia (ou um .zip com todos). A franquia vem da coluna Franquia, "
+                                               "do franquias.json enviado junto ou do nome do arquivo.")
+id_upload = ":".join(arquivo.file_id for arquivo in uploaded_files)
+usar_dataset = motor == 'duckdb' and bool(DATASET_PARQUET) and not uploaded_files and not historico_incremental
+
+if historico_incremental:
+    # Cada envio é incorporado uma vez por sessão; reenviar os mesmos arquivos só substitui as mesmas linhas.
+    if uploaded_files and st.session_state.get('delta_incorporado') != id_upload:
+        try:
+            with st.spinner("Incorporando os CSVs ao histórico..."):
+                resumos_delta = incorporar_arquivos(conteudo_arquivos(uploaded_files), PASTA_HISTORICO)
+        except Exception as e:
+            st.error(f"Erro ao incorporar o CSV: {e}")
+            st.stop()
+        st.session_state['delta_incorporado'] = id_upload
+        meses_atualizados = {mes for resumo in resumos_delta for mes in resumo['meses_atualizados']}
+        st.sidebar.success(f"{sum(r['linhas_novas'] for r in resumos_delta)} linhas novas e "
+                           f"{sum(r['linhas_substituidas'] for r in resumos_delta)} substituídas ({len(meses_atualizados)} meses atualizados).")
+    manifesto = ler_manifesto(PASTA_HISTORICO)
+    if manifesto is None:
+        st.warning("O histórico está vazio. Carregue um CSV para iniciá-lo.")
+        st.stop()
+    # Conversão de tipos do último CSV incorporado.
+    conversao = manifesto['atualizacoes'][-1].get('conversao') if manifesto['atualizacoes'] else None
+    # A versão recomeça se a pasta do histórico for apagada; o momento da última atualização desambigua os caches.
+    momento_historico = manifesto['atualizacoes'][-1]['momento'] if manifesto['atualizacoes'] else ''
+    if regras_mudaram(manifesto):
+        st.sidebar.warning("As regras de normalização ou de gestores mudaram depois da criação do histórico; "
+                           "linhas antigas seguem com as regras anteriores.")
+elif not uploaded_files and not usar_dataset:
     st.warning("Por favor, carregue um arquivo CSV para continuar.")
     st.stop()
 
-df = load_data(uploaded_file)
+if motor == 'pandas':
+    esquema_compacto = st.sidebar.checkbox("Esquema compacto (categorias)", value=False,
+                                           help="Armazena dimensões e identificadores como categorias, reduzindo memória e acelerando filtros.")
+    secao("Carga dos dados")
+    if historico_incremental:
+        fonte = fonte_pandas(load_historico(manifesto['versao'], momento_historico, compacto=esquema_compacto),
+                             identificador=f"historico:{manifesto['versao']}:{momento_historico}:{'compacto' if esquema_compacto else 'padrao'}")
+        previsoes = fonte['previsoes']
+    else:
+        df = load_data(uploaded_files, compacto=esquema_compacto)
+        conversao = df.attrs.get('conversao')
+        id_dados = f"{df.attrs['chave']}:{'compacto' if esquema_compacto else 'padrao'}"
+        cubo, cubo_produtos, pedidos, acumulados = load_cubo(id_dados, df)
+        previsoes = load_previsoes(id_dados, df)
+        fonte = fonte_pandas({
+            'df': df, 'cubo': cubo, 'cubo_produtos': cubo_produtos, 'pedidos': pedidos, 'acumulados': acumulados,
+            'primeiras_compras': load_primeiras_compras(id_dados, df), 'previsoes': previsoes, 'indices_gestores': None,
+        }, identificador=id_dados)
+else:
+    esquema_compacto = False
+    secao("Carga dos dados")
+    try:
+        if historico_incremental:
+            fonte = fonte_duckdb(pasta_dados(PASTA_HISTORICO))
+        else:
+            pasta_dataset = DATASET_PARQUET if usar_dataset else load_dataset(uploaded_files)
+            fonte = fonte_duckdb(pasta_dataset)
+            conversao = ler_conversao(pasta_dataset)
+    except Exception as e:
+        st.error(f"Erro ao abrir os arquivos Parquet: {e}")
+        st.stop()
+    previsoes = previsao_carteira(fonte)
+opcoes = opcoes_filtros(fonte)
+
+if motor == 'pandas' and not historico_incremental and st.sidebar.checkbox("Mostrar uso de memória", value=False):
+    with st.sidebar.expander("💾 Uso de Memória", expanded=True):
+        st.dataframe(gerar_relatorio_memoria(df.attrs['chave'], uploaded_files), use_container_width=True, hide_index=True)
+
+mostrar_performance = st.sidebar.checkbox("Mostrar performance", value=False,
+                                          help="Tempo, memória e linhas de cada seção e função neste rerun, e acertos do cache.")
+painel_performance = st.sidebar.container()
+
+valores_fora_das_regras = nao_mapeados(fonte)
+if not valores_fora_das_regras.empty:
+    with st.sidebar.expander(f"⚠️ Valores Não Mapeados ({len(valores_fora_das_regras)})"):
+        st.caption("Valores fora da lista de válidos em regras_normalizacao.json.")
+        st.dataframe(valores_fora_das_regras, use_container_width=True, hide_index=True)
+
+tabela_tipos = tabela_conversao(conversao)
+if tabela_tipos['Inválidas'].sum() or tabela_tipos['Descartadas'].sum():
+    with st.sidebar.expander(f"⚠️ Linhas Descartadas na Carga ({conversao['linhas_descartadas']})"):
+        st.caption("Formato detectado em cada coluna e linhas vazias, inválidas (convertidas em nulo) ou descartadas "
+                   "por não terem data de faturamento, valor ou quantidade.")
+        st.dataframe(tabela_tipos, use_container_width=True, hide_index=True)
 
 if os.path.exists("Logo_Phiq.png"):
     st.image("Logo_Phiq.png", width=200)
 
+COLUNAS_PREVISAO = {
+    'Última Compra': st.column_config.DateColumn(format="DD/MM/YYYY"),
+    'Próxima Compra': st.column_config.DateColumn(format="DD/MM/YYYY"),
+}
+
+OPCOES_PRIMEIRA_COMPRA = ["Dentro do período filtrado", "De todo o histórico"]
+
+secao("Filtros")
 st.sidebar.title("🧭 Navegação")
 page = st.sidebar.radio("Selecione a Página", ["Visão Geral", "Visão por Gestor"])
 st.sidebar.header("Filtros Gerais")
 
-all_estados = sorted(df['Estado'].dropna().unique())
+all_estados = opcoes['estados']
 estados = st.sidebar.multiselect("Estados", options=all_estados, default=all_estados)
-franquias = st.sidebar.multiselect("Franquias", df['Franquia'].unique(), default=df['Franquia'].unique())
+all_franquias = opcoes['franquias']
+franquias = st.sidebar.multiselect("Franquias", all_franquias, default=all_franquias)
 
 if page == "Visão Geral":
-    if 'Segmento' in df.columns:
-        all_segmentos = df['Segmento'].dropna().unique()
+    if opcoes['segmentos'] is not None:
+        all_segmentos = opcoes['segmentos']
         default_segmentos = [s for s in all_segmentos if s != 'Não Informado']
         segmentos = st.sidebar.multiselect("Segmento", all_segmentos, default=default_segmentos)
     else:
         segmentos = None
 
 st.sidebar.header("📅 Filtro por Período")
-min_date = df['Data Faturamento Pedido'].min().date()
-max_date = df['Data Faturamento Pedido'].max().date()
+min_date = opcoes['data_min']
+max_date = opcoes['data_max']
 
 default_start_date = max_date - timedelta(days=30)
 if default_start_date < min_date:
@@ -266,278 +345,250 @@ if start_date > end_date:
     st.sidebar.error("A Data Inicial não pode ser posterior à Data Final.")
     st.stop()
 
+# ====================
+# Seções com widgets próprios (fragmentos)
+# ====================
+# Usadas pelas duas páginas: `chave` separa os widgets de cada página e `estado` é o estado dos filtros da página.
+@fragmento
+def secao_faturamento(selecao, estado, chave, titulo_mes, titulo_dia):
+    secao("Faturamento no Período")
+    st.subheader("📈 Faturamento no Período")
+    view_mode = st.radio("Visualizar por:", ["Mês", "Dia"], horizontal=True, key=f'view_{chave}')
+    titulo = titulo_mes if view_mode == 'Mês' else titulo_dia
+    mostrar_grafico(('faturamento', view_mode) + estado,
+                    lambda: grafico_faturamento(faturamento_diario(selecao), view_mode, titulo))
+
+@fragmento
+def secao_novos_recompra(selecao, estado, chave, titulo):
+    secao("Novos Clientes vs Recompra")
+    st.subheader("🎯 Novos Clientes vs Recompra")
+    referencia = st.radio("Cliente novo é a primeira compra:", OPCOES_PRIMEIRA_COMPRA, horizontal=True, key=f'primeira_compra_{chave}')
+    if 'Código Venda' not in fonte['colunas']:
+        st.warning(AVISO_SEM_CODIGO_VENDA_RECOMPRA)
+    contagem_tipo = novos_recompra(selecao, historico=referencia == OPCOES_PRIMEIRA_COMPRA[1])
+    if not contagem_tipo.empty:
+        mostrar_grafico(('novos_recompra', referencia) + estado, lambda: grafico_novos_recompra(contagem_tipo, titulo))
+
+@fragmento
+def secao_top_produtos(selecao, estado, chave, titulo):
+    secao("Top 10 Produtos Mais Vendidos")
+    st.subheader("📦 Top 10 Produtos Mais Vendidos")
+    analise_produtos_por = st.radio("Analisar por:", ["Quantidade", "Faturamento"], horizontal=True, key=f'analise_produtos_{chave}')
+    if 'Produto' in fonte['colunas']:
+        medida = 'Quantidade' if analise_produtos_por == "Quantidade" else 'Valor Total'
+        mostrar_grafico(('top_produtos', medida) + estado,
+                        lambda: grafico_top_produtos(ranking(selecao, 'Produto', medida), medida, titulo.format(analise_produtos_por)))
+    else:
+        st.warning("A coluna 'Descrição' não foi encontrada para gerar o ranking de produtos.")
+
+def rotulos_clientes(tabela):
+    return {cliente: f"{cliente} · {formatar_real(faturamento)} · última compra {ultima:%d/%m/%Y}"
+            for cliente, faturamento, ultima in zip(tabela['Cliente'], tabela['Faturamento'], tabela['Última Compra'])}
+
+def guardar_escolhidos(chave_widget, chave_escolhidos):
+    st.session_state[chave_escolhidos] = st.session_state[chave_widget]
+
+@fragmento
+def secao_previsao(selecao, chave, rotulo, aviso_sem_recorrencia, aviso_sem_selecao):
+    secao("Previsão da Próxima Compra por Cliente")
+    st.subheader("📅 Previsão da Próxima Compra por Cliente")
+    # Só uma página da busca vai para o navegador como opções; os clientes escolhidos ficam na sessão entre buscas.
+    col_busca, col_pagina = st.columns([3, 1])
+    busca = col_busca.text_input("Buscar cliente", key=f'busca_{chave}', placeholder="Início do nome ou de qualquer palavra, com ou sem acentos")
+    encontrados = buscar_clientes(selecao, busca)
+    if encontrados['paginas'] > 1:
+        pagina = col_pagina.number_input(f"Página (de {encontrados['paginas']})", min_value=1, max_value=encontrados['paginas'],
+                                         value=1, key=f'pagina_{chave}_{busca}')
+        encontrados = buscar_clientes(selecao, busca, pagina)
+    st.caption(f"{formatar_inteiro(encontrados['total'])} clientes encontrados, do maior para o menor faturamento no período.")
+
+    # Os escolhidos ficam em `escolhidos_previsao_*`, atualizado pelo on_change. O multiselect tem key e não tem
+    # `default`: mudar o default a cada rerun criava um widget novo e descartava a última escolha. Como a busca muda as
+    # opções (e com elas a identidade do widget), o valor do widget é reposto dos escolhidos antes de desenhá-lo.
+    chave_escolhidos, chave_widget = f'escolhidos_previsao_{chave}', f'clientes_previsao_{chave}'
+    if chave_escolhidos not in st.session_state:
+        st.session_state[chave_escolhidos] = []
+    escolhidos = st.session_state[chave_escolhidos]
+    clientes = indice_clientes(selecao)['clientes']
+    rotulos_pagina = rotulos_clientes(encontrados['clientes'])
+    rotulos = {**rotulos_clientes(clientes[clientes['Cliente'].isin(escolhidos)]), **rotulos_pagina}
+    # Escolhidos que saíram da seleção (filtros mudaram) são descartados.
+    escolhidos = [c for c in escolhidos if c in rotulos]
+    st.session_state[chave_escolhidos] = st.session_state[chave_widget] = escolhidos
+    opcoes = list(rotulos_pagina) + [c for c in escolhidos if c not in rotulos_pagina]
+    selecionados = st.multiselect(rotulo, options=opcoes, key=chave_widget, format_func=lambda c: rotulos.get(c, c),
+                                  on_change=guardar_escolhidos, args=(chave_widget, chave_escolhidos))
+    if selecionados:
+        previsao = previsao_clientes(selecao, selecionados)
+        if not previsao.empty:
+            st.dataframe(previsao, use_container_width=True, hide_index=True, column_config=COLUNAS_PREVISAO)
+        else:
+            st.info(aviso_sem_recorrencia)
+    else:
+        st.info(aviso_sem_selecao)
+
+@fragmento
+def secao_agenda(estado, clientes, fim, chave):
+    secao("Clientes com Recompra Prevista")
+    st.subheader("⏰ Clientes com Recompra Prevista")
+    horizonte = st.slider("Próximos dias (a partir da Data Final)", min_value=1, max_value=90, value=15, key=f'horizonte_{chave}')
+    atrasados = st.checkbox("Incluir recompras atrasadas", value=True, key=f'atrasados_{chave}')
+    agenda = em_cache('agenda', (horizonte, atrasados) + estado,
+                      lambda: clientes_a_recomprar(previsoes, fim, horizonte, clientes=clientes, incluir_atrasados=atrasados))
+    if not agenda.empty:
+        st.dataframe(agenda, use_container_width=True, hide_index=True, column_config=COLUNAS_PREVISAO)
+    else:
+        st.info("Nenhum cliente com recompra prevista nesse intervalo.")
+
 # ====================
 # PÁGINA 1: VISÃO GERAL
 # ====================
 if page == "Visão Geral":
     st.title("📊 Dashboard Comercial - Visão Geral")
+    secao("Indicadores")
     
-    df_filtered = df[
-        (df['Estado'].isin(estados)) & 
-        (df['Franquia'].isin(franquias)) &
-        (df['Data Faturamento Pedido'].dt.date >= start_date) &
-        (df['Data Faturamento Pedido'].dt.date <= end_date)
-    ]
-    if segmentos:
-        df_filtered = df_filtered[df_filtered['Segmento'].isin(segmentos)]
-
-    if df_filtered.empty:
+    selecao_geral = selecionar(fonte, estados, start_date, end_date, franquias=franquias, segmentos=segmentos)
+
+    if vazia(selecao_geral):
         st.warning("Nenhum dado encontrado com os filtros selecionados.")
     else:
-        ticket_medio = calcular_ticket_medio_por_pedido(df_filtered)
+        # Estado dos filtros que alimenta os gráficos desta página: chave do cache de figuras.
+        estado_geral = (fonte['id'], tuple(estados), start_date, end_date, tuple(franquias),
+                        tuple(segmentos) if segmentos is not None else None)
+
+        totais = totais_selecao(selecao_geral)
+        if totais['Pedidos'] is not None:
+            ticket_medio = totais['Valor Total'] / totais['Pedidos'] if totais['Pedidos'] else 0.0
+        else:
+            st.warning(AVISO_SEM_CODIGO_VENDA_TICKET)
+            ticket_medio = 0.0
         st.metric("🎫 Ticket Médio", formatar_real(ticket_medio))
 
-        st.subheader("📈 Faturamento no Período")
-        view_mode_geral = st.radio("Visualizar por:", ["Mês", "Dia"], horizontal=True, key='view_geral')
-        
-        if view_mode_geral == 'Mês':
-            faturamento_grafico = df_filtered.set_index('Data Faturamento Pedido').groupby(pd.Grouper(freq='M'))['Valor Total'].sum().reset_index()
-            faturamento_grafico['Eixo_X'] = faturamento_grafico['Data Faturamento Pedido'].dt.strftime('%b/%y')
-            titulo = "Faturamento Mensal no Período"
-        else: # Dia
-            faturamento_grafico = df_filtered.set_index('Data Faturamento Pedido').groupby(pd.Grouper(freq='D'))['Valor Total'].sum().reset_index()
-            faturamento_grafico['Eixo_X'] = faturamento_grafico['Data Faturamento Pedido']
-            titulo = "Faturamento Diário no Período"
-
-        fig1 = px.line(faturamento_grafico, x='Eixo_X', y='Valor Total', title=titulo, markers=True)
-        fig1.update_traces(line_color=TEAL)
-        fig1.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
-        st.plotly_chart(fig1, use_container_width=True)
-
-        st.subheader("🎯 Novos Clientes vs Recompra")
-        df_com_tipo = classificar_compras(df_filtered)
-        if not df_com_tipo.empty:
-            contagem_tipo = df_com_tipo['Tipo Compra'].value_counts().reset_index()
-            contagem_tipo.columns = ['Tipo Compra', 'Quantidade']
-            fig_pizza = px.pie(contagem_tipo, values='Quantidade', names='Tipo Compra', title="Distribuição de Novos Clientes e Recompras",
-                               color='Tipo Compra', color_discrete_map={'Cliente Novo': TEAL, 'Recompra': SOFT_BLUE})
-            fig_pizza.update_traces(textinfo='percent+label', pull=[0.05, 0.05])
-            fig_pizza.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT, legend_font_color=TEXT_LIGHT)
-            st.plotly_chart(fig_pizza, use_container_width=True)
+        secao_faturamento(selecao_geral, estado_geral, 'geral', "Faturamento Mensal no Período", "Faturamento Diário no Período")
+        secao_novos_recompra(selecao_geral, estado_geral, 'geral', "Distribuição de Novos Clientes e Recompras")
 
+        secao("Top 10 Clientes por Faturamento")
         st.subheader("🏆 Top 10 Clientes por Faturamento")
-        top_clientes = df_filtered.groupby('Cliente')['Valor Total'].sum().nlargest(10)
-        fig_top = px.bar(top_clientes.reset_index(), x='Valor Total', y='Cliente', orientation='h', title="Maiores Clientes por Faturamento")
-        fig_top.update_traces(text=[formatar_numero_abreviado(v) for v in top_clientes], textposition='auto', marker_color=TEAL)
-        fig_top.update_layout(yaxis=dict(autorange="reversed"), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
-        st.plotly_chart(fig_top, use_container_width=True)
-        
-        st.subheader("📦 Top 10 Produtos Mais Vendidos")
-        analise_produtos_por_geral = st.radio("Analisar por:", ["Quantidade", "Faturamento"], horizontal=True, key='analise_produtos_geral')
-        
-        if 'Quantidade' in df_filtered.columns:
-            df_filtered['Produto'] = df_filtered['Descrição'].str.split(' - ').str[1:].str.join(' - ').fillna(df_filtered['Descrição'])
-            
-            if analise_produtos_por_geral == "Quantidade":
-                top_produtos = df_filtered.groupby('Produto')['Quantidade'].sum().nlargest(10)
-                text_labels = [formatar_inteiro(q) for q in top_produtos]
-                fig_prod = px.bar(top_produtos.reset_index(), x='Quantidade', y='Produto', orientation='h', title="Produtos Mais Vendidos por Quantidade",
-                                  color='Quantidade', color_continuous_scale=[SOFT_BLUE, TEAL], text=text_labels)
-                fig_prod.update_traces(textposition='auto', marker_color=SOFT_BLUE)
-            else: # Faturamento
-                top_produtos = df_filtered.groupby('Produto')['Valor Total'].sum().nlargest(10)
-                text_labels = [formatar_numero_abreviado(v) for v in top_produtos]
-                fig_prod = px.bar(top_produtos.reset_index(), x='Valor Total', y='Produto', orientation='h', title="Produtos Mais Vendidos por Faturamento",
-                                  color='Valor Total', color_continuous_scale=[TEAL, SOFT_BLUE], text=text_labels)
-                fig_prod.update_traces(textposition='auto', marker_color=TEAL)
-
-            fig_prod.update_layout(yaxis=dict(autorange="reversed"), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
-            st.plotly_chart(fig_prod, use_container_width=True)
-        else:
-            st.warning("A coluna 'Quantidade' não foi encontrada para gerar o ranking de produtos.")
+        mostrar_grafico(('top_clientes',) + estado_geral,
+                        lambda: grafico_top_clientes(ranking(selecao_geral, 'Cliente', 'Valor Total'), "Maiores Clientes por Faturamento"))
         
+        secao_top_produtos(selecao_geral, estado_geral, 'geral', "Produtos Mais Vendidos por {}")
+
+        secao("Faturamento por Forma de Pagamento")
         st.subheader("💵 Faturamento por Forma de Pagamento")
-        if 'Forma Pagamento' in df_filtered.columns:
-            df_filtered['Forma Pagamento'] = df_filtered['Forma Pagamento'].astype(str).str.strip().replace({r'.*Boleto.*': 'Boleto Bancário', r'.*28.*': 'Boleto Bancário', r'.*35.*': 'Boleto Bancário'}, regex=True)
-            formas_validas = ['Boleto Bancário', 'PIX', 'Dinheiro', 'Permuta']
-            df_pagamento_filtrado = df_filtered[df_filtered['Forma Pagamento'].isin(formas_validas)]
-            fat_forma = df_pagamento_filtrado.groupby('Forma Pagamento')['Valor Total'].sum().reset_index()
-            
-            fig_forma = px.pie(
-                fat_forma, 
-                values='Valor Total', 
-                names='Forma Pagamento', 
-                title="Proporção por Forma de Pagamento",
-                color='Forma Pagamento',
-                color_discrete_map={
-                    'Boleto Bancário': TEAL, 'PIX': SOFT_BLUE,
-                    'Dinheiro': GRAY_LIGHT, 'Permuta': GRAY_DARK
-                }
-            )
-            fig_forma.update_traces(textinfo='percent+label', pull=[0.05] * len(fat_forma))
-            fig_forma.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT, legend_font_color=TEXT_LIGHT)
-            st.plotly_chart(fig_forma, use_container_width=True)
-
-        st.subheader("📅 Previsão da Próxima Compra por Cliente")
-        clientes = sorted(df_filtered['Cliente'].dropna().unique().tolist())
-        selecionados = st.multiselect("Selecione os clientes", options=clientes, default=[])
-        if selecionados:
-            df_sel = df_filtered[df_filtered['Cliente'].isin(selecionados)]
-            previsao = calcular_recorrencia_e_previsao(df_sel)
-            if not previsao.empty:
-                st.dataframe(previsao, use_container_width=True, hide_index=True)
-            else:
-                st.info("Clientes selecionados não têm compras suficientes para calcular a recorrência.")
-        else:
-            st.info("Selecione um ou mais clientes para ver a previsão.")
+        if 'Forma Pagamento' in fonte['colunas']:
+            mostrar_grafico(('formas_pagamento',) + estado_geral,
+                            lambda: grafico_formas_pagamento(formas_pagamento(selecao_geral), "Proporção por Forma de Pagamento"))
+
+        secao("Lista de Clientes")
+        clientes = indice_clientes(selecao_geral)['clientes']['Cliente']
+        secao_previsao(selecao_geral, 'geral', "Selecione os clientes",
+                       "Clientes selecionados não têm compras suficientes para calcular a recorrência.",
+                       "Selecione um ou mais clientes para ver a previsão.")
+        secao_agenda(estado_geral, clientes, end_date, 'geral')
 
 # ====================
 # PÁGINA 2: VISÃO POR GESTOR
 # ====================
 else:
     st.title("👥 Dashboard por Gestor")
-    gestor = st.sidebar.selectbox("Selecione o Gestor", ["Rosimere Barboza de Abreu", "Almir Farias Albuquerque"])
+    secao("Indicadores")
+    gestor = st.sidebar.selectbox("Selecione o Gestor", [g['nome'] for g in CONFIG_GESTORES['gestores']])
+    regra_gestor = regra_do_gestor(gestor)
+    if fonte['backend'] == 'pandas' and fonte['indices_gestores'] is None:
+        fonte['indices_gestores'] = load_indices_gestores(fonte['id'], fonte)
 
     st.sidebar.markdown("---")
     st.sidebar.markdown(f"##### Filtros Específicos ({gestor.split(' ')[0]})")
 
-    agro_keywords = ['AGRO', 'AGRICULTURA', 'RURAL', 'FAZENDA', 'OVOS', 'AVICULTURA']
-    mask_agro = (df['Segmento'].str.contains('|'.join(agro_keywords), case=False, na=False) |
-                 df['Cliente'].str.contains('|'.join(agro_keywords), case=False, na=False))
-
-    if "Almir" in gestor:
-        df_gestor_base = df[df['Vendedor'].str.contains('ALMIR', case=False, na=False) | mask_agro]
-    else: # Rosimere
-        df_gestor_base = df[df['Vendedor'].str.contains('ROSIMERI', case=False, na=False) & ~mask_agro]
-
-    df_gestor_filtrado = df_gestor_base[
-        (df_gestor_base['Estado'].isin(estados)) &
-        (df_gestor_base['Data Faturamento Pedido'].dt.date >= start_date) &
-        (df_gestor_base['Data Faturamento Pedido'].dt.date <= end_date)
-    ]
+    segmentos_presentes = segmentos_selecao(selecionar(fonte, estados, start_date, end_date, gestor=gestor))
 
     segmentos_selecionados_gestor = []
-    if 'Segmento' in df_gestor_filtrado.columns:
-        if "Rosimere" in gestor:
-            rosimeri_segments_by_state = {
-                'PB': ['INSTITUCIONAL', 'INDUSTRIAL', 'CLIENTE FÁBRICA'],
-                'PE': ['INDUSTRIAL'],
-                'RN': ['INDUSTRIAL']
-            }
+    if 'Segmento' in fonte['colunas']:
+        if 'segmentos_por_estado' in regra_gestor:
             allowed_segments = set()
             for state in estados:
-                allowed_segments.update(rosimeri_segments_by_state.get(state, []))
+                allowed_segments.update(regra_gestor['segmentos_por_estado'].get(state, []))
             
-            options = sorted([s for s in allowed_segments if s in df_gestor_filtrado['Segmento'].unique()])
+            options = sorted([s for s in allowed_segments if s in segmentos_presentes])
             segmentos_selecionados_gestor = st.sidebar.multiselect("Segmentos Atendidos", options=options, default=options)
-        else: # Almir
-            options = sorted(df_gestor_filtrado['Segmento'].dropna().unique())
+        else:
+            options = segmentos_presentes
             segmentos_selecionados_gestor = st.sidebar.multiselect("Segmentos Atendidos", options=options, default=options)
 
-    if segmentos_selecionados_gestor:
-        df_gestor = df_gestor_filtrado[df_gestor_filtrado['Segmento'].isin(segmentos_selecionados_gestor)]
-    else:
-        df_gestor = df_gestor_filtrado
+    selecao_gestor = selecionar(fonte, estados, start_date, end_date, segmentos=segmentos_selecionados_gestor, gestor=gestor)
         
-    if df_gestor.empty:
+    if vazia(selecao_gestor):
         st.warning("Nenhum dado encontrado para o gestor com os filtros selecionados.")
     else:
+        estado_gestor = (fonte['id'], gestor, tuple(estados), start_date, end_date, tuple(segmentos_selecionados_gestor))
+
         col1, col2, col3 = st.columns(3)
         
-        faturamento_total_gestor = df_gestor['Valor Total'].sum()
+        totais_gestor = totais_selecao(selecao_gestor)
+        faturamento_total_gestor = totais_gestor['Valor Total']
         col1.metric("💰 Faturamento Total", formatar_numero_abreviado(faturamento_total_gestor))
 
-        ticket_gestor = calcular_ticket_medio_por_pedido(df_gestor)
+        pedidos_unicos_gestor = int(totais_gestor['Pedidos']) if totais_gestor['Pedidos'] is not None else None
+
+        if pedidos_unicos_gestor is not None:
+            ticket_gestor = faturamento_total_gestor / pedidos_unicos_gestor if pedidos_unicos_gestor else 0.0
+        else:
+            st.warning(AVISO_SEM_CODIGO_VENDA_TICKET)
+            ticket_gestor = 0.0
         col2.metric("🎫 Ticket Médio", formatar_real(ticket_gestor))
 
-        if 'Código Venda' in df_gestor.columns:
-            pedidos_unicos_gestor = df_gestor['Código Venda'].nunique()
+        if pedidos_unicos_gestor is not None:
             col3.metric("🛒 Pedidos Únicos", f"{pedidos_unicos_gestor}")
 
-        st.subheader("📈 Faturamento no Período")
-        view_mode_gestor = st.radio("Visualizar por:", ["Mês", "Dia"], horizontal=True, key='view_gestor')
-        
-        if view_mode_gestor == 'Mês':
-            faturamento_grafico_gestor = df_gestor.set_index('Data Faturamento Pedido').groupby(pd.Grouper(freq='M'))['Valor Total'].sum().reset_index()
-            faturamento_grafico_gestor['Eixo_X'] = faturamento_grafico_gestor['Data Faturamento Pedido'].dt.strftime('%b/%y')
-            titulo_gestor = f"Faturamento Mensal - {gestor}"
-        else: # Dia
-            faturamento_grafico_gestor = df_gestor.set_index('Data Faturamento Pedido').groupby(pd.Grouper(freq='D'))['Valor Total'].sum().reset_index()
-            faturamento_grafico_gestor['Eixo_X'] = faturamento_grafico_gestor['Data Faturamento Pedido']
-            titulo_gestor = f"Faturamento Diário - {gestor}"
-
-        fig5 = px.line(faturamento_grafico_gestor, x='Eixo_X', y='Valor Total', title=titulo_gestor, markers=True)
-        fig5.update_traces(line_color=TEAL)
-        fig5.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
-        st.plotly_chart(fig5, use_container_width=True)
-
-        st.subheader("🎯 Novos Clientes vs Recompra")
-        df_gestor_tipo = classificar_compras(df_gestor)
-        if not df_gestor_tipo.empty:
-            contagem_tipo_gestor = df_gestor_tipo['Tipo Compra'].value_counts().reset_index()
-            contagem_tipo_gestor.columns = ['Tipo Compra', 'Quantidade']
-            fig_pizza_gestor = px.pie(contagem_tipo_gestor, values='Quantidade', names='Tipo Compra', title=f"Novos vs Recompra - {gestor}",
-                                      color='Tipo Compra', color_discrete_map={'Cliente Novo': TEAL, 'Recompra': SOFT_BLUE})
-            fig_pizza_gestor.update_traces(textinfo='percent+label', pull=[0.05, 0.05])
-            fig_pizza_gestor.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT, legend_font_color=TEXT_LIGHT)
-            st.plotly_chart(fig_pizza_gestor, use_container_width=True)
+        secao_faturamento(selecao_gestor, estado_gestor, 'gestor', f"Faturamento Mensal - {gestor}", f"Faturamento Diário - {gestor}")
+        secao_novos_recompra(selecao_gestor, estado_gestor, 'gestor', f"Novos vs Recompra - {gestor}")
 
+        secao("Top 10 Clientes por Faturamento")
         st.subheader("🏆 Top 10 Clientes por Faturamento")
-        top_clientes_gestor = df_gestor.groupby('Cliente')['Valor Total'].sum().nlargest(10)
-        fig_top_clientes_gestor = px.bar(top_clientes_gestor.reset_index(), x='Valor Total', y='Cliente', orientation='h', title=f"Top 10 Clientes por Faturamento - {gestor}")
-        fig_top_clientes_gestor.update_traces(text=[formatar_numero_abreviado(v) for v in top_clientes_gestor], textposition='auto', marker_color=TEAL)
-        fig_top_clientes_gestor.update_layout(yaxis=dict(autorange="reversed"), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
-        st.plotly_chart(fig_top_clientes_gestor, use_container_width=True)
+        mostrar_grafico(('top_clientes',) + estado_gestor,
+                        lambda: grafico_top_clientes(ranking(selecao_gestor, 'Cliente', 'Valor Total'), f"Top 10 Clientes por Faturamento - {gestor}"))
         
-        st.subheader("📦 Top 10 Produtos Mais Vendidos")
-        analise_produtos_por_gestor = st.radio("Analisar por:", ["Quantidade", "Faturamento"], horizontal=True, key='analise_produtos_gestor')
+        secao_top_produtos(selecao_gestor, estado_gestor, 'gestor', f"Top Produtos Vendidos por {{}} - {gestor}")
 
-        if 'Quantidade' in df_gestor.columns:
-            df_gestor['Produto'] = df_gestor['Descrição'].str.split(' - ').str[1:].str.join(' - ').fillna(df_gestor['Descrição'])
-            
-            if analise_produtos_por_gestor == "Quantidade":
-                top_produtos_gestor = df_gestor.groupby('Produto')['Quantidade'].sum().nlargest(10)
-                text_labels_gestor = [formatar_inteiro(q) for q in top_produtos_gestor]
-                fig_top_produtos_gestor = px.bar(top_produtos_gestor.reset_index(), x='Quantidade', y='Produto', orientation='h', title=f"Top Produtos Vendidos por Quantidade - {gestor}",
-                                                 color='Quantidade', color_continuous_scale=[SOFT_BLUE, TEAL], text=text_labels_gestor)
-                fig_top_produtos_gestor.update_traces(textposition='auto', marker_color=SOFT_BLUE)
-            else: # Faturamento
-                top_produtos_gestor = df_gestor.groupby('Produto')['Valor Total'].sum().nlargest(10)
-                text_labels_gestor = [formatar_numero_abreviado(v) for v in top_produtos_gestor]
-                fig_top_produtos_gestor = px.bar(top_produtos_gestor.reset_index(), x='Valor Total', y='Produto', orientation='h', title=f"Top Produtos Vendidos por Faturamento - {gestor}",
-                                                 color='Valor Total', color_continuous_scale=[TEAL, SOFT_BLUE], text=text_labels_gestor)
-                fig_top_produtos_gestor.update_traces(textposition='auto', marker_color=TEAL)
-
-            fig_top_produtos_gestor.update_layout(yaxis=dict(autorange="reversed"), plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
-            st.plotly_chart(fig_top_produtos_gestor, use_container_width=True)
-        else:
-            st.warning("A coluna 'Quantidade' não foi encontrada para gerar o ranking de produtos.")
-        
+        secao("Faturamento por Forma de Pagamento")
         st.subheader("💵 Faturamento por Forma de Pagamento")
-        if 'Forma Pagamento' in df_gestor.columns:
-            df_gestor['Forma Pagamento'] = df_gestor['Forma Pagamento'].astype(str).str.strip().replace({r'.*Boleto.*': 'Boleto Bancário', r'.*28.*': 'Boleto Bancário', r'.*35.*': 'Boleto Bancário'}, regex=True)
-            formas_validas = ['Boleto Bancário', 'PIX', 'Dinheiro', 'Permuta']
-            df_pagamento_gestor_filtrado = df_gestor[df_gestor['Forma Pagamento'].isin(formas_validas)]
-            faturamento_por_forma_gestor = df_pagamento_gestor_filtrado.groupby('Forma Pagamento')['Valor Total'].sum().reset_index()
-
-            fig_pagamento_gestor = px.pie(
-                faturamento_por_forma_gestor,
-                values='Valor Total',
-                names='Forma Pagamento',
-                title=f"Proporção por Forma de Pagamento - {gestor}",
-                color='Forma Pagamento',
-                color_discrete_map={
-                    'Boleto Bancário': TEAL, 'PIX': SOFT_BLUE,
-                    'Dinheiro': GRAY_LIGHT, 'Permuta': GRAY_DARK
-                }
-            )
-            fig_pagamento_gestor.update_traces(textinfo='percent+label', pull=[0.05] * len(faturamento_por_forma_gestor))
-            fig_pagamento_gestor.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT, legend_font_color=TEXT_LIGHT)
-            st.plotly_chart(fig_pagamento_gestor, use_container_width=True)
-
-        st.subheader("📅 Previsão da Próxima Compra por Cliente")
-        clientes_disponiveis_gestor = sorted(df_gestor['Cliente'].dropna().unique().tolist())
-        clientes_selecionados_gestor = st.multiselect("Selecione os clientes ", options=clientes_disponiveis_gestor, default=[])
-        if clientes_selecionados_gestor:
-            df_clientes_gestor = df_gestor[df_gestor['Cliente'].isin(clientes_selecionados_gestor)]
-            previsao_gestor_df = calcular_recorrencia_e_previsao(df_clientes_gestor)
-            if not previsao_gestor_df.empty:
-                st.dataframe(previsao_gestor_df, use_container_width=True, hide_index=True)
-            else:
-                st.info("Os clientes selecionados não têm mais de um pedido para calcular recorrência.")
-        else:
-            st.info("Selecione um ou mais clientes acima.")
+        if 'Forma Pagamento' in fonte['colunas']:
+            mostrar_grafico(('formas_pagamento',) + estado_gestor,
+                            lambda: grafico_formas_pagamento(formas_pagamento(selecao_gestor), f"Proporção por Forma de Pagamento - {gestor}"))
+
+        secao("Lista de Clientes")
+        clientes_disponiveis_gestor = indice_clientes(selecao_gestor)['clientes']['Cliente']
+        secao_previsao(selecao_gestor, 'gestor', "Selecione os clientes ",
+                       "Os clientes selecionados não têm mais de um pedido para calcular recorrência.",
+                       "Selecione um ou mais clientes acima.")
+        secao_agenda(estado_gestor, clientes_disponiveis_gestor, end_date, 'gestor')
 
 # Rodapé
 st.sidebar.markdown("---")
 st.sidebar.info("Dashboard criado com Streamlit")
+
+# ====================
+# Performance do rerun
+# ====================
+desempenho = finalizar_medicao(
+    sessao=st.session_state['id_sessao'], rerun=st.session_state['reruns'], pagina=page, linhas=opcoes['linhas'],
+    motor=fonte['backend'], compacto=esquema_compacto, estados=len(estados), inicio=start_date.isoformat(), fim=end_date.isoformat(),
+)
+if mostrar_performance:
+    secoes_perf, funcoes_perf, cache_perf = tabelas_desempenho(desempenho)
+    with painel_performance.expander("⏱️ Performance", expanded=True):
+        st.metric("Tempo do rerun", f"{desempenho['total_ms']:,.0f} ms".replace(',', '.'))
+        if desempenho['rss_mb'] is not None:
+            st.caption(f"Memória do processo: {desempenho['rss_mb']:.0f} MB ({desempenho['rss_delta_mb']:+.1f} MB neste rerun)")
+        st.markdown("**Seções**")
+        st.dataframe(secoes_perf, use_container_width=True, hide_index=True)
+        st.markdown("**Funções**")
+        st.dataframe(funcoes_perf, use_container_width=True, hide_index=True)
+        st.markdown("**Cache**")
+        st.dataframe(cache_perf, use_container_width=True, hide_index=True)
+        compartilhado = estatisticas_cache()
+        st.markdown("**Cache compartilhado**")
+        st.caption(f"{compartilhado['entradas']} entradas: {compartilhado['memoria_mb']:.1f} de {compartilhado['orcamento_memoria_mb']:.0f} MB "
+                   f"em memória, {compartilhado['disco_mb']:.1f} MB em disco. Acertos e despejos desde o início do processo.")
+        st.dataframe(tabela_cache(compartilhado), use_container_width=True, hide_index=True)
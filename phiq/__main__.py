@@ -0,0 +1,81 @@
+import argparse
+import time
+
+from phiq.relatorio import PERIODOS_PADRAO, gerar_relatorios
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m phiq", description="Ferramentas de linha de comando do Dashboard PHIQ.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    report = subparsers.add_parser("report", help="Gera relatórios HTML/Parquet para cada gestor x franquia x período.")
+    report.add_argument("--input", required=True, nargs="+",
+                        help="CSVs de PedidosItens, pastas ou .zip (um arquivo por franquia; ver franquias.json).")
+    report.add_argument("--out", required=True, help="Pasta de saída dos relatórios.")
+    report.add_argument("--periodos", type=int, nargs="+", default=PERIODOS_PADRAO,
+                        help="Períodos em dias, contados a partir da última data do arquivo (padrão: 30 90 365).")
+    report.add_argument("--processos", type=int, default=None,
+                        help="Número de processos do pool (padrão: um por núcleo; 1 roda sem pool). Sem fork (macOS, Windows), "
+                             "cada processo recebe uma cópia serializada dos dados carregados.")
+    report.add_argument("--compacto", action="store_true", help="Usa o esquema compacto (categorias) na carga.")
+
+    gerar = subparsers.add_parser("gerar", help="Gera um CSV sintético de PedidosItens.")
+    gerar.add_argument("--linhas", required=True, help="Número de linhas (ex.: 10k, 1M, 10M).")
+    gerar.add_argument("--out", required=True, help="Caminho do CSV gerado.")
+    gerar.add_argument("--clientes", type=int, default=None, help="Número de clientes distintos (padrão: proporcional às linhas).")
+    gerar.add_argument("--produtos", type=int, default=None, help="Número de produtos distintos (padrão: proporcional às linhas).")
+    gerar.add_argument("--semente", type=int, default=0)
+
+    importar = subparsers.add_parser("importar", help="Normaliza um CSV em blocos e grava uma pasta Parquet para o motor DuckDB.")
+    importar.add_argument("--input", required=True, nargs="+", help="CSVs de PedidosItens, pastas ou .zip.")
+    importar.add_argument("--out", required=True, help="Pasta Parquet de saída (substituída se existir).")
+
+    atualizar = subparsers.add_parser("atualizar", help="Incorpora um CSV (delta) ao histórico incremental local.")
+    atualizar.add_argument("--input", required=True, nargs="+", help="CSVs (pastas ou .zip) com os pedidos novos ou alterados.")
+    atualizar.add_argument("--historico", default=None, help="Pasta do histórico (padrão: PHIQ_HISTORICO ou .phiq_historico).")
+
+    bench = subparsers.add_parser("bench", help="Mede as etapas de análise sobre arquivos sintéticos e grava o resultado em JSON.")
+    bench.add_argument("--tamanhos", nargs="+", default=None, help="Tamanhos a medir (padrão: 10k 1M).")
+    bench.add_argument("--out", default="benchmark.json", help="Arquivo JSON de saída.")
+    bench.add_argument("--dados", default=None, help="Pasta onde os CSVs sintéticos são gerados e reaproveitados.")
+    bench.add_argument("--repeticoes", type=int, default=3)
+    bench.add_argument("--clientes", type=int, default=None)
+    bench.add_argument("--produtos", type=int, default=None)
+    bench.add_argument("--semente", type=int, default=0)
+    bench.add_argument("--comparar", default=None, help="JSON de uma execução anterior para comparar as medianas.")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if args.comando == "report":
+        resumo = gerar_relatorios(args.input, args.out, periodos=args.periodos, processos=args.processos, compacto=args.compacto)
+        print(f"{len(resumo)} relatórios gerados em {args.out} ({time.perf_counter() - inicio:.1f}s)")
+    elif args.comando == "gerar":
+        from phiq.sintetico import gerar_pedidos, interpretar_tamanho
+        gerar_pedidos(args.out, interpretar_tamanho(args.linhas), clientes=args.clientes, produtos=args.produtos, semente=args.semente)
+        print(f"{args.out} gerado ({time.perf_counter() - inicio:.1f}s)")
+    elif args.comando == "importar":
+        from phiq.dados import csvs_e_franquias, importar_varios, ler_conversao, ler_entradas
+        importar_varios(*csvs_e_franquias(ler_entradas(args.input)), args.out)
+        conversao = ler_conversao(args.out)
+        print(f"{args.out} gerado: {conversao['linhas_lidas'] - conversao['linhas_descartadas']} linhas, "
+              f"{conversao['linhas_descartadas']} descartadas ({time.perf_counter() - inicio:.1f}s)")
+    elif args.comando == "atualizar":
+        from phiq import historico
+        from phiq.dados import ler_entradas
+        for resumo in historico.incorporar_arquivos(ler_entradas(args.input), args.historico or historico.PASTA_HISTORICO):
+            print(f"{resumo['arquivo']}: {resumo['linhas_novas']} linhas novas, {resumo['linhas_substituidas']} substituídas, "
+                  f"{resumo['conversao']['linhas_descartadas']} descartadas, {len(resumo['meses_atualizados'])} meses regravados")
+        print(f"Histórico atualizado ({time.perf_counter() - inicio:.1f}s)")
+    elif args.comando == "bench":
+        from phiq import benchmark
+        resultado = benchmark.executar_benchmark(
+            tamanhos=args.tamanhos or benchmark.TAMANHOS_PADRAO, pasta_dados=args.dados or benchmark.PASTA_DADOS_PADRAO,
+            repeticoes=args.repeticoes, clientes=args.clientes, produtos=args.produtos, semente=args.semente)
+        benchmark.salvar_resultado(resultado, args.out)
+        if args.comparar:
+            print(benchmark.comparar_resultados(benchmark.carregar_resultado(args.comparar), resultado).to_string(index=False))
+        else:
+            print(benchmark.tabela_resultado(resultado).to_string(index=False))
+        print(f"Resultado gravado em {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+from phiq.dados import REGRAS_NORMALIZACAO
+from phiq.instrumentacao import instrumentar
+
+# ====================
+# Funções de Análise
+# ====================
+# Sem 'Código Venda', o ticket médio é 0 e "Novos x Recompra" compara datas; a interface exibe estes avisos.
+AVISO_SEM_CODIGO_VENDA_TICKET = "Coluna 'Código Venda' não encontrada para calcular o Ticket Médio."
+AVISO_SEM_CODIGO_VENDA_RECOMPRA = "Coluna 'Código Venda' não encontrada. A análise de 'Novos x Recompra' pode ser imprecisa."
+
+NS_POR_DIA = 86_400_000_000_000
+
+@instrumentar
+def prever_proximas_compras(df, cliente_col='Cliente', date_col='Data Faturamento Pedido'):
+    # Previsão para toda a carteira em uma passada: os dias de compra únicos são ordenados por (cliente, dia) e
+    # cada cliente vira um segmento contíguo dos arrays; ritmo = mediana dos intervalos entre compras do segmento.
+    validos = df[[cliente_col, date_col]].dropna()
+    codigos, clientes = pd.factorize(validos[cliente_col], sort=True)
+    dias = validos[date_col].to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_POR_DIA
+
+    # (cliente, dia) vira uma única chave inteira: deduplicar por hash e ordenar só os pares únicos.
+    primeiro_dia = dias.min() if len(dias) else 0
+    amplitude = int(dias.max() - primeiro_dia + 1) if len(dias) else 1
+    chaves = np.sort(pd.unique(codigos.astype(np.int64) * amplitude + (dias - primeiro_dia)))
+    codigos, dias = chaves // amplitude, chaves % amplitude + primeiro_dia
+
+    inicio = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]])
+    n_compras = np.diff(np.r_[inicio, len(codigos)])
+    recorrentes = n_compras >= 2
+
+    mesmo_cliente = codigos[1:] == codigos[:-1]
+    intervalos = np.diff(dias)[mesmo_cliente]
+    # Ordena os intervalos dentro de cada cliente (mesma técnica da chave combinada acima).
+    maior_intervalo = int(intervalos.max()) + 1 if len(intervalos) else 1
+    intervalos = np.sort(codigos[1:][mesmo_cliente] * maior_intervalo + intervalos) % maior_intervalo
+    n_intervalos = n_compras[recorrentes] - 1
+    inicio_intervalos = np.cumsum(n_intervalos) - n_intervalos
+    mediana = (intervalos[inicio_intervalos + (n_intervalos - 1) // 2] + intervalos[inicio_intervalos + n_intervalos // 2]) / 2
+    ritmo = np.round(mediana).astype(np.int64)
+
+    ultima = dias[(inicio + n_compras - 1)[recorrentes]]
+    return pd.DataFrame({
+        'Cliente': clientes.take(codigos[inicio[recorrentes]]),
+        'Nº de Compras': n_compras[recorrentes],
+        'Ritmo (dias)': ritmo,
+        'Última Compra': (ultima * NS_POR_DIA).view('datetime64[ns]'),
+        'Próxima Compra': ((ultima + ritmo) * NS_POR_DIA).view('datetime64[ns]'),
+    })
+
+def calcular_recorrencia_e_previsao(df, cliente_col='Cliente', date_col='Data Faturamento Pedido'):
+    if df.empty or len(df) < 2:
+        return pd.DataFrame()
+    return prever_proximas_compras(df, cliente_col=cliente_col, date_col=date_col)
+
+@instrumentar
+def clientes_a_recomprar(previsoes, data_referencia, horizonte_dias, clientes=None, incluir_atrasados=True):
+    dias_ate_compra = (previsoes['Próxima Compra'] - pd.Timestamp(data_referencia)).dt.days
+    mask = dias_ate_compra <= horizonte_dias
+    # Atrasados entram só dentro da mesma janela, para não listar clientes que pararam de comprar há anos.
+    mask &= dias_ate_compra >= (-horizonte_dias if incluir_atrasados else 0)
+    if clientes is not None:
+        mask &= previsoes['Cliente'].isin(clientes)
+    return previsoes[mask].assign(**{'Dias até a Compra': dias_ate_compra[mask]}).sort_values(
+        ['Dias até a Compra', 'Cliente'], ignore_index=True)
+
+@instrumentar
+def construir_primeiras_compras(df, cliente_col='Cliente', date_col='Data Faturamento Pedido', venda_col='Código Venda'):
+    # Com o df ordenado por data (estável), a primeira linha de cada cliente é a do idxmin da versão anterior.
+    colunas = [cliente_col, date_col] + ([venda_col] if venda_col in df.columns else [])
+    primeiras = df[colunas].dropna(subset=[cliente_col, date_col]).drop_duplicates(subset=cliente_col, keep='first')
+    return primeiras.rename(columns={date_col: 'Primeira_Compra', venda_col: 'Primeira_Venda_Codigo'}).set_index(cliente_col)
+
+def _primeira_do_cliente(clientes, primeiras_compras, coluna, **to_numpy):
+    # Busca posicional sobre valores object: com o esquema compacto o `map` de uma categórica mapeia as categorias, não
+    # as linhas. Devolve quais linhas têm cliente na tabela e o valor de `coluna` da primeira compra de cada uma.
+    posicoes = pd.Index(np.asarray(primeiras_compras.index, dtype=object)).get_indexer(np.asarray(clientes, dtype=object))
+    return posicoes >= 0, primeiras_compras[coluna].to_numpy(**to_numpy)[posicoes]
+
+@instrumentar
+def classificar_compras(df, primeiras_compras=None, cliente_col='Cliente', date_col='Data Faturamento Pedido', venda_col='Código Venda'):
+    # primeiras_compras: tabela de `construir_primeiras_compras` sobre o histórico completo ("primeira compra de todas").
+    # Sem ela, a primeira compra é a de cada cliente dentro do próprio df filtrado.
+    if df.empty or date_col not in df.columns:
+        return pd.DataFrame()
+    if primeiras_compras is None:
+        primeiras_compras = construir_primeiras_compras(df, cliente_col=cliente_col, date_col=date_col, venda_col=venda_col)
+
+    if venda_col not in df.columns:
+        df_com_cliente = df[df[cliente_col].notna()]
+        encontrado, primeira_compra = _primeira_do_cliente(df_com_cliente[cliente_col], primeiras_compras, 'Primeira_Compra')
+        novo = encontrado & (df_com_cliente[date_col].dt.normalize().to_numpy() == pd.DatetimeIndex(primeira_compra).normalize())
+        return df_com_cliente[[cliente_col, date_col]].assign(**{'Tipo Compra': np.where(novo, 'Cliente Novo', 'Recompra')})
+
+    # Códigos vazios viram None (e não pd.NA, que não compara), inclusive os do histórico (texto). Um código vazio
+    # nunca é a primeira venda, mesmo que a primeira compra do cliente também não tenha código (como o NULL do SQL).
+    encontrado, primeira_venda = _primeira_do_cliente(df[cliente_col], primeiras_compras, 'Primeira_Venda_Codigo', dtype=object, na_value=None)
+    codigos = df[venda_col].to_numpy(dtype=object, na_value=None)
+    novo = encontrado & pd.notna(codigos) & (codigos == primeira_venda)
+    return df[[cliente_col, date_col, venda_col]].assign(**{'Tipo Compra': np.where(novo, 'Cliente Novo', 'Recompra')})
+
+def calcular_ticket_medio_por_pedido(df):
+    if df.empty: return 0.0
+    if 'Código Venda' in df.columns:
+        faturamento_total = df['Valor Total'].sum()
+        numero_de_pedidos = df['Código Venda'].nunique()
+        if numero_de_pedidos == 0: return 0.0
+        return faturamento_total / numero_de_pedidos
+    return 0.0
+
+# ====================
+# Cubo diário pré-agregado
+# ====================
+# Construído uma vez por carga: os gráficos e métricas leem o cubo (uma linha por combinação de dia e dimensões)
+# em vez de reagrupar as linhas de itens a cada rerun. Cliente e Produto ficam em cubos separados: juntos, quase
+# toda combinação de dia, cliente e produto é única e o cubo teria praticamente o tamanho das linhas de itens. Os
+# pedidos únicos ficam numa tabela à parte, com uma linha por (pedido, dia, dimensões do pedido), porque contagens
+# distintas não podem ser somadas entre células do cubo.
+DIMENSOES_CUBO = ['Estado', 'Franquia', 'Segmento', 'Gestor', 'Cliente', 'Forma Pagamento']
+DIMENSOES_CUBO_PRODUTOS = ['Estado', 'Franquia', 'Segmento', 'Gestor', 'Produto']
+DIMENSOES_PEDIDO = ['Estado', 'Franquia', 'Segmento', 'Vendedor', 'Cliente', 'Gestor']
+FORMAS_PAGAMENTO_VALIDAS = REGRAS_NORMALIZACAO['Forma Pagamento']['validos']
+
+@instrumentar
+def construir_cubo(df, dimensoes=DIMENSOES_CUBO, date_col='Data Faturamento Pedido'):
+    base = df[[c for c in dimensoes if c in df.columns] + ['Valor Total', 'Quantidade']].copy()
+    base[date_col] = df[date_col].dt.normalize()
+    chaves = [date_col] + [c for c in dimensoes if c in base.columns]
+    cubo = base.groupby(chaves, observed=True, dropna=False, sort=False).agg(
+        **{'Valor Total': ('Valor Total', 'sum'), 'Quantidade': ('Quantidade', 'sum'), 'Itens': ('Valor Total', 'size')}
+    ).reset_index()
+    return cubo.sort_values(date_col, kind='stable', ignore_index=True)
+
+@instrumentar
+def construir_tabela_pedidos(df, date_col='Data Faturamento Pedido', venda_col='Código Venda'):
+    if venda_col not in df.columns:
+        return None
+    colunas = [venda_col] + [c for c in DIMENSOES_PEDIDO if c in df.columns]
+    pedidos = df[colunas].copy()
+    pedidos[date_col] = df[date_col].dt.normalize()
+    return pedidos.drop_duplicates().sort_values(date_col, kind='stable', ignore_index=True)
+
+def fatiar_periodo(tabela, start_date, end_date, date_col='Data Faturamento Pedido'):
+    # Exige a tabela ordenada por `date_col` (garantido por load_data e pelos construtores do cubo).
+    datas = tabela[date_col].to_numpy()
+    inicio = datas.searchsorted(pd.Timestamp(start_date).to_datetime64(), side='left')
+    fim = datas.searchsorted((pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+    return tabela.iloc[inicio:fim]
+
+@instrumentar
+def filtrar_tabela(tabela, estados, start_date, end_date, franquias=None, segmentos=None, date_col='Data Faturamento Pedido'):
+    tabela = fatiar_periodo(tabela, start_date, end_date, date_col=date_col)
+    mask = tabela['Estado'].isin(estados)
+    if franquias is not None:
+        mask &= tabela['Franquia'].isin(franquias)
+    if segmentos:
+        mask &= tabela['Segmento'].isin(segmentos)
+    return tabela[mask]
+
+@instrumentar
+def faturamento_por_periodo(cubo, freq, date_col='Data Faturamento Pedido'):
+    return cubo.groupby(pd.Grouper(key=date_col, freq=freq))['Valor Total'].sum().reset_index()
+
+@instrumentar
+def top_10(cubo, dimensao, medida):
+    return cubo.groupby(dimensao, observed=True)[medida].sum().nlargest(10)
+
+@instrumentar
+def faturamento_por_forma_pagamento(cubo):
+    por_forma = cubo.groupby('Forma Pagamento', observed=True)['Valor Total'].sum()
+    return por_forma[por_forma.index.isin(FORMAS_PAGAMENTO_VALIDAS)].reset_index()
+
+# ====================
+# Somas acumuladas por dia
+# ====================
+# Matrizes (dias + 1) x (combinações de Estado/Franquia/Segmento/Gestor) com a soma acumulada de cada medida.
+# O total de qualquer período é a diferença entre duas linhas, somada só nas combinações selecionadas.
+CHAVES_ACUMULADOS = ['Estado', 'Franquia', 'Segmento', 'Gestor']
+
+def _acumular(linhas, colunas, valores, n_dias, n_combinacoes):
+    matriz = np.bincount((linhas + 1) * n_combinacoes + colunas, weights=valores, minlength=(n_dias + 1) * n_combinacoes)
+    return matriz.reshape(n_dias + 1, n_combinacoes).cumsum(axis=0)
+
+@instrumentar
+def construir_acumulados(cubo, pedidos, date_col='Data Faturamento Pedido', venda_col='Código Venda'):
+    chaves = [c for c in CHAVES_ACUMULADOS if c in cubo.columns]
+    combinacoes = cubo[chaves].drop_duplicates(ignore_index=True)
+    combinacoes['_combinacao'] = np.arange(len(combinacoes))
+    dias = np.unique(cubo[date_col].to_numpy())
+
+    celulas = cubo[[date_col] + chaves].merge(combinacoes, on=chaves, how='left')
+    linhas = dias.searchsorted(celulas[date_col].to_numpy())
+    colunas = celulas['_combinacao'].to_numpy()
+    acumulados = {
+        'dias': dias,
+        'combinacoes': combinacoes.drop(columns='_combinacao'),
+        'Valor Total': _acumular(linhas, colunas, cubo['Valor Total'].to_numpy(dtype=float), len(dias), len(combinacoes)),
+        'Quantidade': _acumular(linhas, colunas, cubo['Quantidade'].to_numpy(dtype=float), len(dias), len(combinacoes)),
+        'Pedidos': None,
+    }
+
+    if pedidos is not None:
+        pedidos_por_celula = pedidos[[venda_col, date_col] + chaves].drop_duplicates()
+        # Contagens diárias só podem ser somadas entre dias/combinações se cada pedido cair numa única célula.
+        if pedidos_por_celula[venda_col].is_unique:
+            celulas = pedidos_por_celula.merge(combinacoes, on=chaves, how='left')
+            linhas = dias.searchsorted(celulas[date_col].to_numpy())
+            acumulados['Pedidos'] = _acumular(linhas, celulas['_combinacao'].to_numpy(), np.ones(len(celulas)), len(dias), len(combinacoes))
+    return acumulados
+
+@instrumentar
+def totais_periodo(acumulados, start_date, end_date, estados, franquias=None, segmentos=None, gestores=None):
+    dias = acumulados['dias']
+    inicio = dias.searchsorted(pd.Timestamp(start_date).to_datetime64(), side='left')
+    fim = dias.searchsorted((pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_datetime64(), side='left')
+
+    combinacoes = acumulados['combinacoes']
+    mask = combinacoes['Estado'].isin(estados).to_numpy()
+    if franquias is not None:
+        mask &= combinacoes['Franquia'].isin(franquias).to_numpy()
+    if segmentos:
+        mask &= combinacoes['Segmento'].isin(segmentos).to_numpy()
+    if gestores is not None:
+        mask &= combinacoes['Gestor'].isin(gestores).to_numpy()
+
+    totais = {}
+    for medida in ['Valor Total', 'Quantidade', 'Pedidos']:
+        matriz = acumulados[medida]
+        totais[medida] = None if matriz is None else float((matriz[fim, mask] - matriz[inicio, mask]).sum())
+    return totais
+
+@instrumentar
+def indexar_gestores(tabela):
+    # Posições (em ordem crescente, preservando a ordenação por data) das linhas de cada gestor.
+    codigos = tabela['Gestor'].cat.codes.to_numpy()
+    ordem = np.argsort(codigos, kind='stable')
+    limites = np.searchsorted(codigos[ordem], np.arange(len(tabela['Gestor'].cat.categories) + 1))
+    return {gestor: ordem[limites[i]:limites[i + 1]] for i, gestor in enumerate(tabela['Gestor'].cat.categories)}
+
+def filtrar_gestor(tabela, gestor, indice=None):
+    if indice is None:
+        return tabela[tabela['Gestor'] == gestor]
+    return tabela.iloc[indice[gestor]]
+
+# ====================
+# Estruturas derivadas
+# ====================
+def construir_cubo_produtos(df):
+    # Sem a coluna 'Produto' (sem 'Descrição' no CSV) não há ranking de produtos.
+    return construir_cubo(df, DIMENSOES_CUBO_PRODUTOS) if 'Produto' in df.columns else None
+
+def construir_estruturas(df):
+    cubo = construir_cubo(df)
+    cubo_produtos = construir_cubo_produtos(df)
+    pedidos = construir_tabela_pedidos(df)
+    return {
+        'df': df,
+        'cubo': cubo,
+        'cubo_produtos': cubo_produtos,
+        'pedidos': pedidos,
+        'acumulados': construir_acumulados(cubo, pedidos),
+        'primeiras_compras': construir_primeiras_compras(df),
+        'previsoes': prever_proximas_compras(df),
+        'indices_gestores': {
+            'df': indexar_gestores(df),
+            'cubo': indexar_gestores(cubo),
+            'cubo_produtos': indexar_gestores(cubo_produtos) if cubo_produtos is not None else None,
+            'pedidos': indexar_gestores(pedidos) if pedidos is not None else None,
+        },
+    }
@@ -0,0 +1,175 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from phiq import cache, consultas, dados
+from phiq.analise import (
+    calcular_recorrencia_e_previsao, classificar_compras, construir_estruturas, faturamento_por_forma_pagamento,
+    filtrar_tabela, top_10, totais_periodo,
+)
+from phiq.graficos import (
+    grafico_faturamento, grafico_formas_pagamento, grafico_novos_recompra, grafico_top_clientes, grafico_top_produtos,
+)
+from phiq.sintetico import cardinalidade_padrao, gerar_pedidos, interpretar_tamanho
+
+# ====================
+# Benchmark das funções de análise
+# ====================
+# Mede cada etapa que um rerun do dashboard executa sobre arquivos sintéticos de tamanhos diferentes e grava o
+# resultado em JSON, para comparar execuções antes e depois de uma mudança (`comparar_resultados`).
+TAMANHOS_PADRAO = ['10k', '1M']
+PASTA_DADOS_PADRAO = os.environ.get("PHIQ_BENCH_DADOS", ".phiq_bench")
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {'min_s': round(min(tempos), 6), 'mediana_s': round(statistics.median(tempos), 6), 'repeticoes': repeticoes}
+
+def _filtros_tipicos(df):
+    # Últimos 90 dias e metade das UFs: a combinação mais comum de filtros no dashboard.
+    end_date = df['Data Faturamento Pedido'].iloc[-1].normalize()
+    start_date = end_date - pd.Timedelta(days=89)
+    estados = sorted(df['Estado'].dropna().unique())
+    return estados[:max(1, len(estados) // 2)], start_date, end_date
+
+def dividir_csv(dados_brutos, partes):
+    # O mesmo CSV repartido em arquivos de franquias diferentes (linhas intercaladas, cabeçalho repetido).
+    cabecalho, _, corpo = dados_brutos.partition(b'\n')
+    linhas = corpo.splitlines(keepends=True)
+    return [(f"franquia_{i + 1}.csv", cabecalho + b'\n' + b''.join(linhas[i::partes])) for i in range(partes)]
+
+def medir_tamanho(caminho_csv, repeticoes=3):
+    with open(caminho_csv, 'rb') as arquivo:
+        dados_brutos = arquivo.read()
+
+    etapas = {}
+    # Cache em pasta temporária: a primeira carga é sempre fria (normalização completa + gravação do Parquet).
+    cache_original = dados.CACHE_DIR
+    with tempfile.TemporaryDirectory() as pasta_cache:
+        dados.CACHE_DIR = pasta_cache
+        try:
+            etapas['carga_fria'] = cronometrar(lambda: dados.carregar_dados(dados_brutos), 1)
+            etapas['carga_cache'] = cronometrar(lambda: dados.carregar_dados(dados_brutos), repeticoes)
+            # Carga fria dos mesmos dados em quatro arquivos, normalizados no pool de processos.
+            etapas['carga_fria_4_arquivos'] = cronometrar(lambda: dados.carregar_varios(dividir_csv(dados_brutos, 4)), 1)
+            df = dados.carregar_dados(dados_brutos)
+        finally:
+            dados.CACHE_DIR = cache_original
+
+    etapas['estruturas'] = cronometrar(lambda: construir_estruturas(df), 1)
+    estruturas = construir_estruturas(df)
+    cubo, cubo_produtos = estruturas['cubo'], estruturas['cubo_produtos']
+    acumulados, primeiras_compras = estruturas['acumulados'], estruturas['primeiras_compras']
+    estados, start_date, end_date = _filtros_tipicos(df)
+
+    etapas['filtro_linhas'] = cronometrar(lambda: filtrar_tabela(df, estados, start_date, end_date), repeticoes)
+    etapas['filtro_cubo'] = cronometrar(lambda: filtrar_tabela(cubo, estados, start_date, end_date), repeticoes)
+    etapas['totais_periodo'] = cronometrar(lambda: totais_periodo(acumulados, start_date, end_date, estados), repeticoes)
+
+    df_filtrado = filtrar_tabela(df, estados, start_date, end_date)
+    cubo_filtrado = filtrar_tabela(cubo, estados, start_date, end_date)
+    produtos_filtrado = filtrar_tabela(cubo_produtos, estados, start_date, end_date)
+    etapas['classificar_compras_periodo'] = cronometrar(lambda: classificar_compras(df_filtrado), repeticoes)
+    etapas['classificar_compras_historico'] = cronometrar(lambda: classificar_compras(df_filtrado, primeiras_compras), repeticoes)
+    etapas['previsao_carteira'] = cronometrar(lambda: calcular_recorrencia_e_previsao(df), repeticoes)
+    etapas['top10_clientes'] = cronometrar(lambda: top_10(cubo_filtrado, 'Cliente', 'Valor Total'), repeticoes)
+    etapas['top10_produtos'] = cronometrar(lambda: top_10(produtos_filtrado, 'Produto', 'Quantidade'), repeticoes)
+    # Referência: o mesmo ranking agrupando as linhas de itens, como o dashboard fazia antes do cubo.
+    etapas['top10_clientes_linhas'] = cronometrar(lambda: top_10(df_filtrado, 'Cliente', 'Valor Total'), repeticoes)
+
+    contagem_tipo = classificar_compras(df_filtrado)['Tipo Compra'].value_counts().rename_axis('Tipo Compra').reset_index(name='Quantidade')
+    def construir_figuras():
+        grafico_faturamento(cubo_filtrado, 'Dia', "Faturamento")
+        grafico_novos_recompra(contagem_tipo, "Novos vs Recompra")
+        grafico_top_clientes(top_10(cubo_filtrado, 'Cliente', 'Valor Total'), "Top Clientes")
+        grafico_top_produtos(top_10(produtos_filtrado, 'Produto', 'Quantidade'), 'Quantidade', "Top Produtos")
+        grafico_formas_pagamento(faturamento_por_forma_pagamento(cubo_filtrado), "Formas de Pagamento")
+    etapas['figuras'] = cronometrar(construir_figuras, repeticoes)
+
+    if consultas.duckdb is not None:
+        # Mesmas consultas no motor DuckDB, sobre a pasta Parquet importada do mesmo CSV. O cache compartilhado de
+        # resultados fica desligado: cada repetição mede a consulta, não o acerto de cache.
+        memoria_cache = cache.MEMORIA_CACHE_MB
+        with tempfile.TemporaryDirectory() as pasta_parquet:
+            cache.MEMORIA_CACHE_MB = 0
+            try:
+                pasta = os.path.join(pasta_parquet, 'dataset')
+                etapas['duckdb_importacao'] = cronometrar(lambda: dados.importar_parquet(caminho_csv, pasta), 1)
+                selecao = consultas.selecionar(consultas.fonte_duckdb(pasta), estados, start_date, end_date)
+                etapas['duckdb_totais'] = cronometrar(lambda: consultas.totais(selecao), repeticoes)
+                etapas['duckdb_top10_clientes'] = cronometrar(lambda: consultas.ranking(selecao, 'Cliente', 'Valor Total'), repeticoes)
+                etapas['duckdb_novos_recompra'] = cronometrar(lambda: consultas.novos_recompra(selecao, historico=True), repeticoes)
+                etapas['duckdb_previsao_carteira'] = cronometrar(lambda: consultas.previsao_carteira(selecao['fonte']), repeticoes)
+            finally:
+                cache.MEMORIA_CACHE_MB = memoria_cache
+
+    return {
+        'arquivo': os.path.basename(caminho_csv),
+        'bytes_csv': len(dados_brutos),
+        'linhas_validas': len(df),
+        'clientes': int(df['Cliente'].nunique()),
+        'produtos': int(df['Produto'].nunique()) if 'Produto' in df.columns else None,
+        'linhas_cubo': len(cubo),
+        'linhas_cubo_produtos': len(cubo_produtos),
+        'memoria_df_mb': round(df.memory_usage(deep=True).sum() / 2**20, 1),
+        'etapas': etapas,
+    }
+
+def executar_benchmark(tamanhos=TAMANHOS_PADRAO, pasta_dados=PASTA_DADOS_PADRAO, repeticoes=3, clientes=None, produtos=None, semente=0):
+    execucoes = []
+    for tamanho in tamanhos:
+        n_linhas = interpretar_tamanho(tamanho)
+        n_clientes, n_produtos = cardinalidade_padrao(n_linhas)
+        n_clientes, n_produtos = clientes or n_clientes, produtos or n_produtos
+        # Arquivos gerados ficam na pasta de dados e são reaproveitados entre execuções com os mesmos parâmetros.
+        caminho = os.path.join(pasta_dados, f"pedidos_{n_linhas}_c{n_clientes}_p{n_produtos}_s{semente}.csv")
+        if not os.path.exists(caminho):
+            gerar_pedidos(caminho, n_linhas, clientes=n_clientes, produtos=n_produtos, semente=semente)
+        resultado = medir_tamanho(caminho, repeticoes=repeticoes)
+        execucoes.append({'tamanho': tamanho, 'linhas': n_linhas, **resultado})
+
+    return {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'nucleos': os.cpu_count(),
+        },
+        'execucoes': execucoes,
+    }
+
+def salvar_resultado(resultado, caminho):
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+
+def carregar_resultado(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def tabela_resultado(resultado):
+    linhas = [
+        {'Tamanho': execucao['tamanho'], 'Etapa': etapa, 'Mediana (s)': tempos['mediana_s']}
+        for execucao in resultado['execucoes'] for etapa, tempos in execucao['etapas'].items()
+    ]
+    return pd.DataFrame(linhas, columns=['Tamanho', 'Etapa', 'Mediana (s)'])
+
+def comparar_resultados(anterior, atual):
+    # Razão > 1 significa que a etapa ficou mais lenta na execução atual.
+    comparacao = tabela_resultado(anterior).merge(tabela_resultado(atual), on=['Tamanho', 'Etapa'], suffixes=(' Anterior', ' Atual'))
+    comparacao['Razão'] = (comparacao['Mediana (s) Atual'] / comparacao['Mediana (s) Anterior']).round(2)
+    return comparacao
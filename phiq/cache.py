@@ -0,0 +1,261 @@
+import atexit
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from phiq import dados
+from phiq.instrumentacao import medir, registrar_chamada_cache
+
+# ====================
+# Cache compartilhado de resultados
+# ====================
+# Resultados das consultas, figuras e seções, compartilhados por todas as sessões do processo. A chave é o nome da
+# função + identificador da fonte (hash do conteúdo, pasta Parquet ou versão do histórico) + filtros, então duas
+# sessões com o mesmo arquivo e os mesmos filtros calculam uma vez só. As entradas ficam em ordem de uso (LRU):
+# quando a memória passa de PHIQ_CACHE_MEMORIA_MB, as menos usadas saem. Entradas maiores que
+# PHIQ_CACHE_LIMITE_ENTRADA_MB vão para o disco (pickle em CACHE_DIR/resultados), com orçamento próprio
+# (PHIQ_CACHE_DISCO_MB). Com PHIQ_CACHE_TTL (segundos), entradas mais antigas expiram. PHIQ_CACHE_MEMORIA_MB=0 desliga.
+# O índice das entradas só existe na memória do processo, então cada processo grava numa pasta própria
+# (resultados/<pid>-<início>), apagada na saída; pastas de processos que já terminaram são removidas na primeira
+# gravação e em `limpar_cache`.
+MEMORIA_CACHE_MB = float(os.environ.get("PHIQ_CACHE_MEMORIA_MB", "512"))
+LIMITE_ENTRADA_MB = float(os.environ.get("PHIQ_CACHE_LIMITE_ENTRADA_MB", "64"))
+DISCO_CACHE_MB = float(os.environ.get("PHIQ_CACHE_DISCO_MB", "2048"))
+TTL_CACHE_S = float(os.environ.get("PHIQ_CACHE_TTL", "0"))
+
+_entradas = OrderedDict()
+_uso = {'memoria': 0, 'disco': 0}
+_contadores = {}
+_trava = threading.Lock()
+_processo = f"{os.getpid()}-{time.time_ns()}"
+_orfaos_removidos = False
+
+def tamanho_em_bytes(valor):
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, (pd.Series, pd.Index)):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(v) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(k) + tamanho_em_bytes(v) for k, v in valor.items())
+    return sys.getsizeof(valor)
+
+def chave_argumento(valor):
+    # Seleções e fontes entram pelo identificador (e filtros), não pelo conteúdo. Fonte sem identificador: sem cache.
+    if isinstance(valor, dict) and 'filtros' in valor:
+        fonte = chave_argumento(valor['fonte'])
+        return None if fonte is None else ('selecao', fonte, chave_argumento(valor['filtros']))
+    if isinstance(valor, dict) and 'backend' in valor:
+        return None if valor['id'] is None else ('fonte', valor['id'])
+    if isinstance(valor, dict):
+        itens = tuple((k, chave_argumento(v)) for k, v in sorted(valor.items()))
+        return None if any(v is None and valor[k] is not None for k, v in itens) else itens
+    if isinstance(valor, (list, tuple)):
+        itens = tuple(chave_argumento(v) for v in valor)
+        return None if any(c is None and v is not None for c, v in zip(itens, valor)) else itens
+    if isinstance(valor, (pd.Timestamp, date)):
+        return valor.isoformat()
+    if valor is None or isinstance(valor, (str, int, float, bool, np.generic)):
+        return valor
+    return None
+
+def _pasta_resultados():
+    return os.path.join(dados.CACHE_DIR, 'resultados')
+
+def _pasta_disco():
+    return os.path.join(_pasta_resultados(), _processo)
+
+def _processo_vivo(pid):
+    # No Windows os.kill(pid, 0) não é uma consulta (envia CTRL_C_EVENT): as pastas alheias ficam.
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def remover_orfaos():
+    # Pastas de processos que terminaram (reinício do servidor, outros workers) e pickles soltos de versões anteriores.
+    global _orfaos_removidos
+    _orfaos_removidos = True
+    raiz = _pasta_resultados()
+    if not os.path.isdir(raiz):
+        return
+    for nome in os.listdir(raiz):
+        caminho = os.path.join(raiz, nome)
+        if nome == _processo:
+            continue
+        if os.path.isdir(caminho):
+            pid = nome.split('-')[0]
+            if not (pid.isdigit() and _processo_vivo(int(pid))):
+                shutil.rmtree(caminho, ignore_errors=True)
+        else:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+@atexit.register
+def _remover_pasta_do_processo():
+    # Processos filhos criados por fork herdam o registro, mas não são donos da pasta.
+    if _processo.startswith(f"{os.getpid()}-"):
+        shutil.rmtree(_pasta_disco(), ignore_errors=True)
+
+def _contadores_de(nome):
+    # Chamado com a trava.
+    return _contadores.setdefault(nome, {'acertos': 0, 'falhas': 0, 'despejos': 0, 'expirados': 0})
+
+def _contar(nome, evento):
+    with _trava:
+        _contadores_de(nome)[evento] += 1
+
+def _remover(codigo):
+    # Chamado com a trava.
+    entrada = _entradas.pop(codigo)
+    if entrada['arquivo'] is None:
+        _uso['memoria'] -= entrada['bytes']
+    else:
+        _uso['disco'] -= entrada['bytes']
+        try:
+            os.remove(entrada['arquivo'])
+        except OSError:
+            pass
+
+def _despejar():
+    # Chamado com a trava: remove as entradas menos usadas até caber no orçamento de memória e de disco.
+    limites = {'memoria': MEMORIA_CACHE_MB * 2**20, 'disco': DISCO_CACHE_MB * 2**20}
+    for tipo, limite in limites.items():
+        for codigo in [c for c, e in _entradas.items() if (e['arquivo'] is None) == (tipo == 'memoria')]:
+            if _uso[tipo] <= limite:
+                break
+            _contadores_de(_entradas[codigo]['nome'])['despejos'] += 1
+            _remover(codigo)
+
+def _gravar_disco(codigo, valor):
+    if not _orfaos_removidos:
+        remover_orfaos()
+    pasta = _pasta_disco()
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{codigo}.pickle")
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+    with open(temporario, 'wb') as arquivo:
+        pickle.dump(valor, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, caminho)
+    return caminho
+
+def _guardar(nome, codigo, valor):
+    tamanho = tamanho_em_bytes(valor)
+    arquivo = None
+    if tamanho > min(LIMITE_ENTRADA_MB, MEMORIA_CACHE_MB) * 2**20:
+        if tamanho > DISCO_CACHE_MB * 2**20:
+            return
+        try:
+            arquivo = _gravar_disco(codigo, valor)
+        except Exception:
+            # Disco cheio ou valor que não vira pickle: o resultado só não fica em cache.
+            return
+        tamanho = os.path.getsize(arquivo)
+    with _trava:
+        if codigo in _entradas:
+            _remover(codigo)
+        _entradas[codigo] = {'nome': nome, 'valor': valor if arquivo is None else None, 'arquivo': arquivo,
+                             'bytes': tamanho, 'criado': time.monotonic()}
+        _uso['memoria' if arquivo is None else 'disco'] += tamanho
+        _despejar()
+
+def _procurar(nome, codigo, ttl):
+    with _trava:
+        entrada = _entradas.get(codigo)
+        if entrada is None:
+            return None
+        if ttl and time.monotonic() - entrada['criado'] > ttl:
+            _remover(codigo)
+            _contadores_de(nome)['expirados'] += 1
+            return None
+        _entradas.move_to_end(codigo)
+    if entrada['arquivo'] is None:
+        return entrada
+    try:
+        with open(entrada['arquivo'], 'rb') as arquivo:
+            return {'valor': pickle.load(arquivo)}
+    except (OSError, pickle.UnpicklingError, EOFError):
+        with _trava:
+            if _entradas.get(codigo) is entrada:
+                _remover(codigo)
+        return None
+
+def em_cache(nome, chave, calcular, ttl=None):
+    # Sem chave (fonte sem identificador) ou com o cache desligado, só calcula.
+    if chave is None or MEMORIA_CACHE_MB <= 0:
+        return calcular()
+    codigo = hashlib.sha256(repr((nome, chave)).encode()).hexdigest()
+    with medir(nome, tipo='cache'):
+        entrada = _procurar(nome, codigo, TTL_CACHE_S if ttl is None else ttl)
+        if entrada is not None:
+            _contar(nome, 'acertos')
+            registrar_chamada_cache(nome, acerto=True)
+            return entrada['valor']
+        _contar(nome, 'falhas')
+        registrar_chamada_cache(nome, acerto=False)
+        valor = calcular()
+    _guardar(nome, codigo, valor)
+    return valor
+
+def compartilhado(funcao=None, ttl=None):
+    # Decorador para funções de consulta: a chave vem dos argumentos (seleção, fonte e parâmetros simples).
+    if funcao is None:
+        return functools.partial(compartilhado, ttl=ttl)
+
+    @functools.wraps(funcao)
+    def cacheada(*args, **kwargs):
+        chave = chave_argumento((args, kwargs))
+        return em_cache(funcao.__name__, chave, lambda: funcao(*args, **kwargs), ttl=ttl)
+    return cacheada
+
+def limpar_cache():
+    with _trava:
+        for codigo in list(_entradas):
+            _remover(codigo)
+        shutil.rmtree(_pasta_disco(), ignore_errors=True)
+    remover_orfaos()
+
+def estatisticas_cache():
+    with _trava:
+        por_funcao = {}
+        for nome, contadores in _contadores.items():
+            por_funcao[nome] = dict(contadores, entradas=0, memoria_mb=0.0, disco_mb=0.0)
+        for entrada in _entradas.values():
+            funcao = por_funcao.setdefault(entrada['nome'], dict(_contadores_de(entrada['nome']), entradas=0, memoria_mb=0.0, disco_mb=0.0))
+            funcao['entradas'] += 1
+            funcao['memoria_mb' if entrada['arquivo'] is None else 'disco_mb'] += entrada['bytes'] / 2**20
+        return {
+            'entradas': len(_entradas),
+            'memoria_mb': round(_uso['memoria'] / 2**20, 1),
+            'disco_mb': round(_uso['disco'] / 2**20, 1),
+            'orcamento_memoria_mb': MEMORIA_CACHE_MB,
+            'orcamento_disco_mb': DISCO_CACHE_MB,
+            'funcoes': por_funcao,
+        }
+
+def tabela_cache(estatisticas):
+    return pd.DataFrame([
+        {'Função': nome, 'Acertos': c['acertos'], 'Falhas': c['falhas'], 'Despejos': c['despejos'], 'Expirados': c['expirados'],
+         'Entradas': c['entradas'], 'Memória (MB)': round(c['memoria_mb'], 2), 'Disco (MB)': round(c['disco_mb'], 2)}
+        for nome, c in estatisticas['funcoes'].items()
+    ], columns=['Função', 'Acertos', 'Falhas', 'Despejos', 'Expirados', 'Entradas', 'Memória (MB)', 'Disco (MB)'])
@@ -0,0 +1,424 @@
+import glob
+import hashlib
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from phiq import dados
+from phiq.analise import (
+    FORMAS_PAGAMENTO_VALIDAS, NS_POR_DIA, calcular_recorrencia_e_previsao, classificar_compras, faturamento_por_forma_pagamento,
+    faturamento_por_periodo, filtrar_gestor, filtrar_tabela, top_10, totais_periodo,
+)
+from phiq.cache import chave_argumento, compartilhado, em_cache
+from phiq.instrumentacao import instrumentar
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# ====================
+# Motores de consulta
+# ====================
+# Os filtros (Estado, Franquia, Segmento, período e gestor) e as agregações do dashboard passam por este módulo.
+# Uma "fonte" é um dicionário com a chave 'backend':
+#   - 'pandas' (padrão): as estruturas de `construir_estruturas` em memória (cubo, somas acumuladas, etc.);
+#   - 'duckdb': uma pasta de arquivos Parquet consultada em SQL pelo DuckDB (opcional, `pip install duckdb`), sem
+#     carregar o histórico em memória. Agregações que não cabem na memória usam disco (`temp_directory`).
+# Cada consulta recebe uma "seleção" (fonte + filtros) e devolve os mesmos resultados nos dois motores.
+# Os resultados ficam no cache compartilhado entre sessões (`phiq.cache`), pelo identificador da fonte e os filtros.
+MOTOR_PADRAO = os.environ.get("PHIQ_BACKEND", "pandas")
+MOTORES_DISPONIVEIS = ['pandas'] + (['duckdb'] if duckdb is not None else [])
+
+# Limite de memória do DuckDB (ex.: "4GB"); vazio usa o padrão do DuckDB (80% da RAM).
+MEMORIA_DUCKDB = os.environ.get("PHIQ_DUCKDB_MEMORIA", "")
+
+COL_DATA = 'Data Faturamento Pedido'
+COL_VENDA = 'Código Venda'
+
+_conexao = None
+
+def conexao_duckdb():
+    global _conexao
+    if duckdb is None:
+        raise RuntimeError("O motor 'duckdb' exige o pacote duckdb (pip install duckdb).")
+    if _conexao is None:
+        conexao = duckdb.connect()
+        conexao.execute(f"SET temp_directory = '{_literal(os.path.join(dados.CACHE_DIR, 'duckdb_tmp'))}'")
+        # Sem preservar a ordem de inserção o DuckDB pode despejar agregações grandes em disco.
+        conexao.execute("SET preserve_insertion_order = false")
+        if MEMORIA_DUCKDB:
+            conexao.execute(f"SET memory_limit = '{_literal(MEMORIA_DUCKDB)}'")
+        _conexao = conexao
+    return _conexao
+
+def _literal(texto):
+    return str(texto).replace("'", "''")
+
+def _coluna(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+def _sql(fonte, consulta, parametros=()):
+    # Um cursor por consulta: a conexão é compartilhada entre as sessões (threads) do Streamlit.
+    with conexao_duckdb().cursor() as cursor:
+        return cursor.execute(consulta.replace('{origem}', fonte['origem']), list(parametros)).df()
+
+# ====================
+# Fontes
+# ====================
+def fonte_pandas(estruturas, identificador=None):
+    return {'backend': 'pandas', 'id': identificador, 'colunas': set(estruturas['df'].columns), **estruturas}
+
+def arquivos_parquet(caminho):
+    if os.path.isdir(caminho):
+        return sorted(glob.glob(os.path.join(caminho, '**', '*.parquet'), recursive=True))
+    return [caminho] if os.path.exists(caminho) else []
+
+def fonte_duckdb(caminho):
+    arquivos = arquivos_parquet(caminho)
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo Parquet em {caminho}")
+    # filename/file_row_number dão a ordem original das linhas (desempate da "primeira compra", como no pandas).
+    lista = ", ".join(f"'{_literal(a)}'" for a in arquivos)
+    origem = f"read_parquet([{lista}], union_by_name = true, filename = true, file_row_number = true)"
+    # A versão muda quando arquivos são adicionados ou regravados: entra nas chaves de cache da interface.
+    assinatura = hashlib.sha256(repr([(a, os.path.getsize(a), os.path.getmtime(a)) for a in arquivos]).encode()).hexdigest()[:16]
+    fonte = {'backend': 'duckdb', 'id': f"{os.path.abspath(caminho)}@{assinatura}", 'origem': origem}
+    esquema = _sql(fonte, "DESCRIBE SELECT * FROM {origem}")
+    fonte['tipos'] = dict(zip(esquema['column_name'], esquema['column_type']))
+    fonte['colunas'] = set(fonte['tipos']) - {'filename', 'file_row_number'}
+    return fonte
+
+def _soma(fonte, coluna):
+    # SUM de inteiros vira HUGEINT (float no pandas); volta para BIGINT para manter o tipo do motor pandas.
+    inteiro = fonte['tipos'].get(coluna, '').endswith('INT')
+    return f"SUM({_coluna(coluna)})" + ("::BIGINT" if inteiro else "::DOUBLE")
+
+# ====================
+# Seleção (fonte + filtros)
+# ====================
+def selecionar(fonte, estados, inicio, fim, franquias=None, segmentos=None, gestor=None):
+    # Mesma semântica de `filtrar_tabela`: franquias=None não filtra, segmentos vazios não filtram.
+    filtros = {
+        'estados': list(estados), 'inicio': pd.Timestamp(inicio), 'fim': pd.Timestamp(fim),
+        'franquias': list(franquias) if franquias is not None else None,
+        'segmentos': list(segmentos) if segmentos and 'Segmento' in fonte['colunas'] else None,
+        'gestor': gestor,
+    }
+    return {'fonte': fonte, 'filtros': filtros, 'tabelas': {}}
+
+def _filtrada(selecao, nome):
+    # pandas: cubos, df ou tabela de pedidos filtrados, calculados uma vez por seleção.
+    if nome not in selecao['tabelas']:
+        fonte, filtros = selecao['fonte'], selecao['filtros']
+        tabela = fonte[nome]
+        if tabela is not None:
+            if filtros['gestor'] is not None:
+                indices = fonte.get('indices_gestores')
+                tabela = filtrar_gestor(tabela, filtros['gestor'], indices[nome] if indices else None)
+            tabela = filtrar_tabela(tabela, filtros['estados'], filtros['inicio'], filtros['fim'],
+                                    franquias=filtros['franquias'], segmentos=filtros['segmentos'])
+        selecao['tabelas'][nome] = tabela
+    return selecao['tabelas'][nome]
+
+def _condicoes(selecao):
+    filtros = selecao['filtros']
+    condicoes = [f"{_coluna(COL_DATA)} >= ?", f"{_coluna(COL_DATA)} < ?", "list_contains(?::VARCHAR[], \"Estado\")"]
+    parametros = [filtros['inicio'].to_pydatetime(), (filtros['fim'] + pd.Timedelta(days=1)).to_pydatetime(), filtros['estados']]
+    if filtros['franquias'] is not None:
+        condicoes.append("list_contains(?::VARCHAR[], \"Franquia\")")
+        parametros.append(filtros['franquias'])
+    if filtros['segmentos']:
+        condicoes.append("list_contains(?::VARCHAR[], \"Segmento\")")
+        parametros.append(filtros['segmentos'])
+    if filtros['gestor'] is not None:
+        condicoes.append("\"Gestor\" = ?")
+        parametros.append(filtros['gestor'])
+    return " AND ".join(condicoes), parametros
+
+def _sql_selecao(selecao, consulta, parametros_extras=()):
+    condicoes, parametros = _condicoes(selecao)
+    return _sql(selecao['fonte'], consulta.replace('{condicoes}', condicoes), parametros + list(parametros_extras))
+
+# ====================
+# Consultas
+# ====================
+@compartilhado
+@instrumentar
+def opcoes_filtros(fonte):
+    if fonte['backend'] == 'pandas':
+        df = fonte['df']
+        return {
+            'linhas': len(df),
+            'estados': sorted(df['Estado'].dropna().unique()),
+            'franquias': sorted(df['Franquia'].dropna().unique()),
+            'segmentos': sorted(df['Segmento'].dropna().unique()) if 'Segmento' in df.columns else None,
+            'data_min': df[COL_DATA].iloc[0].date(),
+            'data_max': df[COL_DATA].iloc[-1].date(),
+        }
+
+    def distintos(coluna):
+        return _sql(fonte, f"SELECT DISTINCT {_coluna(coluna)} AS v FROM {{origem}} WHERE v IS NOT NULL ORDER BY v")['v'].tolist()
+    extremos = _sql(fonte, f"SELECT COUNT(*) AS linhas, MIN({_coluna(COL_DATA)}) AS data_min, MAX({_coluna(COL_DATA)}) AS data_max FROM {{origem}}")
+    return {
+        'linhas': int(extremos['linhas'].iloc[0]),
+        'estados': distintos('Estado'),
+        'franquias': distintos('Franquia'),
+        'segmentos': distintos('Segmento') if 'Segmento' in fonte['colunas'] else None,
+        'data_min': pd.Timestamp(extremos['data_min'].iloc[0]).date(),
+        'data_max': pd.Timestamp(extremos['data_max'].iloc[0]).date(),
+    }
+
+@compartilhado
+@instrumentar
+def vazia(selecao):
+    if selecao['fonte']['backend'] == 'pandas':
+        return _filtrada(selecao, 'cubo').empty
+    return _sql_selecao(selecao, "SELECT 1 FROM {origem} WHERE {condicoes} LIMIT 1").empty
+
+@compartilhado
+@instrumentar
+def totais(selecao):
+    # Faturamento, quantidade e pedidos únicos da seleção; 'Pedidos' é None sem a coluna 'Código Venda'.
+    fonte, filtros = selecao['fonte'], selecao['filtros']
+    if fonte['backend'] == 'pandas':
+        resultado = totais_periodo(fonte['acumulados'], filtros['inicio'], filtros['fim'], filtros['estados'],
+                                   franquias=filtros['franquias'], segmentos=filtros['segmentos'],
+                                   gestores=[filtros['gestor']] if filtros['gestor'] is not None else None)
+        if resultado['Pedidos'] is None and fonte['pedidos'] is not None:
+            # Pedidos em mais de uma célula do cubo: as contagens diárias não somam, conta na tabela de pedidos.
+            resultado['Pedidos'] = float(_filtrada(selecao, 'pedidos')[COL_VENDA].nunique())
+        return resultado
+
+    pedidos = f"COUNT(DISTINCT {_coluna(COL_VENDA)})" if COL_VENDA in fonte['colunas'] else "NULL"
+    linha = _sql_selecao(selecao, f"""
+        SELECT COALESCE(SUM("Valor Total"), 0)::DOUBLE AS "Valor Total", COALESCE(SUM("Quantidade"), 0)::DOUBLE AS "Quantidade",
+               {pedidos}::DOUBLE AS "Pedidos"
+        FROM {{origem}} WHERE {{condicoes}}""").iloc[0]
+    return {
+        'Valor Total': float(linha['Valor Total']),
+        'Quantidade': float(linha['Quantidade']),
+        'Pedidos': None if pd.isna(linha['Pedidos']) else float(linha['Pedidos']),
+    }
+
+@compartilhado
+@instrumentar
+def faturamento_diario(selecao):
+    # Série diária (dias sem venda com zero); `grafico_faturamento` reagrupa por mês quando necessário.
+    if selecao['fonte']['backend'] == 'pandas':
+        return faturamento_por_periodo(_filtrada(selecao, 'cubo'), 'D')
+    diario = _sql_selecao(selecao, f"""
+        SELECT date_trunc('day', {_coluna(COL_DATA)})::TIMESTAMP AS {_coluna(COL_DATA)}, SUM("Valor Total")::DOUBLE AS "Valor Total"
+        FROM {{origem}} WHERE {{condicoes}} GROUP BY 1 ORDER BY 1""")
+    diario[COL_DATA] = diario[COL_DATA].astype('datetime64[ns]')
+    return faturamento_por_periodo(diario, 'D')
+
+@compartilhado
+@instrumentar
+def ranking(selecao, dimensao, medida):
+    # Top 10 da dimensão pela medida; empates seguem a ordem do nome, como o `nlargest` sobre o groupby ordenado.
+    if selecao['fonte']['backend'] == 'pandas':
+        return top_10(_filtrada(selecao, 'cubo_produtos' if dimensao == 'Produto' else 'cubo'), dimensao, medida)
+    top = _sql_selecao(selecao, f"""
+        SELECT {_coluna(dimensao)}, {_soma(selecao['fonte'], medida)} AS {_coluna(medida)} FROM {{origem}}
+        WHERE {{condicoes}} AND {_coluna(dimensao)} IS NOT NULL
+        GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT 10""")
+    return top.set_index(dimensao)[medida]
+
+@compartilhado
+@instrumentar
+def formas_pagamento(selecao):
+    if selecao['fonte']['backend'] == 'pandas':
+        return faturamento_por_forma_pagamento(_filtrada(selecao, 'cubo'))
+    return _sql_selecao(selecao, """
+        SELECT "Forma Pagamento", SUM("Valor Total")::DOUBLE AS "Valor Total" FROM {origem}
+        WHERE {condicoes} AND list_contains(?::VARCHAR[], "Forma Pagamento")
+        GROUP BY 1 ORDER BY 1""", [FORMAS_PAGAMENTO_VALIDAS])
+
+@compartilhado
+@instrumentar
+def segmentos(selecao):
+    if 'Segmento' not in selecao['fonte']['colunas']:
+        return []
+    if selecao['fonte']['backend'] == 'pandas':
+        return sorted(_filtrada(selecao, 'cubo')['Segmento'].dropna().unique())
+    return _sql_selecao(selecao, """
+        SELECT DISTINCT "Segmento" FROM {origem} WHERE {condicoes} AND "Segmento" IS NOT NULL ORDER BY 1""")['Segmento'].tolist()
+
+@compartilhado
+@instrumentar
+def novos_recompra(selecao, historico=False):
+    # Itens por tipo ("Cliente Novo"/"Recompra"). historico=True compara com a primeira compra de todo o histórico;
+    # senão, com a primeira compra de cada cliente dentro da própria seleção.
+    fonte = selecao['fonte']
+    if fonte['backend'] == 'pandas':
+        df_com_tipo = classificar_compras(_filtrada(selecao, 'df'), fonte['primeiras_compras'] if historico else None)
+        if df_com_tipo.empty:
+            return pd.DataFrame(columns=['Tipo Compra', 'Quantidade'])
+        return df_com_tipo['Tipo Compra'].value_counts().rename_axis('Tipo Compra').reset_index(name='Quantidade')
+
+    base_primeiras = "{origem}" if historico else "linhas"
+    if COL_VENDA in fonte['colunas']:
+        # Primeira linha de cada cliente na ordem (data, arquivo, linha): a mesma de `construir_primeiras_compras`.
+        consulta = f"""
+            WITH linhas AS (SELECT * FROM {{origem}} WHERE {{condicoes}}),
+            primeiras AS (
+                SELECT "Cliente", first({_coluna(COL_VENDA)} ORDER BY {_coluna(COL_DATA)}, filename, file_row_number) AS primeira
+                FROM {base_primeiras}
+                WHERE "Cliente" IN (SELECT "Cliente" FROM linhas) AND {_coluna(COL_DATA)} IS NOT NULL
+                GROUP BY 1)
+            SELECT CASE WHEN l.{_coluna(COL_VENDA)} = p.primeira THEN 'Cliente Novo' ELSE 'Recompra' END AS "Tipo Compra",
+                   COUNT(*) AS "Quantidade"
+            FROM linhas l LEFT JOIN primeiras p ON l."Cliente" = p."Cliente"
+            GROUP BY 1 ORDER BY 2 DESC, 1"""
+    else:
+        consulta = f"""
+            WITH linhas AS (SELECT * FROM {{origem}} WHERE {{condicoes}} AND "Cliente" IS NOT NULL),
+            primeiras AS (
+                SELECT "Cliente", MIN({_coluna(COL_DATA)})::DATE AS primeira FROM {base_primeiras}
+                WHERE "Cliente" IN (SELECT "Cliente" FROM linhas) GROUP BY 1)
+            SELECT CASE WHEN l.{_coluna(COL_DATA)}::DATE = p.primeira THEN 'Cliente Novo' ELSE 'Recompra' END AS "Tipo Compra",
+                   COUNT(*) AS "Quantidade"
+            FROM linhas l JOIN primeiras p ON l."Cliente" = p."Cliente"
+            GROUP BY 1 ORDER BY 2 DESC, 1"""
+    return _sql_selecao(selecao, consulta)
+
+def _previsao_sql(fonte, filtro, parametros):
+    # Mesma regra de `prever_proximas_compras`: dias de compra únicos por cliente, ritmo = mediana dos intervalos.
+    ritmos = _sql(fonte, f"""
+        WITH dias AS (
+            SELECT DISTINCT "Cliente", {_coluna(COL_DATA)}::DATE AS dia FROM {{origem}}
+            WHERE "Cliente" IS NOT NULL AND {_coluna(COL_DATA)} IS NOT NULL AND {filtro}),
+        intervalos AS (
+            SELECT "Cliente", dia, dia - lag(dia) OVER (PARTITION BY "Cliente" ORDER BY dia) AS intervalo FROM dias)
+        SELECT "Cliente", COUNT(*) AS "Nº de Compras", median(intervalo::DOUBLE) AS mediana, MAX(dia) AS ultima
+        FROM intervalos GROUP BY 1 HAVING COUNT(*) >= 2 ORDER BY 1""", parametros)
+    # Arredondamento no NumPy (metade para o par), igual ao motor pandas.
+    ritmo = np.round(ritmos['mediana'].to_numpy()).astype(np.int64)
+    ultima = ritmos['ultima'].to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_POR_DIA
+    return pd.DataFrame({
+        'Cliente': ritmos['Cliente'].to_numpy(dtype=object),
+        'Nº de Compras': ritmos['Nº de Compras'].to_numpy(dtype=np.int64),
+        'Ritmo (dias)': ritmo,
+        'Última Compra': (ultima * NS_POR_DIA).view('datetime64[ns]'),
+        'Próxima Compra': ((ultima + ritmo) * NS_POR_DIA).view('datetime64[ns]'),
+    })
+
+@instrumentar
+def previsao_carteira(fonte):
+    if fonte['backend'] == 'pandas':
+        return fonte['previsoes']
+    # A previsão do pandas já vem pronta nas estruturas; a do DuckDB vai para o cache compartilhado.
+    return em_cache('previsao_carteira', chave_argumento(fonte), lambda: _previsao_sql(fonte, "TRUE", []))
+
+@compartilhado
+@instrumentar
+def previsao_clientes(selecao, selecionados):
+    if selecao['fonte']['backend'] == 'pandas':
+        # Só as linhas dos clientes escolhidos, pelas posições guardadas no índice (na ordem do df filtrado).
+        indice = indice_clientes(selecao)
+        codigos = indice['codigos'].get_indexer(list(selecionados))
+        linhas = [indice['ordem'][indice['limites'][c]:indice['limites'][c + 1]] for c in codigos[codigos >= 0]]
+        linhas = np.sort(np.concatenate(linhas)) if linhas else np.empty(0, dtype=np.int64)
+        return calcular_recorrencia_e_previsao(_filtrada(selecao, 'df').iloc[linhas])
+    condicoes, parametros = _condicoes(selecao)
+    previsao = _previsao_sql(selecao['fonte'], f"{condicoes} AND list_contains(?::VARCHAR[], \"Cliente\")", parametros + [list(selecionados)])
+    return previsao if not previsao.empty else pd.DataFrame()
+
+@compartilhado
+@instrumentar
+def nao_mapeados(fonte, regras=dados.REGRAS_NORMALIZACAO):
+    if fonte['backend'] == 'pandas':
+        return dados.valores_nao_mapeados(fonte['df'], regras)
+    relatorio = []
+    for col, regra in regras.items():
+        if col not in fonte['colunas'] or 'validos' not in regra:
+            continue
+        relatorio.append(_sql(fonte, f"""
+            SELECT ? AS "Coluna", {_coluna(col)}::VARCHAR AS "Valor", COUNT(*) AS "Linhas" FROM {{origem}}
+            WHERE {_coluna(col)} IS NOT NULL AND NOT list_contains(?::VARCHAR[], {_coluna(col)}::VARCHAR)
+            GROUP BY 2 ORDER BY 3 DESC, 2""", [col, regra['validos']]))
+    if not relatorio:
+        return pd.DataFrame(columns=['Coluna', 'Valor', 'Linhas'])
+    return pd.concat(relatorio, ignore_index=True)
+
+# ====================
+# Busca de clientes
+# ====================
+# A lista de clientes da previsão não vai inteira para o navegador. Os nomes de cada fonte são indexados uma vez
+# (termos sem acentos e em minúsculas, ordenados para busca binária por prefixo) e cada seleção guarda o faturamento
+# e a última compra dos seus clientes, do maior faturamento para o menor. A busca devolve uma página de clientes.
+CLIENTES_POR_PAGINA = int(os.environ.get("PHIQ_CLIENTES_POR_PAGINA", "50"))
+
+def normalizar_busca(texto):
+    sem_acento = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', ' ', sem_acento.lower()).strip()
+
+@compartilhado
+@instrumentar
+def termos_clientes(fonte):
+    if fonte['backend'] == 'pandas':
+        nomes = fonte['df']['Cliente'].dropna().unique()
+    else:
+        nomes = _sql(fonte, 'SELECT DISTINCT "Cliente" FROM {origem} WHERE "Cliente" IS NOT NULL')['Cliente']
+    nomes = np.sort(np.asarray(nomes, dtype=object))
+    termos, posicoes = [], []
+    for posicao, nome in enumerate(nomes):
+        for termo in set(normalizar_busca(nome).split()):
+            termos.append(termo)
+            posicoes.append(posicao)
+    termos = np.asarray(termos, dtype=object)
+    ordem = np.argsort(termos, kind='stable')
+    return {'nomes': pd.Index(nomes), 'termos': termos[ordem], 'posicoes': np.asarray(posicoes, dtype=np.int64)[ordem]}
+
+@compartilhado
+@instrumentar
+def indice_clientes(selecao):
+    fonte = selecao['fonte']
+    if fonte['backend'] == 'pandas':
+        resumo = _filtrada(selecao, 'cubo').groupby('Cliente', observed=True, sort=False).agg(
+            **{'Faturamento': ('Valor Total', 'sum'), 'Última Compra': (COL_DATA, 'max')}).reset_index()
+    else:
+        resumo = _sql_selecao(selecao, f"""
+            SELECT "Cliente", SUM("Valor Total")::DOUBLE AS "Faturamento",
+                   date_trunc('day', MAX({_coluna(COL_DATA)}))::TIMESTAMP AS "Última Compra"
+            FROM {{origem}} WHERE {{condicoes}} AND "Cliente" IS NOT NULL GROUP BY 1""")
+        resumo['Última Compra'] = resumo['Última Compra'].astype('datetime64[ns]')
+    resumo['Cliente'] = resumo['Cliente'].astype(object)
+    resumo = resumo.sort_values(['Faturamento', 'Cliente'], ascending=[False, True], ignore_index=True)
+    codigos = pd.Index(resumo['Cliente'])
+    indice = {'clientes': resumo, 'codigos': codigos, 'posicoes': termos_clientes(fonte)['nomes'].get_indexer(codigos)}
+    if fonte['backend'] == 'pandas':
+        # Linhas do df filtrado agrupadas por cliente: as de `codigos[i]` são ordem[limites[i]:limites[i + 1]].
+        linhas = codigos.get_indexer(_filtrada(selecao, 'df')['Cliente'])
+        ordem = np.argsort(linhas, kind='stable')
+        indice['ordem'] = ordem.astype(np.int32) if len(ordem) < 2**31 else ordem
+        indice['limites'] = np.searchsorted(linhas[ordem], np.arange(len(codigos) + 1))
+    return indice
+
+@compartilhado
+@instrumentar
+def buscar_clientes(selecao, busca='', pagina=1, por_pagina=CLIENTES_POR_PAGINA):
+    # Cada termo da busca precisa ser o início de algum termo do nome: "joa sil" encontra "JOÃO DA SILVA".
+    indice = indice_clientes(selecao)
+    encontrados = indice['clientes']
+    termos_busca = normalizar_busca(busca).split()
+    if termos_busca:
+        termos = termos_clientes(selecao['fonte'])
+        candidatos = None
+        for termo in termos_busca:
+            # '{' vem logo depois de 'z' (e dos dígitos): o intervalo cobre todos os termos com esse prefixo.
+            inicio = np.searchsorted(termos['termos'], termo, side='left')
+            fim = np.searchsorted(termos['termos'], termo + '{', side='left')
+            posicoes = np.unique(termos['posicoes'][inicio:fim])
+            candidatos = posicoes if candidatos is None else np.intersect1d(candidatos, posicoes, assume_unique=True)
+        encontrados = encontrados[np.isin(indice['posicoes'], candidatos)]
+    paginas = max(1, -(-len(encontrados) // por_pagina))
+    pagina = min(max(int(pagina), 1), paginas)
+    return {
+        'clientes': encontrados.iloc[(pagina - 1) * por_pagina:pagina * por_pagina].reset_index(drop=True),
+        'total': len(encontrados), 'pagina': pagina, 'paginas': paginas,
+    }
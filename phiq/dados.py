@@ -0,0 +1,583 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from phiq.instrumentacao import instrumentar
+
+# Arquivos de configuração ficam na raiz do projeto, ao lado de Phiq.py.
+DIRETORIO_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ====================
+# Regras de normalização
+# ====================
+# Grafias de Estado, Vendedor, Segmento e Forma de Pagamento ficam em `regras_normalizacao.json`: cada coluna tem um
+# "mapa" de valores exatos, "padroes" regex aplicados em ordem e, opcionalmente, a lista de "validos" usada para
+# relatar valores não mapeados. As regras rodam uma vez na carga, sobre os valores únicos de cada coluna.
+CAMINHO_REGRAS = os.environ.get("PHIQ_REGRAS", os.path.join(DIRETORIO_PROJETO, "regras_normalizacao.json"))
+
+def carregar_regras(caminho=CAMINHO_REGRAS):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+REGRAS_NORMALIZACAO = carregar_regras()
+
+def normalizar_valor(valor, regra, padroes):
+    valor = valor.strip()
+    valor = regra.get('mapa', {}).get(valor, valor)
+    for padrao, substituto in padroes:
+        if padrao.search(valor):
+            valor = substituto
+    return valor
+
+def aplicar_regras(df, regras):
+    for col, regra in regras.items():
+        if col not in df.columns:
+            continue
+        padroes = [(re.compile(p['regex']), p['valor']) for p in regra.get('padroes', [])]
+        codigos, valores = pd.factorize(df[col])
+        normalizados = pd.Index([normalizar_valor(str(v), regra, padroes) for v in valores], dtype=object)
+        df[col] = normalizados.take(codigos, allow_fill=True, fill_value=np.nan)
+    return df
+
+@instrumentar
+def valores_nao_mapeados(df, regras=REGRAS_NORMALIZACAO):
+    relatorio = []
+    for col, regra in regras.items():
+        if col not in df.columns or 'validos' not in regra:
+            continue
+        contagem = df[col].value_counts()
+        contagem = contagem[(contagem > 0) & ~contagem.index.isin(regra['validos'])]
+        relatorio.append(pd.DataFrame({'Coluna': col, 'Valor': contagem.index.astype(str), 'Linhas': contagem.to_numpy()}))
+    if not relatorio:
+        return pd.DataFrame(columns=['Coluna', 'Valor', 'Linhas'])
+    return pd.concat(relatorio, ignore_index=True)
+
+# ====================
+# Atribuição de gestores
+# ====================
+# Cada gestor em `gestores.json` tem padrões de vendedor, grupos de palavras-chave a incluir/excluir (buscados nos
+# campos de `campos_palavras_chave`) e, opcionalmente, os segmentos atendidos por estado. A regra é avaliada uma vez
+# na carga e vira a coluna categórica `Gestor`; se uma linha casar com mais de um gestor, vale o primeiro da lista.
+CAMINHO_GESTORES = os.environ.get("PHIQ_GESTORES", os.path.join(DIRETORIO_PROJETO, "gestores.json"))
+
+def carregar_gestores(caminho=CAMINHO_GESTORES):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+CONFIG_GESTORES = carregar_gestores()
+
+def contem_algum(serie, termos):
+    # Avalia o padrão só nos valores únicos da coluna e propaga pelos códigos.
+    if not termos:
+        return np.zeros(len(serie), dtype=bool)
+    codigos, valores = pd.factorize(serie)
+    padrao = '|'.join(re.escape(t) for t in termos)
+    casa = pd.Series(valores, dtype=object).astype(str).str.contains(padrao, case=False, regex=True).to_numpy()
+    return np.append(casa, False)[codigos]
+
+@instrumentar
+def atribuir_gestores(df, config=None):
+    config = CONFIG_GESTORES if config is None else config
+    campos = [c for c in config.get('campos_palavras_chave', []) if c in df.columns]
+    grupos = {}
+    for nome, termos in config.get('palavras_chave', {}).items():
+        grupos[nome] = np.zeros(len(df), dtype=bool)
+        for campo in campos:
+            grupos[nome] |= contem_algum(df[campo], termos)
+
+    codigos = np.full(len(df), -1)
+    livres = np.ones(len(df), dtype=bool)
+    for i, regra in enumerate(config['gestores']):
+        mask = contem_algum(df['Vendedor'], regra.get('vendedores', [])) if 'Vendedor' in df.columns else np.zeros(len(df), dtype=bool)
+        for grupo in regra.get('incluir_palavras_chave', []):
+            mask |= grupos[grupo]
+        for grupo in regra.get('excluir_palavras_chave', []):
+            mask &= ~grupos[grupo]
+        mask &= livres
+        codigos[mask] = i
+        livres &= ~mask
+    df['Gestor'] = pd.Categorical.from_codes(codigos, categories=[g['nome'] for g in config['gestores']])
+    return df
+
+def regra_do_gestor(nome, config=None):
+    config = CONFIG_GESTORES if config is None else config
+    return next(g for g in config['gestores'] if g['nome'] == nome)
+
+# ====================
+# Cache persistente dos dados normalizados
+# ====================
+# Incrementar sempre que a normalização em `normalizar_dados` mudar, para invalidar o cache em disco.
+VERSAO_NORMALIZACAO = 6
+CACHE_DIR = os.environ.get("PHIQ_CACHE_DIR", ".phiq_cache")
+
+# Leitura em blocos: arquivos acima do limite são lidos e normalizados em partes de TAMANHO_BLOCO linhas,
+# para que o pico de memória dependa do tamanho do bloco e não do tamanho total do arquivo.
+TAMANHO_BLOCO = int(os.environ.get("PHIQ_TAMANHO_BLOCO", "200000"))
+LIMITE_LEITURA_EM_BLOCOS_MB = float(os.environ.get("PHIQ_LIMITE_BLOCOS_MB", "50"))
+
+def chave_cache(dados_brutos):
+    # As regras de normalização e de gestores entram na chave: editar esses arquivos invalida o cache em disco.
+    regras = hashlib.sha256(json.dumps([REGRAS_NORMALIZACAO, CONFIG_GESTORES], sort_keys=True).encode()).hexdigest()[:12]
+    return f"{hashlib.sha256(dados_brutos).hexdigest()}-v{VERSAO_NORMALIZACAO}-r{regras}"
+
+def caminho_cache(chave):
+    return os.path.join(CACHE_DIR, f"{chave}.parquet")
+
+@instrumentar
+def ler_cache(chave):
+    caminho = caminho_cache(chave)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        return pd.read_parquet(caminho)
+    except Exception:
+        # Arquivo corrompido ou incompatível: descarta e normaliza de novo.
+        return None
+
+@instrumentar
+def salvar_cache(chave, df):
+    caminho = caminho_cache(chave)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, caminho)
+    except Exception:
+        # O cache é só uma otimização; colunas com tipos mistos ou disco cheio não devem derrubar o app.
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+# ====================
+# Conversão de datas e valores
+# ====================
+# O formato de cada coluna é detectado numa amostra dos valores únicos e aplicado à coluna inteira, sem inferência
+# valor a valor: datas dd/mm nunca são lidas como mm/dd, e valores com '.' decimal não perdem o ponto. Só os
+# valores únicos são convertidos (a data de faturamento se repete em todos os itens do pedido) e o resultado é
+# propagado pelos códigos. Linhas vazias, inválidas (viraram nulo) e descartadas por coluna ficam em
+# `df.attrs['conversao']`, que acompanha os dados no cache em disco.
+FORMATOS_DATA = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y', '%d/%m/%y',
+    # mm/dd só vence quando a amostra não cabe em dd/mm (dia > 12).
+    '%m/%d/%Y %H:%M:%S', '%m/%d/%Y',
+]
+TAMANHO_AMOSTRA = 1000
+
+def _amostra(textos):
+    return textos.iloc[::max(1, len(textos) // TAMANHO_AMOSTRA)]
+
+def detectar_formato_data(textos):
+    # O primeiro formato que lê a amostra inteira vence; senão, o que lê mais valores.
+    amostra = _amostra(textos[textos != ''])
+    acertos = {}
+    for formato in FORMATOS_DATA:
+        acertos[formato] = pd.to_datetime(amostra, format=formato, errors='coerce').notna().sum()
+        if acertos[formato] == len(amostra):
+            break
+    melhor = max(acertos, key=acertos.get)
+    return melhor if acertos[melhor] > 0 else None
+
+def detectar_decimal(textos):
+    # Vírgula decimal (e '.' de milhar), como na exportação, a menos que a amostra só tenha '.' como decimal.
+    # "1.234" sozinho é ambíguo e fica como milhar.
+    amostra = _amostra(textos)
+    ponto = amostra.str.contains(r'\.(?:\d{1,2}|\d{4,})$').any()
+    virgula = amostra.str.contains(r',\d+$').any()
+    return '.' if ponto and not virgula else ','
+
+def _estatisticas(codigos, textos, convertidos, formato):
+    linhas_por_valor = np.bincount(codigos[codigos >= 0], minlength=len(textos))
+    vazios = (textos == '').to_numpy()
+    invalidos = convertidos.isna().to_numpy() & ~vazios
+    return {
+        'formato': formato,
+        'linhas': len(codigos),
+        'vazias': int((codigos < 0).sum() + linhas_por_valor[vazios].sum()),
+        'invalidas': int(linhas_por_valor[invalidos].sum()),
+    }
+
+def converter_datas(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie, {'formato': None, 'linhas': len(serie), 'vazias': int(serie.isna().sum()), 'invalidas': 0}
+    codigos, unicos = pd.factorize(serie)
+    textos = pd.Series(unicos, dtype=object).astype(str).str.strip()
+    formato = detectar_formato_data(textos)
+    datas = pd.to_datetime(textos, format=formato, errors='coerce') if formato else pd.Series(pd.NaT, index=textos.index)
+    # Valores fora do formato detectado (poucos, se houver) ainda passam pela inferência, com dia antes do mês.
+    fora = datas.isna() & (textos != '')
+    if fora.any():
+        try:
+            datas[fora] = pd.to_datetime(textos[fora], format='mixed', dayfirst=True, errors='coerce')
+        except (ValueError, TypeError):
+            pass
+    valores = np.append(datas.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT'))[codigos]
+    return pd.Series(valores, index=serie.index), _estatisticas(codigos, textos, datas, formato)
+
+def converter_numeros(serie):
+    if serie.dtype != 'object':
+        convertidos = pd.to_numeric(serie, errors='coerce')
+        return convertidos, {'formato': None, 'linhas': len(serie), 'vazias': int(serie.isna().sum()),
+                             'invalidas': int((convertidos.isna() & serie.notna()).sum())}
+    codigos, unicos = pd.factorize(serie)
+    textos = pd.Series(unicos, dtype=object).astype(str).str.replace(r'R\$|\s', '', regex=True)
+    decimal = detectar_decimal(textos)
+    if decimal == ',':
+        normalizados = textos.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    else:
+        normalizados = textos.str.replace(',', '', regex=False)
+    convertidos = pd.to_numeric(normalizados, errors='coerce')
+    if (codigos < 0).any():
+        valores = np.append(convertidos.to_numpy(dtype=float), np.nan)[codigos]
+    else:
+        valores = convertidos.to_numpy()[codigos]
+    return pd.Series(valores, index=serie.index), _estatisticas(codigos, textos, convertidos, f"decimal '{decimal}'")
+
+def somar_conversao(*estatisticas):
+    # Estatísticas de blocos ou arquivos diferentes: contagens somadas, formatos distintos listados.
+    total = {'linhas_lidas': 0, 'linhas_descartadas': 0, 'colunas': {}}
+    for parte in estatisticas:
+        if not parte:
+            continue
+        total['linhas_lidas'] += parte['linhas_lidas']
+        total['linhas_descartadas'] += parte['linhas_descartadas']
+        for col, contagem in parte['colunas'].items():
+            atual = total['colunas'].setdefault(col, {'formato': None, 'linhas': 0, 'vazias': 0, 'invalidas': 0, 'descartadas': 0})
+            formatos = [f for f in dict.fromkeys((atual['formato'] or '').split(' | ') + [contagem['formato'] or '']) if f]
+            atual['formato'] = ' | '.join(formatos) or None
+            for chave in ('linhas', 'vazias', 'invalidas', 'descartadas'):
+                atual[chave] += contagem[chave]
+    return total
+
+def tabela_conversao(estatisticas):
+    linhas = [
+        {'Coluna': col, 'Formato': c['formato'] or '-', 'Vazias': c['vazias'], 'Inválidas': c['invalidas'], 'Descartadas': c['descartadas']}
+        for col, c in (estatisticas or {}).get('colunas', {}).items()
+    ]
+    return pd.DataFrame(linhas, columns=['Coluna', 'Formato', 'Vazias', 'Inválidas', 'Descartadas'])
+
+def ler_conversao(pasta):
+    caminho = os.path.join(pasta, 'conversao.json')
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+# ====================
+# Função para carregar e preparar dados
+# ====================
+# Franquia das linhas sem a coluna 'Franquia' quando o arquivo não é identificado por nome ou manifesto.
+FRANQUIA_PADRAO = 'PHIQ'
+
+@instrumentar
+def normalizar_dados(df, regras=None, franquia=None):
+    df.columns = df.columns.str.strip()
+    
+    column_mapping = {
+        'Data Faturamento Pedido': 'Data Faturamento Pedido', 'Cliente': 'Cliente',
+        'Estado': 'Estado', 'UF': 'Estado', 'Vendedor': 'Vendedor',
+        'Preço Venda Total (R$)': 'Valor Total', 'Valor Total': 'Valor Total',
+        'Descrição': 'Descrição', 'Forma Pagamento': 'Forma Pagamento',
+        'SEGMENTO ': 'Segmento', 'SEGMENTO': 'Segmento', 'Franquia': 'Franquia',
+        'Data': 'Data'
+    }
+    for old, new in column_mapping.items():
+        if old in df.columns:
+            df.rename(columns={old: new}, inplace=True)
+
+    if 'Franquia' not in df.columns:
+        df['Franquia'] = franquia or FRANQUIA_PADRAO
+    elif franquia:
+        df['Franquia'] = df['Franquia'].fillna(franquia)
+
+    conversao = {}
+    date_cols = ['Data', 'Data Faturamento Pedido']
+    for col in date_cols:
+        if col in df.columns:
+            df[col], conversao[col] = converter_datas(df[col])
+    
+    numeric_cols = ['Valor Total', 'Quantidade']
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col], conversao[col] = converter_numeros(df[col])
+    
+    obrigatorias = ['Valor Total', 'Data Faturamento Pedido', 'Quantidade']
+    for col, contagem in conversao.items():
+        contagem['descartadas'] = int(df[col].isna().sum()) if col in obrigatorias else 0
+    linhas_lidas = len(df)
+    df.dropna(subset=obrigatorias, inplace=True)
+    df.attrs['conversao'] = {'linhas_lidas': linhas_lidas, 'linhas_descartadas': linhas_lidas - len(df), 'colunas': conversao}
+
+    text_cols = ['Estado', 'Vendedor', 'Segmento']
+    for col in text_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.upper()
+
+    return aplicar_regras(df, REGRAS_NORMALIZACAO if regras is None else regras)
+
+def extrair_produto(descricao):
+    return descricao.str.split(' - ').str[1:].str.join(' - ').fillna(descricao)
+
+@instrumentar
+def adicionar_dimensao_produto(df):
+    # Produto é uma dimensão categórica: só as descrições únicas passam pelo split de texto, e os códigos da
+    # categoria (ordenada por nome) são o id do produto usado nos agrupamentos.
+    if 'Descrição' not in df.columns:
+        return df
+    codigos_descricao, descricoes = pd.factorize(df['Descrição'])
+    nomes = extrair_produto(pd.Series(descricoes, dtype=object))
+    codigos_produto, produtos = pd.factorize(nomes, sort=True)
+    ids = np.where(codigos_descricao >= 0, codigos_produto[codigos_descricao], -1)
+    df['Produto'] = pd.Categorical.from_codes(ids, categories=produtos)
+    return df
+
+@instrumentar
+def ler_csv(arquivo):
+    return pd.read_csv(arquivo, encoding='utf-8', on_bad_lines='skip', low_memory=False)
+
+@instrumentar
+def ler_csv_em_blocos(arquivo, tamanho_bloco=TAMANHO_BLOCO, franquia=None):
+    blocos = []
+    leitor = pd.read_csv(arquivo, encoding='utf-8', on_bad_lines='skip', low_memory=False, chunksize=tamanho_bloco)
+    with leitor:
+        for bloco in leitor:
+            # Cada bloco bruto é descartado logo após a normalização; só o resultado limpo fica em memória.
+            blocos.append(normalizar_dados(bloco, franquia=franquia))
+    return concatenar_normalizados(blocos)
+
+def concatenar_normalizados(partes, ignore_index=False):
+    # pd.concat só mantém attrs iguais em todas as partes: as estatísticas de conversão são somadas à parte.
+    conversao = somar_conversao(*(parte.attrs.get('conversao') for parte in partes))
+    df = pd.concat(partes, ignore_index=ignore_index, copy=False)
+    df.attrs['conversao'] = conversao
+    return df
+
+def ler_normalizado(dados_brutos, franquia=None):
+    if TAMANHO_BLOCO > 0 and len(dados_brutos) > LIMITE_LEITURA_EM_BLOCOS_MB * 1024 * 1024:
+        return ler_csv_em_blocos(io.BytesIO(dados_brutos), franquia=franquia)
+    return normalizar_dados(ler_csv(io.BytesIO(dados_brutos)), franquia=franquia)
+
+# ====================
+# Esquema compacto (opcional)
+# ====================
+# Dimensões de baixa cardinalidade e identificadores viram categorias: filtros (isin), groupby e nunique
+# passam a operar sobre os códigos inteiros em vez de re-hashear strings Python a cada interação.
+COLUNAS_CATEGORICAS = ['Estado', 'Vendedor', 'Segmento', 'Franquia', 'Forma Pagamento', 'Cliente', 'Descrição', 'Código Venda']
+
+@instrumentar
+def compactar_dados(df):
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'Quantidade' in df.columns:
+        quantidade = df['Quantidade']
+        if (quantidade % 1 == 0).all() and quantidade.abs().max() < 2**31:
+            df['Quantidade'] = quantidade.astype('int32')
+    return df
+
+def relatorio_memoria(df_atual, df_compacto):
+    linhas = max(len(df_atual), 1)
+    atual = df_atual.memory_usage(index=False, deep=True) / linhas
+    compacto = df_compacto.memory_usage(index=False, deep=True).reindex(atual.index) / linhas
+    relatorio = pd.DataFrame({
+        'Tipo Atual': df_atual.dtypes.astype(str),
+        'Tipo Compacto': df_compacto.dtypes.reindex(atual.index).astype(str),
+        'Bytes/Linha (Atual)': atual,
+        'Bytes/Linha (Compacto)': compacto,
+    })
+    relatorio.loc['TOTAL'] = ['', '', atual.sum(), compacto.sum()]
+    relatorio['Redução'] = (1 - relatorio['Bytes/Linha (Compacto)'] / relatorio['Bytes/Linha (Atual)']).map('{:.0%}'.format)
+    relatorio[['Bytes/Linha (Atual)', 'Bytes/Linha (Compacto)']] = relatorio[['Bytes/Linha (Atual)', 'Bytes/Linha (Compacto)']].round(1)
+    return relatorio.rename_axis('Coluna').reset_index()
+
+
+# ====================
+# Carga completa
+# ====================
+def carregar_dados(dados_brutos, compacto=False):
+    chave = chave_cache(dados_brutos)
+    df = ler_cache(chave)
+    if df is None:
+        df = completar_dados(ler_normalizado(dados_brutos))
+        salvar_cache(chave, df)
+    # A chave identifica o conteúdo carregado: sessões com os mesmos arquivos compartilham o cache de resultados.
+    df.attrs['chave'] = chave
+    return compactar_dados(df) if compacto else df
+
+def completar_dados(df):
+    # Ordenado por data de faturamento: os filtros de período viram buscas binárias (ver `fatiar_periodo`).
+    df = df.sort_values('Data Faturamento Pedido', kind='stable')
+    df = adicionar_dimensao_produto(df)
+    return atribuir_gestores(df)
+
+def carregar_arquivo(caminho, compacto=False):
+    with open(caminho, 'rb') as arquivo:
+        return carregar_dados(arquivo.read(), compacto=compacto)
+
+def preparar_bloco(bloco, franquia=None):
+    # Normalização, produto e gestor de um bloco bruto: as etapas de `carregar_dados` que valem linha a linha.
+    return atribuir_gestores(adicionar_dimensao_produto(normalizar_dados(bloco, franquia=franquia)))
+
+# ====================
+# Vários arquivos (um por franquia)
+# ====================
+# Cada franquia envia a sua exportação. Os arquivos (soltos, numa pasta ou num .zip) são lidos e normalizados em
+# paralelo, um processo por arquivo, e concatenados uma única vez; ordenação, produto e gestor rodam depois sobre o
+# resultado, para que as categorias sejam as mesmas em todas as franquias. Nos arquivos sem a coluna 'Franquia', a
+# franquia vem do manifesto `franquias.json` (nome do arquivo -> franquia) ou do nome do arquivo. Um arquivo único
+# fora do manifesto mantém a franquia padrão, como na carga de um arquivo só.
+NOME_MANIFESTO_FRANQUIAS = "franquias.json"
+PROCESSOS_CARGA = int(os.environ.get("PHIQ_PROCESSOS_CARGA", "0")) or None
+# Processos novos (spawn) em vez de fork: o servidor do Streamlit tem várias threads, e um fork no meio de uma delas
+# segurando uma trava (logging, pyarrow, ...) pode deixar o processo filho travado para sempre.
+CONTEXTO_PROCESSOS = os.environ.get("PHIQ_CONTEXTO_PROCESSOS", "spawn")
+
+def franquia_do_nome(nome):
+    base = os.path.splitext(os.path.basename(nome))[0]
+    return re.sub(r'[_\s]+', ' ', base).strip() or FRANQUIA_PADRAO
+
+def expandir_arquivos(arquivos):
+    # (nome, bytes) de cada entrada -> CSVs ordenados por nome (conteúdo dos .zip incluído) e o manifesto, se houver.
+    csvs, manifesto = [], {}
+    for nome, dados_brutos in arquivos:
+        base = os.path.basename(nome)
+        if base.lower() == NOME_MANIFESTO_FRANQUIAS:
+            manifesto.update(json.loads(dados_brutos.decode('utf-8')))
+        elif base.lower().endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(dados_brutos)) as pacote:
+                internos = [(m, pacote.read(m)) for m in pacote.namelist()
+                            if not m.endswith('/') and not m.startswith('__MACOSX/')]
+            internos_csv, internos_manifesto = expandir_arquivos(internos)
+            csvs += internos_csv
+            manifesto.update(internos_manifesto)
+        elif base.lower().endswith('.csv'):
+            csvs.append((base, dados_brutos))
+    return sorted(csvs, key=lambda arquivo: arquivo[0]), manifesto
+
+def ler_entradas(caminhos):
+    # Caminhos da linha de comando: arquivos CSV, .zip, o manifesto ou pastas com eles (percorridas recursivamente).
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            nomes = sorted(os.path.join(raiz, nome) for raiz, _, nomes in os.walk(caminho) for nome in nomes
+                           if nome.lower().endswith(('.csv', '.zip')) or nome.lower() == NOME_MANIFESTO_FRANQUIAS)
+        else:
+            nomes = [caminho]
+        for nome in nomes:
+            with open(nome, 'rb') as arquivo:
+                arquivos.append((nome, arquivo.read()))
+    return arquivos
+
+def csvs_e_franquias(arquivos):
+    # Franquia None: arquivo único fora do manifesto, carregado como antes (coluna 'Franquia' ou a franquia padrão).
+    csvs, manifesto = expandir_arquivos(arquivos)
+    if not csvs:
+        raise ValueError("Nenhum arquivo CSV encontrado.")
+    if len(csvs) == 1 and not manifesto:
+        return csvs, [None]
+    return csvs, [manifesto.get(nome, franquia_do_nome(nome)) for nome, _ in csvs]
+
+def chave_cache_lote(csvs, franquias):
+    if franquias == [None]:
+        return chave_cache(csvs[0][1])
+    conteudo = hashlib.sha256()
+    for (_, dados_brutos), franquia in zip(csvs, franquias):
+        conteudo.update(f"{franquia}\0{hashlib.sha256(dados_brutos).hexdigest()}\0".encode())
+    return chave_cache(conteudo.digest())
+
+def mapear_em_processos(funcao, tarefas, tamanhos, processos=PROCESSOS_CARGA, contexto=CONTEXTO_PROCESSOS):
+    processos = min(processos or os.cpu_count() or 1, len(tarefas))
+    if processos <= 1:
+        return [funcao(*tarefa) for tarefa in tarefas]
+    with ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context(contexto)) as pool:
+        # Maiores arquivos primeiro: o tempo total fica próximo ao do maior arquivo, não ao da soma.
+        ordem = sorted(range(len(tarefas)), key=lambda i: -tamanhos[i])
+        futuros = {i: pool.submit(funcao, *tarefas[i]) for i in ordem}
+        return [futuros[i].result() for i in range(len(tarefas))]
+
+@instrumentar
+def normalizar_em_paralelo(csvs, franquias, processos=PROCESSOS_CARGA):
+    tarefas = [(dados_brutos, franquia) for (_, dados_brutos), franquia in zip(csvs, franquias)]
+    partes = mapear_em_processos(ler_normalizado, tarefas, [len(d) for d, _ in tarefas], processos=processos)
+    return concatenar_normalizados(partes, ignore_index=True)
+
+def carregar_varios(arquivos, compacto=False, processos=PROCESSOS_CARGA):
+    csvs, franquias = csvs_e_franquias(arquivos)
+    if franquias == [None]:
+        return carregar_dados(csvs[0][1], compacto=compacto)
+
+    chave = chave_cache_lote(csvs, franquias)
+    df = ler_cache(chave)
+    if df is None:
+        df = completar_dados(normalizar_em_paralelo(csvs, franquias, processos=processos))
+        salvar_cache(chave, df)
+    df.attrs['chave'] = chave
+    return compactar_dados(df) if compacto else df
+
+# ====================
+# Importação para Parquet (motor DuckDB)
+# ====================
+# Mesmo pipeline de `carregar_dados`, bloco a bloco e sem concatenar: cada bloco normalizado vira um arquivo
+# `parte-NNNNN.parquet` na pasta de destino, e o pico de memória depende só do tamanho do bloco. Os arquivos
+# preservam a ordem original das linhas (a ordenação por data fica a cargo das consultas). Com vários arquivos, cada
+# um é importado num processo do pool e as partes ganham o prefixo `arquivo-NNN-`.
+@contextmanager
+def substituir_pasta(pasta):
+    temporaria = f"{pasta.rstrip(os.sep)}.{os.getpid()}.tmp"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    os.makedirs(temporaria)
+    try:
+        yield temporaria
+        shutil.rmtree(pasta, ignore_errors=True)
+        os.replace(temporaria, pasta)
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+def gravar_partes(arquivo, destino, prefixo='parte', franquia=None, tamanho_bloco=TAMANHO_BLOCO):
+    if isinstance(arquivo, bytes):
+        arquivo = io.BytesIO(arquivo)
+    conversao = []
+    leitor = pd.read_csv(arquivo, encoding='utf-8', on_bad_lines='skip', low_memory=False, chunksize=tamanho_bloco or 200_000)
+    with leitor:
+        for i, bloco in enumerate(leitor):
+            bloco = preparar_bloco(bloco, franquia=franquia)
+            conversao.append(bloco.attrs.pop('conversao', None))
+            bloco.to_parquet(os.path.join(destino, f"{prefixo}-{i:05d}.parquet"), index=False)
+    return somar_conversao(*conversao)
+
+def gravar_conversao(pasta, conversao):
+    # Ao lado das partes: o DuckDB só lê os arquivos .parquet da pasta.
+    with open(os.path.join(pasta, 'conversao.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(conversao, arquivo, ensure_ascii=False, indent=2)
+
+@instrumentar
+def importar_parquet(arquivo, pasta, tamanho_bloco=TAMANHO_BLOCO):
+    with substituir_pasta(pasta) as temporaria:
+        gravar_conversao(temporaria, gravar_partes(arquivo, temporaria, tamanho_bloco=tamanho_bloco))
+    return pasta
+
+@instrumentar
+def importar_varios(csvs, franquias, pasta, processos=PROCESSOS_CARGA):
+    with substituir_pasta(pasta) as temporaria:
+        tarefas = [(dados_brutos, temporaria, f"arquivo-{j:03d}-parte", franquia)
+                   for j, ((_, dados_brutos), franquia) in enumerate(zip(csvs, franquias))]
+        conversao = mapear_em_processos(gravar_partes, tarefas, [len(t[0]) for t in tarefas], processos=processos)
+        gravar_conversao(temporaria, somar_conversao(*conversao))
+    return pasta
+
+def carregar_dataset(arquivos):
+    # Pasta Parquet de um upload, no mesmo cache em disco e com a mesma chave dos dados normalizados.
+    csvs, franquias = csvs_e_franquias(arquivos)
+    pasta = os.path.join(CACHE_DIR, f"{chave_cache_lote(csvs, franquias)}.dataset")
+    if not os.path.isdir(pasta):
+        importar_varios(csvs, franquias, pasta)
+    return pasta
@@ -0,0 +1,25 @@
+# ====================
+# Funções de Formatação
+# ====================
+def formatar_real(valor):
+    try:
+        return f"R$ {valor:,.2f}".replace(",", "TEMP").replace(".", ",").replace("TEMP", ".")
+    except (ValueError, TypeError):
+        return "R$ 0,00"
+
+def formatar_numero_abreviado(valor):
+    try:
+        valor = float(valor)
+        if valor >= 1_000_000:
+            return f"R$ {valor/1_000_000:.1f} M".replace('.', ',')
+        if valor >= 1_000:
+            return f"R$ {valor/1_000:.1f} MIL".replace('.', ',')
+        return f"R$ {valor:,.2f}".replace(",", "TEMP").replace(".", ",").replace("TEMP", ".")
+    except (ValueError, TypeError):
+        return "R$ 0,00"
+
+def formatar_inteiro(valor):
+    try:
+        return f"{int(valor):,}".replace(",", ".")
+    except (ValueError, TypeError):
+        return "0"
@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+import plotly.express as px
+
+from phiq.analise import faturamento_por_periodo
+from phiq.formatacao import formatar_inteiro, formatar_numero_abreviado
+from phiq.instrumentacao import instrumentar
+
+# --- PALETA DE CORES (TEMA ESCURO) ---
+TEAL = "#2C8B8B"        # Verde-água (Mantido como cor de destaque e da sidebar)
+SOFT_BLUE = "#3A7CA5"    # Azul suave (Mantido como cor de destaque secundária)
+BACKGROUND_DARK = "#0E1117" # Cor de fundo geral (preto azulado do Streamlit)
+CONTENT_BG_DARK = "#1E1E1E" # Cor de fundo da área de conteúdo (cinza escuro)
+TEXT_LIGHT = "#FAFAFA"      # Cor de texto clara
+GRAY_LIGHT = "#CCCCCC"  # Cinza claro
+GRAY_DARK = "#AAAAAA"   # Cinza escuro
+
+LAYOUT_TRANSPARENTE = dict(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color=TEXT_LIGHT)
+CORES_TIPO_COMPRA = {'Cliente Novo': TEAL, 'Recompra': SOFT_BLUE}
+CORES_FORMA_PAGAMENTO = {
+    'Boleto Bancário': TEAL, 'PIX': SOFT_BLUE,
+    'Dinheiro': GRAY_LIGHT, 'Permuta': GRAY_DARK
+}
+
+# ====================
+# Séries longas: redução de pontos e WebGL
+# ====================
+# Séries diárias com mais de MAX_PONTOS_SERIE pontos são reduzidas por LTTB, que preserva picos e vales; acima de
+# LIMITE_PONTOS_WEBGL pontos a linha é desenhada em WebGL (Scattergl) em vez de um elemento SVG por marcador.
+MAX_PONTOS_SERIE = int(os.environ.get("PHIQ_MAX_PONTOS_SERIE", "1000"))
+LIMITE_PONTOS_WEBGL = int(os.environ.get("PHIQ_LIMITE_WEBGL", "500"))
+
+def lttb(x, y, n_pontos):
+    # Largest-Triangle-Three-Buckets: mantém o primeiro e o último ponto e, em cada balde, o ponto que forma o
+    # maior triângulo com o ponto escolhido no balde anterior e a média do balde seguinte. Devolve as posições.
+    n = len(x)
+    if n_pontos >= n or n_pontos < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    limites = np.linspace(1, n - 1, n_pontos - 1).astype(np.int64)
+    escolhidos = np.empty(n_pontos, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        fim_seguinte = limites[i + 2] if i + 2 < len(limites) else n
+        media_x, media_y = x[fim:fim_seguinte].mean(), y[fim:fim_seguinte].mean()
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior]) - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+def reduzir_serie(serie, coluna_x, coluna_y, n_pontos=MAX_PONTOS_SERIE):
+    if len(serie) <= n_pontos:
+        return serie
+    x = serie[coluna_x].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return serie.iloc[lttb(x, serie[coluna_y].to_numpy(), n_pontos)].reset_index(drop=True)
+
+# ====================
+# Construção dos gráficos (compartilhada pelo dashboard e pelos relatórios)
+# ====================
+@instrumentar
+def grafico_faturamento(cubo, modo, titulo):
+    if modo == 'Mês':
+        faturamento = faturamento_por_periodo(cubo, 'M')
+        faturamento['Eixo_X'] = faturamento['Data Faturamento Pedido'].dt.strftime('%b/%y')
+    else: # Dia
+        faturamento = reduzir_serie(faturamento_por_periodo(cubo, 'D'), 'Data Faturamento Pedido', 'Valor Total')
+        faturamento['Eixo_X'] = faturamento['Data Faturamento Pedido']
+
+    render_mode = 'webgl' if len(faturamento) > LIMITE_PONTOS_WEBGL else 'auto'
+    fig = px.line(faturamento, x='Eixo_X', y='Valor Total', title=titulo, markers=True, render_mode=render_mode)
+    fig.update_traces(line_color=TEAL)
+    fig.update_layout(**LAYOUT_TRANSPARENTE)
+    return fig
+
+@instrumentar
+def grafico_novos_recompra(contagem_tipo, titulo):
+    # contagem_tipo: colunas 'Tipo Compra' e 'Quantidade' (itens de cada tipo), como em `consultas.novos_recompra`.
+    fig = px.pie(contagem_tipo, values='Quantidade', names='Tipo Compra', title=titulo,
+                 color='Tipo Compra', color_discrete_map=CORES_TIPO_COMPRA)
+    fig.update_traces(textinfo='percent+label', pull=[0.05, 0.05])
+    fig.update_layout(**LAYOUT_TRANSPARENTE, legend_font_color=TEXT_LIGHT)
+    return fig
+
+@instrumentar
+def grafico_top_clientes(top_clientes, titulo):
+    fig = px.bar(top_clientes.reset_index(), x='Valor Total', y='Cliente', orientation='h', title=titulo)
+    fig.update_traces(text=[formatar_numero_abreviado(v) for v in top_clientes], textposition='auto', marker_color=TEAL)
+    fig.update_layout(yaxis=dict(autorange="reversed"), **LAYOUT_TRANSPARENTE)
+    return fig
+
+@instrumentar
+def grafico_top_produtos(top_produtos, medida, titulo):
+    if medida == 'Quantidade':
+        text_labels = [formatar_inteiro(q) for q in top_produtos]
+        fig = px.bar(top_produtos.reset_index(), x='Quantidade', y='Produto', orientation='h', title=titulo,
+                     color='Quantidade', color_continuous_scale=[SOFT_BLUE, TEAL], text=text_labels)
+        fig.update_traces(textposition='auto', marker_color=SOFT_BLUE)
+    else: # Valor Total
+        text_labels = [formatar_numero_abreviado(v) for v in top_produtos]
+        fig = px.bar(top_produtos.reset_index(), x='Valor Total', y='Produto', orientation='h', title=titulo,
+                     color='Valor Total', color_continuous_scale=[TEAL, SOFT_BLUE], text=text_labels)
+        fig.update_traces(textposition='auto', marker_color=TEAL)
+
+    fig.update_layout(yaxis=dict(autorange="reversed"), **LAYOUT_TRANSPARENTE)
+    return fig
+
+@instrumentar
+def grafico_formas_pagamento(fat_forma, titulo):
+    fig = px.pie(
+        fat_forma,
+        values='Valor Total',
+        names='Forma Pagamento',
+        title=titulo,
+        color='Forma Pagamento',
+        color_discrete_map=CORES_FORMA_PAGAMENTO
+    )
+    fig.update_traces(textinfo='percent+label', pull=[0.05] * len(fat_forma))
+    fig.update_layout(**LAYOUT_TRANSPARENTE, legend_font_color=TEXT_LIGHT)
+    return fig
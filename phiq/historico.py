@@ -0,0 +1,302 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from phiq.analise import (
+    construir_acumulados, construir_cubo, construir_cubo_produtos, construir_primeiras_compras, construir_tabela_pedidos,
+    indexar_gestores, prever_proximas_compras,
+)
+from phiq.dados import (
+    CONFIG_GESTORES, REGRAS_NORMALIZACAO, TAMANHO_BLOCO, compactar_dados, csvs_e_franquias, preparar_bloco, somar_conversao,
+)
+from phiq.instrumentacao import instrumentar
+
+# ====================
+# Histórico incremental
+# ====================
+# Um histórico local persistente que recebe só os CSVs novos (deltas) em vez da exportação acumulada inteira:
+#   dados/AAAA-MM.parquet        linhas normalizadas do mês, ordenadas por data de faturamento;
+#   resumos/AAAA-MM/*.parquet    cubos, pedidos, primeiras compras e dias de compra do mês;
+#   indice_vendas.parquet        meses em que cada 'Código Venda' aparece;
+#   manifesto.json               versão, meses, linhas e as últimas atualizações.
+# Um pedido ('Franquia' + 'Código Venda') presente no delta substitui o pedido inteiro já gravado: reenviar um arquivo
+# não duplica vendas, e um pedido corrigido com menos linhas não deixa as linhas antigas para trás. Linhas sem código,
+# que não formam pedido, são identificadas por 'Franquia' + 'Descrição' + 'Item Pedido' (a ordem da linha entre as de
+# mesma venda e descrição no arquivo). Só os meses do delta, ou com vendas do delta, são regravados. As estruturas
+# do dashboard vêm dos resumos por mês, então uma atualização custa o tamanho do delta e dos meses afetados.
+PASTA_HISTORICO = os.environ.get("PHIQ_HISTORICO", ".phiq_historico")
+
+COL_DATA = 'Data Faturamento Pedido'
+COL_VENDA = 'Código Venda'
+COL_ITEM = 'Item Pedido'
+RESUMOS = ['cubo', 'cubo_produtos', 'pedidos', 'primeiras', 'dias']
+
+# Um processo do Streamlit atende várias sessões: duas atualizações simultâneas não podem intercalar gravações.
+_trava = threading.Lock()
+
+def assinatura_regras():
+    return hashlib.sha256(json.dumps([REGRAS_NORMALIZACAO, CONFIG_GESTORES], sort_keys=True).encode()).hexdigest()[:12]
+
+def ler_manifesto(pasta=PASTA_HISTORICO):
+    caminho = os.path.join(pasta, 'manifesto.json')
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def _gravar_manifesto(pasta, manifesto):
+    caminho = os.path.join(pasta, 'manifesto.json')
+    with open(f"{caminho}.tmp", 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=2)
+    os.replace(f"{caminho}.tmp", caminho)
+
+def _gravar(tabela, caminho, index=False):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    tabela.to_parquet(temporario, index=index)
+    os.replace(temporario, caminho)
+
+def pasta_dados(pasta=PASTA_HISTORICO):
+    return os.path.join(pasta, 'dados')
+
+def _arquivo_mes(pasta, mes):
+    return os.path.join(pasta_dados(pasta), f"{mes}.parquet")
+
+def _arquivo_resumo(pasta, mes, nome):
+    return os.path.join(pasta, 'resumos', mes, f"{nome}.parquet")
+
+def _colunas_chave(tabela):
+    return ['Franquia', COL_VENDA] + (['Descrição'] if 'Descrição' in tabela.columns else []) + [COL_ITEM]
+
+def codigos_canonicos(tabela):
+    # 'Código Venda' com um só tipo em todos os deltas e meses: texto, sem o ".0" de uma coluna que o pandas leu como
+    # float por causa de um código vazio; vazio continua NA. Sem isso o mesmo pedido teria chaves diferentes ("100" e
+    # "100.0") e seria duplicado em vez de substituído, e meses com tipos diferentes não se juntam no Parquet.
+    for coluna in [COL_VENDA, 'Primeira_Venda_Codigo']:
+        if coluna not in tabela.columns or isinstance(tabela[coluna].dtype, pd.StringDtype):
+            continue
+        codigos = tabela[coluna]
+        if isinstance(codigos.dtype, pd.CategoricalDtype):
+            codigos = codigos.astype(object)
+        if pd.api.types.is_float_dtype(codigos) and (codigos.dropna() % 1 == 0).all():
+            codigos = codigos.astype('Int64')
+        tabela[coluna] = codigos.astype('string')
+    return tabela
+
+def _hash_linhas(tabela, colunas):
+    # Chave de linha como um inteiro: códigos numéricos e textuais ("123" x 123) comparam pelo texto.
+    return pd.util.hash_pandas_object(tabela[colunas].astype(str), index=False).to_numpy()
+
+def _chaves_substituicao(tabela):
+    # Chave do pedido inteiro; linhas sem 'Código Venda' usam a chave da linha.
+    chaves = _hash_linhas(tabela, ['Franquia', COL_VENDA])
+    sem_codigo = tabela[COL_VENDA].isna().to_numpy()
+    if sem_codigo.any():
+        chaves[sem_codigo] = _hash_linhas(tabela[sem_codigo], _colunas_chave(tabela))
+    return chaves
+
+def numerar_itens(bloco, contagem):
+    # 'Item Pedido' = ordem da linha entre as de mesma venda e descrição, contínua entre os blocos do arquivo.
+    grupos = pd.Series(_hash_linhas(bloco, _colunas_chave(bloco)[:-1]), index=bloco.index)
+    anteriores = grupos.map(contagem).fillna(0).to_numpy(dtype=np.int64)
+    bloco[COL_ITEM] = grupos.groupby(grupos, sort=False).cumcount().to_numpy() + anteriores
+    return contagem.add(grupos.value_counts(), fill_value=0).astype(np.int64)
+
+def _resumir(particao):
+    dias = particao[['Cliente', COL_DATA]].dropna()
+    resumos = {
+        'cubo': construir_cubo(particao),
+        'cubo_produtos': construir_cubo_produtos(particao),
+        'pedidos': construir_tabela_pedidos(particao),
+        'primeiras': construir_primeiras_compras(particao),
+        'dias': dias.assign(**{COL_DATA: dias[COL_DATA].dt.normalize()}).drop_duplicates(ignore_index=True),
+    }
+    return {nome: tabela for nome, tabela in resumos.items() if tabela is not None}
+
+@instrumentar
+def atualizar_historico(arquivo, pasta=PASTA_HISTORICO, nome=None, tamanho_bloco=TAMANHO_BLOCO, franquia=None):
+    with _trava:
+        os.makedirs(pasta, exist_ok=True)
+        manifesto = ler_manifesto(pasta) or {'versao': 0, 'linhas_por_mes': {}, 'regras': assinatura_regras(), 'atualizacoes': []}
+        with tempfile.TemporaryDirectory(dir=pasta) as estagio:
+            # 1) O delta é normalizado em blocos e separado por mês em arquivos temporários.
+            novos, chaves, vendas, conversao, linhas_delta = {}, [], [], [], 0
+            contagem = pd.Series(dtype=np.int64)
+            leitor = pd.read_csv(arquivo, encoding='utf-8', on_bad_lines='skip', low_memory=False, chunksize=tamanho_bloco or 200_000)
+            with leitor:
+                for i, bloco in enumerate(leitor):
+                    bloco = codigos_canonicos(preparar_bloco(bloco, franquia=franquia))
+                    conversao.append(bloco.attrs.pop('conversao', None))
+                    if COL_VENDA not in bloco.columns:
+                        raise ValueError("O histórico incremental exige a coluna 'Código Venda'.")
+                    contagem = numerar_itens(bloco, contagem)
+                    linhas_delta += len(bloco)
+                    chaves.append(_chaves_substituicao(bloco))
+                    vendas.append(bloco[COL_VENDA].dropna().astype(str).unique())
+                    # Mês como inteiro AAAAMM: formatar só os valores únicos, não cada data do bloco.
+                    for ano_mes, parte in bloco.groupby(bloco[COL_DATA].dt.year * 100 + bloco[COL_DATA].dt.month, sort=False):
+                        mes = f"{ano_mes // 100:04d}-{ano_mes % 100:02d}"
+                        caminho = os.path.join(estagio, f"{mes}-{i:05d}.parquet")
+                        parte.to_parquet(caminho, index=False)
+                        novos.setdefault(mes, []).append(caminho)
+            chaves_delta = np.concatenate(chaves) if chaves else np.array([], dtype=np.uint64)
+            chaves = np.unique(chaves_delta)
+            vendas = np.unique(np.concatenate(vendas)) if vendas else np.array([], dtype=object)
+
+            # 2) Meses afetados: os do delta e os que já têm alguma venda do delta (pedidos refaturados).
+            caminho_indice = os.path.join(pasta, 'indice_vendas.parquet')
+            indice = pd.read_parquet(caminho_indice) if os.path.exists(caminho_indice) else pd.DataFrame({COL_VENDA: [], 'Mês': []}, dtype=object)
+            afetados = sorted(set(novos) | set(indice.loc[indice[COL_VENDA].isin(vendas), 'Mês']))
+
+            # 3) Cada mês afetado é regravado: os pedidos (e linhas sem código) do delta saem, as linhas do delta entram.
+            substituidas, encontradas = 0, []
+            vendas_por_mes = []
+            for mes in afetados:
+                partes = []
+                if os.path.exists(_arquivo_mes(pasta, mes)):
+                    atual = codigos_canonicos(pd.read_parquet(_arquivo_mes(pasta, mes)))
+                    chaves_atual = _chaves_substituicao(atual)
+                    repetidas = np.isin(chaves_atual, chaves)
+                    substituidas += int(repetidas.sum())
+                    encontradas.append(chaves_atual[repetidas])
+                    partes.append(atual[~repetidas])
+                partes += [pd.read_parquet(c) for c in novos.get(mes, [])]
+                particao = pd.concat(partes, ignore_index=True).sort_values(COL_DATA, kind='stable', ignore_index=True)
+                if particao.empty:
+                    for caminho in [_arquivo_mes(pasta, mes)] + [_arquivo_resumo(pasta, mes, n) for n in RESUMOS]:
+                        if os.path.exists(caminho):
+                            os.remove(caminho)
+                    manifesto['linhas_por_mes'].pop(mes, None)
+                    continue
+                _gravar(particao, _arquivo_mes(pasta, mes))
+                for nome_resumo, tabela in _resumir(particao).items():
+                    _gravar(tabela, _arquivo_resumo(pasta, mes, nome_resumo), index=nome_resumo == 'primeiras')
+                manifesto['linhas_por_mes'][mes] = len(particao)
+                vendas_por_mes.append(pd.DataFrame({COL_VENDA: particao[COL_VENDA].dropna().astype(str).unique(), 'Mês': mes}))
+
+            indice = pd.concat([indice[~indice['Mês'].isin(afetados)]] + vendas_por_mes, ignore_index=True)
+            _gravar(indice, caminho_indice)
+
+        resumo = {
+            'momento': datetime.now().isoformat(timespec='seconds'),
+            'arquivo': nome,
+            # Novas: linhas de pedidos que ainda não estavam no histórico. Substituídas: linhas gravadas que saíram
+            # porque o pedido delas veio de novo no delta (um pedido corrigido pode voltar com mais ou menos linhas).
+            'linhas_novas': int((~np.isin(chaves_delta, np.concatenate(encontradas) if encontradas else [])).sum()),
+            'linhas_substituidas': substituidas,
+            'meses_atualizados': afetados,
+            'conversao': somar_conversao(*conversao),
+        }
+        manifesto['versao'] += 1
+        manifesto['linhas_por_mes'] = dict(sorted(manifesto['linhas_por_mes'].items()))
+        manifesto['atualizacoes'] = (manifesto['atualizacoes'] + [resumo])[-50:]
+        _gravar_manifesto(pasta, manifesto)
+        return resumo
+
+def incorporar_arquivos(arquivos, pasta=PASTA_HISTORICO):
+    # Vários CSVs (ou .zip) de uma vez: cada arquivo é um delta, com a franquia do manifesto ou do nome do arquivo.
+    csvs, franquias = csvs_e_franquias(arquivos)
+    return [atualizar_historico(io.BytesIO(dados_brutos), pasta, nome=nome, franquia=franquia)
+            for (nome, dados_brutos), franquia in zip(csvs, franquias)]
+
+def regras_mudaram(manifesto):
+    # Linhas já gravadas foram normalizadas (e atribuídas a gestores) com as regras da época da importação.
+    return manifesto.get('regras') != assinatura_regras()
+
+# ====================
+# Leitura do histórico
+# ====================
+def _restaurar_categorias(tabela):
+    # Cada mês é gravado com as próprias categorias; ao juntar os meses elas viram texto e são refeitas aqui.
+    if 'Produto' in tabela.columns:
+        tabela['Produto'] = pd.Categorical(tabela['Produto'].astype(object))
+    if 'Gestor' in tabela.columns:
+        tabela['Gestor'] = pd.Categorical(tabela['Gestor'].astype(object), categories=[g['nome'] for g in CONFIG_GESTORES['gestores']])
+    return tabela
+
+def _arquivo_cubo_produtos(pasta, mes):
+    # Meses gravados antes do cubo de produtos: o resumo é refeito a partir das linhas do mês.
+    caminho = _arquivo_resumo(pasta, mes, 'cubo_produtos')
+    return caminho if os.path.exists(caminho) else _arquivo_mes(pasta, mes)
+
+def _ler_cubo_produtos(caminho):
+    tabela = pd.read_parquet(caminho)
+    return tabela if os.path.basename(caminho) == 'cubo_produtos.parquet' else construir_cubo_produtos(tabela)
+
+def _assinatura(caminho):
+    estado = os.stat(caminho)
+    return estado.st_ino, estado.st_size, estado.st_mtime_ns
+
+# Última leitura de cada tabela do histórico, com o intervalo de linhas e a assinatura do arquivo de cada mês. Numa
+# atualização só os meses regravados (arquivo novo) são lidos do disco; os demais são fatias da leitura anterior, então
+# o custo de remontar as tabelas depende do delta. Guarda uma versão por tabela, a mesma que o dashboard mantém em uso.
+_leituras = {}
+
+def _ler_meses(pasta, nome, meses, arquivo, ler=pd.read_parquet, index=False):
+    chave = (os.path.abspath(pasta), nome)
+    anterior = _leituras.get(chave, {'tabela': None, 'meses': {}})
+    partes, intervalos, inicio = [], {}, 0
+    for mes in meses:
+        assinatura = _assinatura(arquivo(pasta, mes))
+        lido = anterior['meses'].get(mes)
+        if lido is not None and lido[0] == assinatura:
+            parte = anterior['tabela'].iloc[lido[1]:lido[2]]
+        else:
+            # Meses gravados antes de `codigos_canonicos` podem ter códigos numéricos.
+            parte = ler(arquivo(pasta, mes))
+            if parte is None:
+                continue
+            parte = codigos_canonicos(parte)
+        intervalos[mes] = (assinatura, inicio, inicio + len(parte))
+        inicio += len(parte)
+        partes.append(parte)
+    if not partes:
+        _leituras.pop(chave, None)
+        return None
+    tabela = pd.concat(partes) if index else pd.concat(partes, ignore_index=True)
+    _leituras[chave] = {'tabela': tabela, 'meses': intervalos}
+    return tabela
+
+@instrumentar
+def carregar_historico(pasta=PASTA_HISTORICO, compacto=False):
+    meses = list(ler_manifesto(pasta)['linhas_por_mes'])
+    # Meses em ordem e cada um ordenado por data: o resultado já sai ordenado, como em `carregar_dados`. O esquema
+    # compacto troca as colunas de uma cópia rasa, sem alterar a leitura guardada.
+    df = _restaurar_categorias(_ler_meses(pasta, 'dados', meses, _arquivo_mes))
+    return compactar_dados(df.copy(deep=False)) if compacto else df
+
+@instrumentar
+def estruturas_historico(pasta=PASTA_HISTORICO, compacto=False):
+    # Mesmo resultado de `construir_estruturas`, montado a partir dos resumos de cada mês em vez das linhas.
+    meses = list(ler_manifesto(pasta)['linhas_por_mes'])
+    df = carregar_historico(pasta, compacto=compacto)
+    resumos = {nome: _ler_meses(pasta, nome, meses, lambda pasta, mes, nome=nome: _arquivo_resumo(pasta, mes, nome),
+                                index=nome == 'primeiras')
+               for nome in ['cubo', 'pedidos', 'primeiras', 'dias']}
+    cubo, pedidos = _restaurar_categorias(resumos['cubo']), _restaurar_categorias(resumos['pedidos'])
+    primeiras, dias = resumos['primeiras'], resumos['dias']
+    cubo_produtos = _ler_meses(pasta, 'cubo_produtos', meses, _arquivo_cubo_produtos, ler=_ler_cubo_produtos)
+    cubo_produtos = _restaurar_categorias(cubo_produtos) if cubo_produtos is not None else None
+    return {
+        'df': df,
+        'cubo': cubo,
+        'cubo_produtos': cubo_produtos,
+        'pedidos': pedidos,
+        'acumulados': construir_acumulados(cubo, pedidos),
+        # Meses em ordem: a primeira ocorrência de cada cliente é a primeira compra de todo o histórico.
+        'primeiras_compras': primeiras[~primeiras.index.duplicated()],
+        'previsoes': prever_proximas_compras(dias),
+        'indices_gestores': {
+            'df': indexar_gestores(df),
+            'cubo': indexar_gestores(cubo),
+            'cubo_produtos': indexar_gestores(cubo_produtos) if cubo_produtos is not None else None,
+            'pedidos': indexar_gestores(pedidos),
+        },
+    }
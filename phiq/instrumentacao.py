@@ -0,0 +1,203 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# ====================
+# Instrumentação (tempos, memória e linhas por rerun)
+# ====================
+# Cada rerun do dashboard abre uma medição (`iniciar_medicao`); seções da página, funções decoradas com
+# `@instrumentar` e chamadas aos loaders com cache registram nela tempo, variação de RSS e linhas de entrada/saída.
+# Fora de uma medição (CLI, relatórios, benchmark) as funções decoradas são chamadas diretamente.
+# Com PHIQ_LOG_PERFORMANCE apontando para um arquivo, cada rerun vira uma linha JSON nesse arquivo.
+CAMINHO_LOG_PERFORMANCE = os.environ.get("PHIQ_LOG_PERFORMANCE", "")
+
+_medicao_atual = contextvars.ContextVar('medicao_atual', default=None)
+
+# Acertos/falhas de cache acumulados no processo (todas as sessões), além dos contadores de cada rerun.
+_contadores_cache = {}
+_trava_cache = threading.Lock()
+
+logger_performance = logging.getLogger("phiq.performance")
+if CAMINHO_LOG_PERFORMANCE:
+    os.makedirs(os.path.dirname(os.path.abspath(CAMINHO_LOG_PERFORMANCE)), exist_ok=True)
+    _handler = logging.FileHandler(CAMINHO_LOG_PERFORMANCE, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger_performance.addHandler(_handler)
+    logger_performance.setLevel(logging.INFO)
+    logger_performance.propagate = False
+
+def memoria_rss_mb():
+    # /proc só existe no Linux; em outros sistemas a variação de memória fica em branco.
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _delta_memoria(rss_inicial):
+    rss_final = memoria_rss_mb()
+    if rss_inicial is None or rss_final is None:
+        return None
+    return round(rss_final - rss_inicial, 1)
+
+def _linhas(valor):
+    if isinstance(valor, tuple) and valor:
+        valor = valor[0]
+    return len(valor) if isinstance(valor, (pd.DataFrame, pd.Series)) else None
+
+def iniciar_medicao():
+    medicao = {
+        'inicio': time.perf_counter(),
+        'rss_inicial_mb': memoria_rss_mb(),
+        'registros': [],
+        'cache': {},
+        'secao': None,
+    }
+    _medicao_atual.set(medicao)
+    return medicao
+
+def medicao_atual():
+    return _medicao_atual.get()
+
+@contextmanager
+def medir(nome, tipo='funcao'):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        yield {}
+        return
+    registro = {'nome': nome, 'tipo': tipo, 'secao': medicao['secao']['nome'] if medicao['secao'] else None}
+    rss_inicial = memoria_rss_mb()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        registro['memoria_delta_mb'] = _delta_memoria(rss_inicial)
+        medicao['registros'].append(registro)
+
+def instrumentar(funcao):
+    @functools.wraps(funcao)
+    def instrumentada(*args, **kwargs):
+        if _medicao_atual.get() is None:
+            return funcao(*args, **kwargs)
+        with medir(funcao.__name__) as registro:
+            registro['linhas_entrada'] = next((_linhas(a) for a in args if _linhas(a) is not None), None)
+            resultado = funcao(*args, **kwargs)
+            registro['linhas_saida'] = _linhas(resultado)
+        return resultado
+    return instrumentada
+
+def _fechar_secao(medicao):
+    aberta = medicao['secao']
+    if aberta is None:
+        return
+    medicao['registros'].append({
+        'nome': aberta['nome'],
+        'tipo': 'secao',
+        'secao': aberta['nome'],
+        'duracao_ms': round((time.perf_counter() - aberta['inicio']) * 1000, 2),
+        'memoria_delta_mb': _delta_memoria(aberta['rss_inicial_mb']),
+    })
+    medicao['secao'] = None
+
+def secao(nome):
+    # Marca o início de uma seção da página; a seção anterior termina aqui.
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return
+    _fechar_secao(medicao)
+    medicao['secao'] = {'nome': nome, 'inicio': time.perf_counter(), 'rss_inicial_mb': memoria_rss_mb()}
+
+def contar_falha_cache(nome):
+    # Chamado de dentro da função cacheada: o corpo só executa quando o cache não tem o resultado.
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        contadores = medicao['cache'].setdefault(nome, {'acertos': 0, 'falhas': 0, 'execucoes': 0})
+        contadores['execucoes'] += 1
+
+def registrar_chamada_cache(nome, acerto):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return
+    with _trava_cache:
+        total = _contadores_cache.setdefault(nome, {'acertos': 0, 'falhas': 0})
+        total['acertos' if acerto else 'falhas'] += 1
+    contadores = medicao['cache'].setdefault(nome, {'acertos': 0, 'falhas': 0, 'execucoes': 0})
+    contadores['acertos' if acerto else 'falhas'] += 1
+
+def execucoes_cache(nome):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return 0
+    return medicao['cache'].get(nome, {}).get('execucoes', 0)
+
+def finalizar_medicao(**contexto):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return None
+    _fechar_secao(medicao)
+    _medicao_atual.set(None)
+    rss = memoria_rss_mb()
+
+    registros = pd.DataFrame(medicao['registros'], columns=[
+        'nome', 'tipo', 'secao', 'duracao_ms', 'memoria_delta_mb', 'linhas_entrada', 'linhas_saida'])
+    resumo = {
+        'momento': datetime.now().isoformat(timespec='milliseconds'),
+        **contexto,
+        'total_ms': round((time.perf_counter() - medicao['inicio']) * 1000, 2),
+        'rss_mb': round(rss, 1) if rss is not None else None,
+        'rss_delta_mb': _delta_memoria(medicao['rss_inicial_mb']),
+        'secoes': _para_json(registros[registros['tipo'] == 'secao'][['nome', 'duracao_ms', 'memoria_delta_mb']]),
+        'funcoes': _para_json(resumir_funcoes(registros)),
+        'cache': {nome: {k: v for k, v in c.items() if k != 'execucoes'} for nome, c in medicao['cache'].items()},
+    }
+    if logger_performance.handlers:
+        logger_performance.info(json.dumps(resumo, ensure_ascii=False, default=str))
+    return resumo
+
+def _para_json(tabela):
+    # NaN não é JSON válido: campos sem medida (memória fora do Linux, funções sem DataFrame) viram null.
+    return tabela.astype(object).where(tabela.notna(), None).to_dict('records')
+
+def resumir_funcoes(registros):
+    funcoes = registros[registros['tipo'] != 'secao']
+    return (funcoes.groupby(['tipo', 'nome'], sort=False)
+            .agg(chamadas=('duracao_ms', 'size'), total_ms=('duracao_ms', 'sum'), max_ms=('duracao_ms', 'max'),
+                 memoria_delta_mb=('memoria_delta_mb', 'sum'), linhas_entrada=('linhas_entrada', 'max'),
+                 linhas_saida=('linhas_saida', 'max'))
+            .round(2).astype({'linhas_entrada': 'Int64', 'linhas_saida': 'Int64'})
+            .sort_values('total_ms', ascending=False).reset_index())
+
+def contadores_cache_processo():
+    with _trava_cache:
+        return {nome: dict(c) for nome, c in _contadores_cache.items()}
+
+def tabelas_desempenho(resumo):
+    # Tabelas do painel "Performance": seções, funções agregadas e acertos de cache (do rerun e do processo).
+    secoes = pd.DataFrame(resumo['secoes'], columns=['nome', 'duracao_ms', 'memoria_delta_mb']).rename(columns={
+        'nome': 'Seção', 'duracao_ms': 'Tempo (ms)', 'memoria_delta_mb': 'Δ Memória (MB)'})
+    funcoes = pd.DataFrame(resumo['funcoes'], columns=[
+        'tipo', 'nome', 'chamadas', 'total_ms', 'max_ms', 'memoria_delta_mb', 'linhas_entrada', 'linhas_saida']).rename(columns={
+        'tipo': 'Tipo', 'nome': 'Função', 'chamadas': 'Chamadas', 'total_ms': 'Tempo Total (ms)', 'max_ms': 'Maior (ms)',
+        'memoria_delta_mb': 'Δ Memória (MB)', 'linhas_entrada': 'Linhas Entrada', 'linhas_saida': 'Linhas Saída'}
+    ).astype({'Linhas Entrada': 'Int64', 'Linhas Saída': 'Int64'})
+    processo = contadores_cache_processo()
+    cache = pd.DataFrame([
+        {
+            'Função': nome,
+            'Acertos (rerun)': contadores['acertos'],
+            'Falhas (rerun)': contadores['falhas'],
+            'Acertos (processo)': processo.get(nome, {}).get('acertos', 0),
+            'Falhas (processo)': processo.get(nome, {}).get('falhas', 0),
+        }
+        for nome, contadores in resumo['cache'].items()
+    ], columns=['Função', 'Acertos (rerun)', 'Falhas (rerun)', 'Acertos (processo)', 'Falhas (processo)'])
+    return secoes, funcoes, cache
@@ -0,0 +1,204 @@
+import html
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from phiq.analise import (
+    calcular_recorrencia_e_previsao, calcular_ticket_medio_por_pedido, classificar_compras, construir_estruturas,
+    faturamento_por_forma_pagamento, faturamento_por_periodo, filtrar_gestor, filtrar_tabela, top_10,
+)
+from phiq.dados import CONFIG_GESTORES, carregar_varios, ler_entradas, regra_do_gestor
+from phiq.formatacao import formatar_numero_abreviado, formatar_real
+from phiq.graficos import (
+    BACKGROUND_DARK, CONTENT_BG_DARK, TEAL, TEXT_LIGHT, grafico_faturamento, grafico_formas_pagamento,
+    grafico_novos_recompra, grafico_top_clientes, grafico_top_produtos,
+)
+
+# ====================
+# Relatórios em lote (sem Streamlit)
+# ====================
+# Uma página HTML e um conjunto de tabelas Parquet para cada combinação gestor x franquia x período. O arquivo é
+# carregado e as estruturas derivadas são construídas uma única vez; as combinações são distribuídas num pool de
+# processos que recebe essas estruturas uma vez por processo (`_iniciar_processo`), nunca por combinação. Com fork
+# (Linux) elas são herdadas sem serialização; com spawn (macOS e Windows) são serializadas uma vez para cada processo.
+TODOS = "Todos"
+PERIODOS_PADRAO = [30, 90, 365]
+
+# Estruturas compartilhadas com os processos do pool (preenchidas por `_iniciar_processo`).
+_estruturas = None
+
+def _iniciar_processo(estruturas):
+    global _estruturas
+    _estruturas = estruturas
+
+def nome_de_arquivo(texto):
+    sem_acento = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Za-z0-9]+', '-', sem_acento).strip('-').lower() or 'vazio'
+
+def segmentos_do_relatorio(cubo, gestor, estados):
+    # Mesmos segmentos que o dashboard seleciona por padrão em cada página.
+    if 'Segmento' not in cubo.columns:
+        return []
+    presentes = set(cubo['Segmento'].dropna().unique())
+    if gestor == TODOS:
+        return sorted(s for s in presentes if s != 'Não Informado')
+
+    regra = regra_do_gestor(gestor)
+    if 'segmentos_por_estado' in regra:
+        permitidos = set()
+        for estado in estados:
+            permitidos.update(regra['segmentos_por_estado'].get(estado, []))
+        return sorted(s for s in permitidos if s in presentes)
+    return sorted(presentes)
+
+def listar_combinacoes(df, periodos=PERIODOS_PADRAO):
+    gestores = [TODOS] + [g['nome'] for g in CONFIG_GESTORES['gestores']]
+    franquias = sorted(df['Franquia'].dropna().unique())
+    return [(gestor, franquia, dias) for gestor in gestores for franquia in franquias for dias in periodos]
+
+def _gerar_combinacao(tarefa):
+    gestor, franquia, dias, saida = tarefa
+    df, cubo, cubo_produtos = _estruturas['df'], _estruturas['cubo'], _estruturas['cubo_produtos']
+    indices = _estruturas['indices_gestores']
+
+    end_date = df['Data Faturamento Pedido'].iloc[-1].normalize()
+    start_date = end_date - pd.Timedelta(days=dias - 1)
+    estados = sorted(df['Estado'].dropna().unique())
+
+    if gestor != TODOS:
+        df = filtrar_gestor(df, gestor, indices['df'])
+        cubo = filtrar_gestor(cubo, gestor, indices['cubo'])
+        if cubo_produtos is not None:
+            cubo_produtos = filtrar_gestor(cubo_produtos, gestor, indices['cubo_produtos'])
+    cubo_periodo = filtrar_tabela(cubo, estados, start_date, end_date, franquias=[franquia])
+    segmentos = segmentos_do_relatorio(cubo_periodo, gestor, estados)
+
+    cubo_filtrado = filtrar_tabela(cubo_periodo, estados, start_date, end_date, segmentos=segmentos)
+    if cubo_filtrado.empty:
+        return None
+    df_filtrado = filtrar_tabela(df, estados, start_date, end_date, franquias=[franquia], segmentos=segmentos)
+
+    pasta = os.path.join(saida, nome_de_arquivo(gestor), nome_de_arquivo(franquia), f"{dias}d")
+    os.makedirs(pasta, exist_ok=True)
+    sufixo = f"{franquia} - {dias} dias" if gestor == TODOS else f"{gestor} - {franquia} - {dias} dias"
+
+    faturamento = float(cubo_filtrado['Valor Total'].sum())
+    ticket_medio = calcular_ticket_medio_por_pedido(df_filtrado)
+    pedidos = df_filtrado['Código Venda'].nunique() if 'Código Venda' in df_filtrado.columns else None
+
+    df_com_tipo = classificar_compras(df_filtrado)
+    top_clientes = top_10(cubo_filtrado, 'Cliente', 'Valor Total')
+    tabelas = {
+        'faturamento_diario': faturamento_por_periodo(cubo_filtrado, 'D'),
+        'top_clientes': top_clientes.reset_index(),
+        'previsao': calcular_recorrencia_e_previsao(df_filtrado),
+    }
+    figuras = [grafico_faturamento(cubo_filtrado, 'Dia' if dias <= 90 else 'Mês', f"Faturamento - {sufixo}")]
+    if not df_com_tipo.empty:
+        contagem_tipo = df_com_tipo['Tipo Compra'].value_counts().rename_axis('Tipo Compra').reset_index(name='Quantidade')
+        tabelas['novos_recompra'] = contagem_tipo
+        figuras.append(grafico_novos_recompra(contagem_tipo, f"Novos vs Recompra - {sufixo}"))
+    figuras.append(grafico_top_clientes(top_clientes, f"Top 10 Clientes por Faturamento - {sufixo}"))
+    if cubo_produtos is not None:
+        produtos_filtrado = filtrar_tabela(cubo_produtos, estados, start_date, end_date, franquias=[franquia], segmentos=segmentos)
+        for medida, nome in [('Quantidade', 'Quantidade'), ('Valor Total', 'Faturamento')]:
+            top_produtos = top_10(produtos_filtrado, 'Produto', medida)
+            tabelas[f"top_produtos_{nome_de_arquivo(nome)}"] = top_produtos.reset_index()
+            figuras.append(grafico_top_produtos(top_produtos, medida, f"Top Produtos por {nome} - {sufixo}"))
+    if 'Forma Pagamento' in cubo_filtrado.columns:
+        fat_forma = faturamento_por_forma_pagamento(cubo_filtrado)
+        tabelas['formas_pagamento'] = fat_forma
+        figuras.append(grafico_formas_pagamento(fat_forma, f"Proporção por Forma de Pagamento - {sufixo}"))
+
+    for nome, tabela in tabelas.items():
+        # Categorias vazias não fazem sentido fora do dataset completo; grava os rótulos como texto.
+        tabela.astype({c: str for c in tabela.columns if isinstance(tabela[c].dtype, pd.CategoricalDtype)}).to_parquet(
+            os.path.join(pasta, f"{nome}.parquet"), index=False)
+
+    indicadores = [
+        ("💰 Faturamento Total", formatar_numero_abreviado(faturamento)),
+        ("🎫 Ticket Médio", formatar_real(ticket_medio)),
+    ]
+    if pedidos is not None:
+        indicadores.append(("🛒 Pedidos Únicos", f"{pedidos}"))
+    titulo = f"Relatório {sufixo}" if gestor != TODOS else f"Visão Geral - {sufixo}"
+    escrever_html(os.path.join(pasta, "relatorio.html"), titulo, indicadores, figuras, start_date, end_date)
+
+    return {
+        'Gestor': gestor,
+        'Franquia': franquia,
+        'Período (dias)': dias,
+        'Início': start_date,
+        'Fim': end_date,
+        'Faturamento': faturamento,
+        'Pedidos': pedidos,
+        'Ticket Médio': ticket_medio,
+        'Clientes': df_filtrado['Cliente'].nunique(),
+        'Relatório': os.path.relpath(os.path.join(pasta, "relatorio.html"), saida),
+    }
+
+ESTILO_HTML = f"""
+body {{ background-color: {BACKGROUND_DARK}; color: {TEXT_LIGHT}; font-family: sans-serif; margin: 2rem; }}
+h1, h2 {{ color: {TEAL}; }}
+a {{ color: {TEXT_LIGHT}; }}
+.indicadores {{ display: flex; gap: 2rem; }}
+.indicador {{ background-color: {CONTENT_BG_DARK}; padding: 1rem 1.5rem; border-radius: 8px; }}
+.indicador span {{ display: block; opacity: 0.7; }}
+table {{ border-collapse: collapse; }}
+td, th {{ padding: 0.3rem 0.8rem; border-bottom: 1px solid {CONTENT_BG_DARK}; }}
+"""
+
+def escrever_html(caminho, titulo, indicadores, figuras, start_date, end_date):
+    # Só a primeira figura inclui o plotly.js (via CDN); as demais reaproveitam o mesmo script.
+    blocos = [fig.to_html(full_html=False, include_plotlyjs='cdn' if i == 0 else False) for i, fig in enumerate(figuras)]
+    cartoes = "".join(f'<div class="indicador"><span>{html.escape(rotulo)}</span><strong>{html.escape(valor)}</strong></div>'
+                      for rotulo, valor in indicadores)
+    periodo = f"{start_date:%d/%m/%Y} a {end_date:%d/%m/%Y}"
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>{html.escape(titulo)}</title><style>{ESTILO_HTML}</style></head>
+<body><h1>{html.escape(titulo)}</h1><p>{periodo}</p><div class="indicadores">{cartoes}</div>
+{"".join(blocos)}
+</body></html>""")
+
+def escrever_indice(saida, resumo):
+    tabela = resumo.assign(**{
+        'Início': resumo['Início'].dt.strftime('%d/%m/%Y'),
+        'Fim': resumo['Fim'].dt.strftime('%d/%m/%Y'),
+        'Faturamento': resumo['Faturamento'].map(formatar_real),
+        'Ticket Médio': resumo['Ticket Médio'].map(formatar_real),
+        'Relatório': [f'<a href="{html.escape(c)}">abrir</a>' for c in resumo['Relatório']],
+    })
+    with open(os.path.join(saida, "index.html"), 'w', encoding='utf-8') as arquivo:
+        arquivo.write(f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Relatórios PHIQ</title><style>{ESTILO_HTML}</style></head>
+<body><h1>Relatórios PHIQ</h1>{tabela.to_html(index=False, escape=False, na_rep='-')}</body></html>""")
+
+def gerar_relatorios(entradas, saida, periodos=PERIODOS_PADRAO, processos=None, compacto=False):
+    # Entradas: CSVs, pastas ou .zip; com vários arquivos, cada um é uma franquia (ver `carregar_varios`).
+    entradas = [entradas] if isinstance(entradas, str) else entradas
+    estruturas = construir_estruturas(carregar_varios(ler_entradas(entradas), compacto=compacto))
+    os.makedirs(saida, exist_ok=True)
+    tarefas = [(gestor, franquia, dias, saida) for gestor, franquia, dias in listar_combinacoes(estruturas['df'], periodos)]
+
+    if processos == 1:
+        _iniciar_processo(estruturas)
+        resultados = list(map(_gerar_combinacao, tarefas))
+    else:
+        # Com fork os processos herdam as estruturas já construídas (copy-on-write); onde não há fork, o initializer
+        # as recebe serializadas uma vez por processo.
+        contexto = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=processos, mp_context=contexto,
+                                 initializer=_iniciar_processo, initargs=(estruturas,)) as pool:
+            resultados = list(pool.map(_gerar_combinacao, tarefas))
+
+    resumo = pd.DataFrame([r for r in resultados if r is not None], columns=[
+        'Gestor', 'Franquia', 'Período (dias)', 'Início', 'Fim', 'Faturamento', 'Pedidos', 'Ticket Médio', 'Clientes',
+        'Relatório'])
+    resumo.to_parquet(os.path.join(saida, "resumo.parquet"), index=False)
+    escrever_indice(saida, resumo)
+    return resumo
@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# ====================
+# Gerador de PedidosItens sintético
+# ====================
+# Produz CSVs no formato da exportação do sistema (mesmas colunas, números no formato brasileiro e a mesma
+# sujeira que a normalização trata: UFs com espaço/minúsculas, vendedores com grafias variadas, segmentos vazios,
+# formas de pagamento por extenso e valores inválidos). Usado pelo benchmark e para testar arquivos grandes.
+ESTADOS = ['PB', 'PE', 'RN', 'CE', 'AL', 'BA', 'SE', 'PI', 'MA', 'SP']
+PESOS_ESTADOS = [0.3, 0.2, 0.12, 0.1, 0.06, 0.06, 0.05, 0.04, 0.04, 0.03]
+VENDEDORES = ['ROSIMERI BARBOZA', 'Almir Farias', 'JOAO SILVA', 'MARIA SOUZA', 'Carlos Lima', 'ANA PAULA']
+SEGMENTOS = ['INDUSTRIAL', 'INSTITUCIONAL', 'CLIENTE FÁBRICA', 'AGRO', 'AVICULTURA', 'COMÉRCIO', '']
+PESOS_SEGMENTOS = [0.25, 0.2, 0.1, 0.1, 0.05, 0.2, 0.1]
+FORMAS_PAGAMENTO = ['Boleto Bancário', 'Boleto 28 dias', '35 DDL', 'PIX', 'Dinheiro', 'Permuta', 'Cartão']
+PESOS_FORMAS = [0.35, 0.15, 0.1, 0.25, 0.08, 0.04, 0.03]
+VOLUMES = ['1L', '5L', '20L', '50L', '200L', '1KG', '25KG']
+
+COLUNAS = ['Data', 'Data Faturamento Pedido', 'Código Venda', 'Cliente', 'Estado', 'Vendedor', 'SEGMENTO ',
+           'Descrição', 'Quantidade', 'Preço Venda Total (R$)', 'Forma Pagamento']
+TAMANHO_BLOCO_GERACAO = 1_000_000
+
+def interpretar_tamanho(texto):
+    # "10k", "1M", "10M" ou um inteiro.
+    texto = str(texto).strip().upper().replace('_', '')
+    multiplicador = {'K': 1_000, 'M': 1_000_000}.get(texto[-1:], 1)
+    return int(float(texto.rstrip('KM')) * multiplicador)
+
+def cardinalidade_padrao(n_linhas):
+    clientes = int(np.clip(n_linhas // 30, 100, 100_000))
+    produtos = int(np.clip(n_linhas // 500, 50, 5_000))
+    return clientes, produtos
+
+def formatar_brasileiro(centavos):
+    # 1234567 -> "12.345,67"
+    reais = pd.Series(np.abs(centavos) // 100).astype(str).str.replace(r'(\d)(?=(\d{3})+$)', r'\1.', regex=True)
+    decimais = pd.Series(np.abs(centavos) % 100).astype(str).str.zfill(2)
+    return np.where(centavos < 0, '-', '') + reais + ',' + decimais
+
+def _pesos_zipf(n, expoente=1.1):
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+def _catalogos(rng, n_clientes, n_produtos):
+    # Atributos fixos por cliente (UF, segmento, vendedor) e por produto (descrição e preço unitário).
+    sufixos = np.where(rng.random(n_clientes) < 0.05, ' FAZENDA', np.where(rng.random(n_clientes) < 0.03, ' AGRO', ''))
+    clientes = pd.DataFrame({
+        'Cliente': [f"CLIENTE {i:06d}{s}" for i, s in enumerate(sufixos)],
+        'Estado': rng.choice(ESTADOS, n_clientes, p=PESOS_ESTADOS),
+        'SEGMENTO ': rng.choice(SEGMENTOS, n_clientes, p=PESOS_SEGMENTOS),
+        'Vendedor': rng.choice(VENDEDORES, n_clientes),
+        # Ritmo médio de compra do cliente, em dias.
+        'ritmo': rng.integers(7, 120, n_clientes),
+    })
+    produtos = pd.DataFrame({
+        'Descrição': [f"{i:05d} - PRODUTO {i // len(VOLUMES)} - {VOLUMES[i % len(VOLUMES)]}" for i in range(n_produtos)],
+        'preco_centavos': (rng.lognormal(4.5, 1.0, n_produtos) * 100).astype(np.int64) + 100,
+    })
+    return clientes, produtos
+
+def _gerar_bloco(rng, n_linhas, primeiro_codigo, clientes, produtos, inicio, dias):
+    # Pedidos com 1 a 8 itens; cliente, data, vendedor e forma de pagamento valem para o pedido inteiro.
+    itens_por_pedido = np.minimum(rng.geometric(0.35, n_linhas // 2 + 1), 8)
+    n_pedidos = int(np.searchsorted(np.cumsum(itens_por_pedido), n_linhas)) + 1
+    itens_por_pedido = itens_por_pedido[:n_pedidos]
+    itens_por_pedido[-1] -= itens_por_pedido.sum() - n_linhas
+
+    cliente = rng.choice(len(clientes), n_pedidos, p=_pesos_zipf(len(clientes), 0.8))
+    # Clientes de ritmo curto compram mais perto do fim do histórico, o que dá recompras previsíveis.
+    deslocamento = (rng.random(n_pedidos) ** (clientes['ritmo'].to_numpy()[cliente] / 60)) * dias
+    data = inicio + pd.to_timedelta(deslocamento.astype(np.int64), unit='D') + pd.to_timedelta(rng.integers(7, 19, n_pedidos), unit='h')
+    forma = rng.choice(FORMAS_PAGAMENTO, n_pedidos, p=PESOS_FORMAS)
+    codigo = np.arange(primeiro_codigo, primeiro_codigo + n_pedidos)
+
+    linha_pedido = np.repeat(np.arange(n_pedidos), itens_por_pedido)
+    cliente_linha = clientes.iloc[cliente[linha_pedido]].reset_index(drop=True)
+    produto = rng.choice(len(produtos), n_linhas, p=_pesos_zipf(len(produtos)))
+    quantidade = rng.geometric(0.15, n_linhas)
+    centavos = produtos['preco_centavos'].to_numpy()[produto] * quantidade
+    centavos = (centavos * rng.uniform(0.85, 1.15, n_linhas)).astype(np.int64)
+
+    data_linha = data[linha_pedido]
+    bloco = pd.DataFrame({
+        'Data': data_linha.strftime('%Y-%m-%d'),
+        'Data Faturamento Pedido': data_linha.strftime('%Y-%m-%d %H:%M:%S'),
+        'Código Venda': codigo[linha_pedido],
+        'Cliente': cliente_linha['Cliente'],
+        'Estado': cliente_linha['Estado'],
+        'Vendedor': cliente_linha['Vendedor'],
+        'SEGMENTO ': cliente_linha['SEGMENTO '],
+        'Descrição': produtos['Descrição'].to_numpy()[produto],
+        'Quantidade': quantidade,
+        'Preço Venda Total (R$)': formatar_brasileiro(centavos),
+        'Forma Pagamento': forma[linha_pedido],
+    })
+
+    # Sujeira típica da exportação.
+    sujo = rng.random(n_linhas)
+    bloco.loc[sujo < 0.03, 'Estado'] = bloco.loc[sujo < 0.03, 'Estado'].str.lower() + ' '
+    bloco.loc[(sujo >= 0.03) & (sujo < 0.05), 'Vendedor'] = ' ' + bloco.loc[(sujo >= 0.03) & (sujo < 0.05), 'Vendedor'].str.lower()
+    bloco.loc[(sujo >= 0.05) & (sujo < 0.055), 'Preço Venda Total (R$)'] = rng.choice(['', '-', 'N/D'])
+    bloco.loc[(sujo >= 0.055) & (sujo < 0.057), 'Data Faturamento Pedido'] = ''
+    bloco.loc[(sujo >= 0.057) & (sujo < 0.06), 'SEGMENTO '] = None
+    return bloco
+
+def gerar_pedidos(caminho, n_linhas, clientes=None, produtos=None, semente=0, inicio='2023-01-01', dias=730):
+    rng = np.random.default_rng(semente)
+    clientes_padrao, produtos_padrao = cardinalidade_padrao(n_linhas)
+    catalogo_clientes, catalogo_produtos = _catalogos(rng, clientes or clientes_padrao, produtos or produtos_padrao)
+
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    # Escrito em blocos para que 10M de linhas não precisem caber em memória de uma vez.
+    primeiro_codigo, gerado = 100_000, 0
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        while gerado < n_linhas:
+            n_bloco = min(TAMANHO_BLOCO_GERACAO, n_linhas - gerado)
+            bloco = _gerar_bloco(rng, n_bloco, primeiro_codigo, catalogo_clientes, catalogo_produtos, pd.Timestamp(inicio), dias)
+            bloco.to_csv(arquivo, index=False, header=gerado == 0, columns=COLUNAS)
+            primeiro_codigo = int(bloco['Código Venda'].max()) + 1
+            gerado += n_bloco
+    return caminho
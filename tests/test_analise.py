@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from phiq import consultas, dados
+from phiq.analise import classificar_compras, construir_estruturas, construir_primeiras_compras
+from phiq.sintetico import gerar_pedidos
+
+@pytest.fixture
+def padrao_e_compacto(tmp_path, monkeypatch):
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    caminho = gerar_pedidos(str(tmp_path / 'pedidos.csv'), 5000, dias=120)
+    return dados.carregar_arquivo(caminho), dados.carregar_arquivo(caminho, compacto=True)
+
+def contar_tipos(df, primeiras_compras=None):
+    return classificar_compras(df, primeiras_compras)['Tipo Compra'].value_counts().to_dict()
+
+@pytest.mark.parametrize('com_codigo_venda', [True, False])
+@pytest.mark.parametrize('primeira_de_todas', [False, True])
+def test_classificar_compras_compacto_igual_ao_padrao(padrao_e_compacto, com_codigo_venda, primeira_de_todas):
+    contagens = []
+    for df in padrao_e_compacto:
+        periodo = df.iloc[len(df) // 3:]
+        if not com_codigo_venda:
+            df, periodo = df.drop(columns='Código Venda'), periodo.drop(columns='Código Venda')
+        contagens.append(contar_tipos(periodo, construir_primeiras_compras(df) if primeira_de_todas else None))
+    padrao, compacto = contagens
+    assert padrao.get('Cliente Novo', 0) > 0
+    assert compacto == padrao
+
+def classificar_como_antes(df, cliente_col='Cliente', date_col='Data Faturamento Pedido', venda_col='Código Venda'):
+    # Regra original (merge com a venda da primeira transação de cada cliente), usada como referência.
+    sem_na = df.dropna(subset=[date_col])
+    primeiras = sem_na.loc[sem_na.groupby(cliente_col)[date_col].idxmin(), [cliente_col, venda_col]]
+    juntos = df.merge(primeiras.rename(columns={venda_col: 'Primeira_Venda_Codigo'}), on=cliente_col, how='left')
+    return pd.Series(np.where(juntos[venda_col] == juntos['Primeira_Venda_Codigo'], 'Cliente Novo', 'Recompra'))
+
+def test_codigo_vazio_nunca_e_cliente_novo(tmp_path, monkeypatch):
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    caminho = str(tmp_path / 'vazios.csv')
+    # A primeira compra do cliente A não tem código: nenhuma das linhas dele sem código é "Cliente Novo".
+    pd.DataFrame([
+        ['2024-03-01', '2024-03-01 10:00:00', None, 'CLIENTE A', '10,00'],
+        ['2024-03-05', '2024-03-05 10:00:00', None, 'CLIENTE A', '20,00'],
+        ['2024-03-06', '2024-03-06 10:00:00', 300, 'CLIENTE A', '30,00'],
+        ['2024-03-02', '2024-03-02 10:00:00', 200, 'CLIENTE B', '40,00'],
+        ['2024-03-07', '2024-03-07 10:00:00', None, 'CLIENTE B', '50,00'],
+    ], columns=['Data', 'Data Faturamento Pedido', 'Código Venda', 'Cliente', 'Preço Venda Total (R$)']).assign(**{
+        'Estado': 'PE', 'Vendedor': 'JOAO SILVA', 'SEGMENTO ': 'AGRO', 'Descrição': '0001 - PRODUTO 1', 'Quantidade': 1,
+        'Forma Pagamento': 'PIX',
+    }).to_csv(caminho, index=False)
+    df = dados.carregar_arquivo(caminho)
+
+    esperado = classificar_como_antes(df).value_counts().to_dict()
+    assert esperado == {'Recompra': 4, 'Cliente Novo': 1}
+    assert contar_tipos(df) == esperado
+
+    if 'duckdb' not in consultas.MOTORES_DISPONIVEIS:
+        pytest.skip("duckdb não instalado")
+    fonte = consultas.fonte_duckdb(dados.importar_parquet(caminho, str(tmp_path / 'parquet')))
+    opcoes = consultas.opcoes_filtros(fonte)
+    selecao = consultas.selecionar(fonte, opcoes['estados'], opcoes['data_min'], opcoes['data_max'])
+    assert dict(consultas.novos_recompra(selecao).itertuples(index=False)) == esperado
+
+def test_opcoes_de_filtro_na_mesma_ordem_nos_dois_motores(tmp_path, monkeypatch):
+    if 'duckdb' not in consultas.MOTORES_DISPONIVEIS:
+        pytest.skip("duckdb não instalado")
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    caminho = gerar_pedidos(str(tmp_path / 'pedidos.csv'), 2000, dias=60)
+    pandas = consultas.opcoes_filtros(consultas.fonte_pandas(construir_estruturas(dados.carregar_arquivo(caminho)), 'p'))
+    duckdb = consultas.opcoes_filtros(consultas.fonte_duckdb(dados.importar_parquet(caminho, str(tmp_path / 'parquet'))))
+    for chave in ['estados', 'franquias', 'segmentos']:
+        assert pandas[chave] == duckdb[chave] == sorted(pandas[chave])
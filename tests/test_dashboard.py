@@ -0,0 +1,38 @@
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from phiq import dados, historico
+from phiq.sintetico import gerar_pedidos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_selecao_de_clientes_da_previsao_acumula(tmp_path, monkeypatch):
+    # Sem upload: o dashboard lê um histórico incremental montado com dados sintéticos.
+    monkeypatch.chdir(RAIZ)
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(historico, 'PASTA_HISTORICO', str(tmp_path / 'historico'))
+    historico.atualizar_historico(gerar_pedidos(str(tmp_path / 'pedidos.csv'), 3000, dias=120), historico.PASTA_HISTORICO)
+
+    app = AppTest.from_file(os.path.join(RAIZ, 'Phiq.py'), default_timeout=120)
+    app.run()
+    next(c for c in app.sidebar.checkbox if c.label == "Histórico incremental").check()
+    app.run()
+
+    def clientes():
+        return app.multiselect(key='clientes_previsao_geral')
+    # As opções chegam formatadas ("CLIENTE · R$ ... · última compra ..."); o valor é só o nome.
+    primeiro, segundo, terceiro = [rotulo.split(' · ')[0] for rotulo in clientes().options[:3]]
+    clientes().select(primeiro)
+    app.run()
+    clientes().select(segundo)
+    app.run()
+    assert not app.exception
+    assert clientes().value == [primeiro, segundo]
+
+    # Outra busca muda as opções, mas não a seleção.
+    app.text_input(key='busca_geral').input(terceiro.split()[0]).run()
+    assert clientes().value == [primeiro, segundo]
+    clientes().unselect(primeiro)
+    app.run()
+    assert clientes().value == [segundo]
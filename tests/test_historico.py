@@ -0,0 +1,76 @@
+import pandas as pd
+
+from phiq import dados, historico
+from phiq.historico import atualizar_historico, carregar_historico, estruturas_historico
+
+def escrever_delta(caminho, linhas):
+    colunas = ['Data', 'Data Faturamento Pedido', 'Código Venda', 'Cliente', 'Estado', 'Vendedor', 'SEGMENTO ',
+               'Descrição', 'Quantidade', 'Preço Venda Total (R$)', 'Forma Pagamento']
+    pd.DataFrame([
+        [data, f"{data} 10:00:00", codigo, cliente, 'PE', 'JOAO SILVA', 'AGRO', produto, 1, valor, 'PIX']
+        for data, codigo, cliente, produto, valor in linhas
+    ], columns=colunas).to_csv(caminho, index=False)
+    return caminho
+
+def test_reenvio_com_codigo_vazio_substitui_o_pedido(tmp_path, monkeypatch):
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    pasta = str(tmp_path / 'historico')
+    atualizar_historico(escrever_delta(tmp_path / 'd1.csv', [
+        ('2024-03-01', 100, 'CLIENTE A', '0001 - PRODUTO 1', '10,00'),
+        ('2024-03-01', 100, 'CLIENTE A', '0002 - PRODUTO 2', '20,00'),
+        ('2024-03-02', 101, 'CLIENTE B', '0001 - PRODUTO 1', '30,00'),
+    ]), pasta)
+    # Um código vazio faz o pandas ler a coluna como float (100.0): o pedido 100 ainda tem que ser reconhecido.
+    resumo = atualizar_historico(escrever_delta(tmp_path / 'd2.csv', [
+        ('2024-03-01', 100, 'CLIENTE A', '0001 - PRODUTO 1', '15,00'),
+        ('2024-03-01', 100, 'CLIENTE A', '0002 - PRODUTO 2', '25,00'),
+        ('2024-03-03', None, 'CLIENTE C', '0001 - PRODUTO 1', '5,00'),
+    ]), pasta)
+
+    assert resumo['linhas_substituidas'] == 2
+    assert resumo['linhas_novas'] == 1
+    historico = carregar_historico(pasta)
+    assert len(historico) == 4
+    assert historico['Valor Total'].sum() == 15 + 25 + 30 + 5
+    assert sorted(historico['Código Venda'].dropna()) == ['100', '100', '101']
+
+def test_pedido_reenviado_com_menos_linhas(tmp_path, monkeypatch):
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    pasta = str(tmp_path / 'historico')
+    atualizar_historico(escrever_delta(tmp_path / 'd1.csv', [
+        ('2024-03-01', 100, 'CLIENTE A', '0001 - PRODUTO 1', '10,00'),
+        ('2024-03-01', 100, 'CLIENTE A', '0002 - PRODUTO 2', '20,00'),
+        ('2024-03-01', 100, 'CLIENTE A', '0003 - PRODUTO 3', '30,00'),
+        ('2024-03-02', 101, 'CLIENTE B', '0001 - PRODUTO 1', '40,00'),
+    ]), pasta)
+    # Pedido 100 corrigido: o produto 3 saiu e o produto 2 mudou de valor.
+    resumo = atualizar_historico(escrever_delta(tmp_path / 'd2.csv', [
+        ('2024-03-01', 100, 'CLIENTE A', '0001 - PRODUTO 1', '10,00'),
+        ('2024-03-01', 100, 'CLIENTE A', '0002 - PRODUTO 2', '25,00'),
+    ]), pasta)
+
+    assert resumo['linhas_substituidas'] == 3
+    assert resumo['linhas_novas'] == 0
+    historico_atual = carregar_historico(pasta)
+    assert sorted(historico_atual['Código Venda']) == ['100', '100', '101']
+    assert historico_atual['Valor Total'].sum() == 10 + 25 + 40
+
+def test_releitura_apos_delta_igual_a_leitura_do_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(dados, 'CACHE_DIR', str(tmp_path / 'cache'))
+    pasta = str(tmp_path / 'historico')
+    atualizar_historico(escrever_delta(tmp_path / 'd1.csv', [
+        ('2024-01-10', 100, 'CLIENTE A', '0001 - PRODUTO 1', '10,00'),
+        ('2024-02-10', 101, 'CLIENTE B', '0002 - PRODUTO 2', '20,00'),
+        ('2024-03-10', 102, 'CLIENTE A', '0001 - PRODUTO 1', '30,00'),
+    ]), pasta)
+    estruturas_historico(pasta)
+    # Só fevereiro é regravado; janeiro e março vêm da leitura anterior.
+    atualizar_historico(escrever_delta(tmp_path / 'd2.csv', [
+        ('2024-02-11', 103, 'CLIENTE C', '0003 - PRODUTO 3', '40,00'),
+    ]), pasta)
+    incremental = estruturas_historico(pasta)
+    historico._leituras.clear()
+    do_zero = estruturas_historico(pasta)
+    for nome in ['df', 'cubo', 'cubo_produtos', 'pedidos', 'primeiras_compras', 'previsoes']:
+        pd.testing.assert_frame_equal(incremental[nome], do_zero[nome])
+    assert len(incremental['df']) == 4